@@ -0,0 +1,103 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+
+from lora_module.emulator import EmulatedModule
+from lora_module.lora_module import LoRaModule
+
+from . import cases
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark command latency, RX parsing, TX drain and end-to-end gateway latency'
+    )
+    parser.add_argument(
+        '--device',
+        type=str,
+        help='Serial device to measure command latency against (default: an emulated module)'
+    )
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=200,
+        help='Round trips per command for the latency benchmark'
+    )
+    parser.add_argument(
+        '--baudrate',
+        default=9600,
+        type=lambda v: v if v == 'auto' else int(v),
+        help='Host UART rate for the latency benchmark, or "auto" to probe for it'
+    )
+    parser.add_argument(
+        '--fast-uart',
+        action='store_true',
+        help='Switch the module to its fastest UART rate before measuring latency'
+    )
+    parser.add_argument(
+        '--wire-time',
+        action='store_true',
+        help='Make the emulated module pay UART wire time (starting at 9600 baud)'
+    )
+    parser.add_argument(
+        '--only',
+        type=str,
+        nargs='*',
+        choices=['latency', 'startup', 'rx', 'tx', 'journal', 'reliable', 'compression', 'e2e'],
+        help='Run only these benchmarks'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Write the JSON results to this file (default: stdout)'
+    )
+    args = parser.parse_args()
+    selected = set(args.only or ['latency', 'startup', 'rx', 'tx', 'journal', 'reliable', 'compression', 'e2e'])
+
+    results = {}
+    if 'latency' in selected:
+        options = {'baudrate': args.baudrate, 'fast_uart': args.fast_uart}
+        if args.device:
+            results['command_latency'] = cases.command_latency(LoRaModule(args.device, **options), args.iterations)
+        else:
+            with EmulatedModule(baudrate=9600 if args.wire_time else None) as module:
+                lora = LoRaModule(module.port, **options)
+                results['command_latency'] = cases.command_latency(lora, args.iterations)
+                lora.ser.close()
+    # The remaining benchmarks need to inject traffic or time resets, so they always run emulated
+    if 'startup' in selected:
+        results['startup'] = cases.startup_time()
+    if 'rx' in selected:
+        results['rx_parse'] = cases.rx_parse_throughput()
+        results['rx_parse_binary'] = cases.rx_parse_throughput(binary=True)
+    if 'tx' in selected:
+        results['tx_drain'] = cases.tx_drain_rate()
+    if 'journal' in selected:
+        results['journal'] = cases.journal_throughput()
+    if 'reliable' in selected:
+        results['reliable'] = cases.reliable_goodput()
+    if 'compression' in selected:
+        results['compression'] = cases.compression_ratio()
+    if 'e2e' in selected:
+        results['end_to_end'] = cases.end_to_end_latency()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'device': args.device or 'emulator',
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
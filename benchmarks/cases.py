@@ -0,0 +1,260 @@
+########################################################################
+### Benchmark cases                                                  ###
+###   Each case sets up what it measures itself (emulated modules,   ###
+###   a journal, an HTTP sink...), takes its sizes as keyword        ###
+###   arguments and returns a dict of results. command_latency is    ###
+###   the exception: it is given an open LoRaModule.                 ###
+########################################################################
+
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from lora_module.airtime import time_on_air
+from lora_module.compression import Compressor, train_dictionary
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.gateway import Gateway
+from lora_module.journal import JournalReader, JournalWriter
+from lora_module.lora_module import LoRaProp
+from lora_module.reliable import ReliableLink
+from lora_module.scheduler import TxScheduler
+from lora_module.sink import HttpSink
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Summary of latency samples (seconds) in milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    summary = {f"p{p}": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+    summary["min"] = 1000 * ordered[0]
+    summary["max"] = 1000 * ordered[-1]
+    summary["mean"] = 1000 * sum(ordered) / len(ordered)
+    summary["count"] = len(ordered)
+    return summary
+
+def command_latency(lora, iterations=200):
+    """AT round-trip latency percentiles per command."""
+    commands = ["AT", "AT+BAND=?", "AT+PARAMETER=?", "AT+ADDRESS=?", "AT+ADDRESS=101", "AT+UID=?"]
+    results = {}
+    for command in commands:
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            lora.send_command(command)
+            samples.append(time.perf_counter() - started)
+        results[command] = percentiles(samples)
+    return results
+
+def rx_parse_throughput(frames=5000, payload="t=21.5,h=40,p=1013", binary=False):
+    """+RCV lines parsed per second by LoRaProp.drain_received (returning bytes if binary)."""
+    with EmulatedModule() as module:
+        lora = LoRaProp(module.port, binary=binary)
+
+        def produce():
+            for i in range(frames):
+                module.module.receive(7, payload.encode(), -60, 9)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        started = time.perf_counter()
+        producer.start()
+        received = 0
+        while received < frames:
+            for _ in lora.drain_received():
+                received += 1
+        elapsed = time.perf_counter() - started
+        producer.join()
+        lora.ser.close()
+    return {"frames": frames, "seconds": elapsed, "frames_per_second": frames / elapsed}
+
+def tx_drain_rate(frames=200, payload="t=21.5,h=40,p=1013", time_scale=0.01):
+    """Frames per second TxScheduler pushes through an emulated module."""
+    channel = Channel(time_scale=time_scale)
+    with EmulatedModule(channel) as module:
+        lora = LoRaProp(module.port)
+        params = lora.get_rf_parameters()
+        tx = TxScheduler(lora, duty_cycle=1.0, guard=0.0, rf_parameters=params)
+        # Scale airtime like the channel does so spacing matches the emulated radio
+        tx.airtime = lambda data: time_on_air(len(data), *params) * time_scale
+        for _ in range(frames):
+            tx.send_data(101, payload)
+        started = time.perf_counter()
+        tx.flush()
+        elapsed = time.perf_counter() - started
+        lora.ser.close()
+    return {"frames": frames, "seconds": elapsed, "frames_per_second": frames / elapsed,
+            "sent": module.module.sent}
+
+def startup_time(reset_time=0.5, restarts=5):
+    """LoRaProp construction time on a module that is already set up,
+    with the default start (mode set + reset) and with fast_start."""
+    results = {}
+    with EmulatedModule(reset_time=reset_time) as module:
+        LoRaProp(module.port).ser.close()  # Put the module in proprietary mode first
+        for name, options in (("default", {}), ("fast_start", {"fast_start": True})):
+            samples = []
+            for _ in range(restarts):
+                started = time.perf_counter()
+                lora = LoRaProp(module.port, **options)
+                samples.append(time.perf_counter() - started)
+                lora.ser.close()
+            results[name] = percentiles(samples, points=(50,))
+    results["reset_time"] = reset_time
+    return results
+
+def journal_throughput(frames=100000, payload="t=21.5,h=40,p=1013", addresses=50):
+    """RX journal append rate, full replay rate and query latency."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "rx.journal")
+    try:
+        started = time.perf_counter()
+        with JournalWriter(path) as journal:
+            for i in range(frames):
+                journal.append({"address": i % addresses, "data": payload, "rssi": -60, "snr": 9}, timestamp=float(i))
+        appended = time.perf_counter() - started
+
+        with JournalReader(path) as reader:
+            started = time.perf_counter()
+            replayed = sum(1 for _ in reader)
+            replay = time.perf_counter() - started
+            started = time.perf_counter()
+            window = list(reader.between(frames / 2, frames / 2 + 600))
+            by_time = time.perf_counter() - started
+            started = time.perf_counter()
+            by_address = list(reader.from_address(7))
+            first_address = time.perf_counter() - started
+            started = time.perf_counter()
+            list(reader.from_address(8))
+            next_address = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory)
+    return {
+        "frames": frames,
+        "append_per_second": frames / appended,
+        "replay_per_second": replayed / replay,
+        "time_query_ms": 1000 * by_time,
+        "time_query_frames": len(window),
+        "address_query_ms": 1000 * first_address,
+        "address_query_warm_ms": 1000 * next_address,
+        "address_query_frames": len(by_address),
+    }
+
+def compression_ratio(training=2000, frames=1000, dictionary_size=1024, rf_parameters=(9, 7, 1, 12)):
+    """On-air size and airtime of JSON telemetry with a trained shared dictionary."""
+    rng = random.Random(1)
+
+    def reading():
+        return json.dumps({
+            "node": f"n{rng.randrange(20):02d}",
+            "t": round(rng.uniform(15, 30), 1),
+            "h": rng.randrange(30, 70),
+            "bat": round(rng.uniform(3.3, 4.2), 2),
+            "st": rng.choice(["ok", "ok", "low"]),
+        }, separators=(",", ":"))
+
+    started = time.perf_counter()
+    zdict = train_dictionary([reading() for _ in range(training)], size=dictionary_size)
+    trained = time.perf_counter() - started
+
+    class Radio:
+        def send_bytes(self, rx_addr, buf):
+            self.last = buf
+
+    radio = Radio()
+    compressor = Compressor(radio, zdict)
+    plain_airtime = packed_airtime = 0.0
+    started = time.perf_counter()
+    for _ in range(frames):
+        payload = reading()
+        compressor.send_data(0, payload)
+        plain_airtime += time_on_air(len(payload), *rf_parameters)
+        packed_airtime += time_on_air(len(radio.last), *rf_parameters)
+    elapsed = time.perf_counter() - started
+    return {
+        "frames": frames,
+        "training_seconds": trained,
+        "microseconds_per_frame": elapsed / frames * 1e6,
+        "ratio": compressor.ratio(),
+        "mean_bytes": compressor.stats["bytes_in"] / frames,
+        "mean_compressed_bytes": compressor.stats["bytes_out"] / frames,
+        "airtime_ratio": packed_airtime / plain_airtime,
+    }
+
+def reliable_goodput(messages=40, windows=(1, 8), payload="set valve=3 open", time_scale=0.1):
+    """Messages per second delivered in order by ReliableLink, per window size."""
+    results = {}
+    for window in windows:
+        channel = Channel(time_scale=time_scale)
+        with EmulatedModule(channel) as a, EmulatedModule(channel) as b:
+            tx, rx = LoRaProp(a.port), LoRaProp(b.port)
+            tx.set_address(100)
+            rx.set_address(101)
+            sender = ReliableLink(tx, window=window, initial_rto=0.5, min_rto=0.05)
+            receiver = ReliableLink(rx, ack_delay=0.0)
+            started = time.perf_counter()
+            for _ in range(messages):
+                sender.send_data(101, payload)
+            delivered = 0
+            deadline = time.monotonic() + 60
+            while (delivered < messages or sender.pending()) and time.monotonic() < deadline:
+                while receiver.get_received_data() is not None:
+                    delivered += 1
+                sender.poll()
+                time.sleep(0.001)
+            elapsed = time.perf_counter() - started
+            tx.ser.close()
+            rx.ser.close()
+        results[f"window_{window}"] = {
+            "delivered": delivered,
+            "seconds": elapsed,
+            "messages_per_second": delivered / elapsed,
+            "resent": sender.stats["resent"],
+        }
+    return results
+
+def end_to_end_latency(messages=50, interval=0.05, time_scale=0.1):
+    """Socket -> gateway A -> radio -> gateway B -> HTTP latency through lora_module.gateway."""
+    sink = HttpSink()
+    upstream = sink.url
+
+    channel = Channel(time_scale=time_scale)
+    sent = {}
+    with EmulatedModule(channel) as a, EmulatedModule(channel) as b:
+        gateways = []
+        threads = []
+        for module, address in ((a, 100), (b, 101)):
+            lora = LoRaProp(module.port)
+            lora.set_address(address)
+            gateway = Gateway(lora, "127.0.0.1", 0, dest=101, upstream=upstream, linger=0.0)
+            params = gateway.scheduler.rf_parameters
+            # Pace by the emulated (scaled) airtime rather than the real one
+            gateway.scheduler.airtime = lambda data, params=params: time_on_air(len(data), *params) * time_scale
+            gateway.scheduler.guard *= time_scale
+            gateways.append(gateway)
+            threads.append(threading.Thread(target=gateway.serve_forever, daemon=True))
+            threads[-1].start()
+
+        client = socket.create_connection(gateways[0].address)
+        for i in range(messages):
+            sent[str(i)] = time.monotonic()
+            client.sendall(f"{i}\n".encode())
+            time.sleep(interval)
+
+        sink.wait_for(messages, timeout=10)
+        client.close()
+        for gateway, thread in zip(gateways, threads):
+            gateway.stop()
+            thread.join()
+            gateway.close()
+            gateway.lora.ser.close()
+    sink.close()
+
+    samples = [at - sent[frame["data"]] for at, frame in sink.arrivals if frame["data"] in sent]
+    result = percentiles(samples)
+    result["delivered"] = len(samples)
+    result["sent"] = messages
+    return result
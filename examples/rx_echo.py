@@ -15,7 +15,8 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     address = 101
-    lora = LoRaProp(args.device)
+    # Skip the mode reset when the module is already set up, so restarts are quick
+    lora = LoRaProp(args.device, cached=True, fast_start=True)
     lora.set_address(address)
     print(f"Starting LoRA Rx server at LoRA address {address}...")
     while True:
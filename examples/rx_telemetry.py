@@ -0,0 +1,29 @@
+import argparse
+from lora_module.codec import SchemaRegistry
+from lora_module.lora_module import LoRaProp
+
+# Tags and layouts must match the senders'
+schemas = SchemaRegistry()
+schemas.register(1, "climate", [("temp", "h", 10), ("hum", "B"), ("pressure", "H")])
+schemas.register(2, "door", [("open", "?"), ("count", "I")])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='rx server decoding binary telemetry')
+    parser.add_argument(
+            'device',
+            type=str,
+            help='Name of serial device file (e.g. /dev/ttyUSB0)'
+    )
+    args = parser.parse_args()
+
+    lora = LoRaProp(args.device, binary=True)
+    lora.set_address(101)
+    print("Starting LoRA telemetry server")
+    while True:
+        frame = lora.get_received_data()
+        if frame:
+            if schemas.identify(frame):
+                name, values = schemas.decode(frame)
+                print(frame["address"], name, values)
+            else:
+                print(frame)
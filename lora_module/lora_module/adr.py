@@ -0,0 +1,177 @@
+########################################################################
+### Adaptive data rate                                               ###
+###   Tracks link quality per peer from received frames and sends    ###
+###   each frame at the fastest spreading factor / bandwidth the     ###
+###   link supports with a safety margin, grouping sends by rate     ###
+###   so the module is not reconfigured for every frame.             ###
+########################################################################
+
+import math
+import time
+from collections import OrderedDict, deque
+
+from .airtime import bandwidths, time_on_air
+from .lora_module import LoRaError
+
+# Lowest SNR (dB) a frame can be demodulated at, per spreading factor
+required_snr = {5: -2.5, 6: -5.0, 7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+
+class AdrController:
+    def __init__(
+            self,
+            lora,
+            classes=None,
+            margin=10.0,
+            min_samples=3,
+            alpha=0.3,
+            max_age=600,
+            max_run=16,
+            guard=0.05,
+            rf_parameters=None,
+            clock=time.monotonic
+        ):
+        """Wraps a LoRaProp (send_data, set_parameter, get_rf_parameters).
+
+        classes: (sf, bw) rates to choose from; by default every spreading
+            factor from 7 up to the configured one, at the configured bandwidth
+        margin: dB of SNR kept in reserve above the demodulation floor
+        min_samples: frames heard from a peer before its rate is raised
+        alpha: weight of the newest sample in the per-peer SNR average
+        max_age: seconds without hearing a peer before it falls back to
+            the configured (base) rate
+        max_run: frames sent at one rate before other waiting rates get a turn
+        guard: gap left after each frame's time on air, in seconds
+
+        The module only hears frames sent at its own rate, so a peer must be
+        listening at the rate chosen for it: provisioned per class, running
+        its own controller, or served by a RadioPool radio per rate. After
+        each run the module returns to the base rate to listen. Broadcasts
+        and peers without enough samples always use the base rate.
+
+        Register the controller as a hook (lora.add_hook) so that it sees
+        received frames, or feed it with observe().
+        """
+        self.lora = lora
+        self.base = tuple(rf_parameters or lora.get_rf_parameters())
+        sf, bw = self.base[:2]
+        classes = classes or [(s, bw) for s in range(7, sf + 1)]
+        # Fastest first
+        self.classes = sorted(set(classes), key=lambda c: time_on_air(32, c[0], c[1], *self.base[2:]))
+        self.margin = margin
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.max_age = max_age
+        self.max_run = max_run
+        self.guard = guard
+        self.clock = clock
+        self.links = {}  # address -> [average snr, average rssi, samples, last heard]
+        self.current = self.base[:2]
+        self.reconfigurations = 0
+        self._queues = OrderedDict()  # (sf, bw) -> deque of (rx_addr, data)
+        self._run = 0
+        self._free_at = 0.0
+
+    # Link quality
+
+    def observe(self, address, snr, rssi, rate=None):
+        """Records one frame heard from address; rate is the (sf, bw) it was received at."""
+        bw = (rate or self.current)[1]
+        # Normalise to the base bandwidth: noise grows 3 dB per doubling
+        snr += 10 * math.log10(bandwidths[bw] / bandwidths[self.base[1]])
+        link = self.links.get(address)
+        if link is None:
+            self.links[address] = [snr, rssi, 1, self.clock()]
+            return
+        link[0] += self.alpha * (snr - link[0])
+        link[1] += self.alpha * (rssi - link[1])
+        link[2] += 1
+        link[3] = self.clock()
+
+    def on_frame(self, frame):
+        self.observe(frame["address"], frame["snr"], frame["rssi"])
+
+    def on_command(self, command, seconds, status):
+        pass
+
+    def rate_for(self, rx_addr):
+        """(sf, bw) frames to rx_addr are sent at."""
+        link = self.links.get(rx_addr)
+        if (rx_addr == 0 or link is None or link[2] < self.min_samples
+                or self.clock() - link[3] > self.max_age):
+            return self.base[:2]
+        for sf, bw in self.classes:
+            penalty = 10 * math.log10(bandwidths[bw] / bandwidths[self.base[1]])
+            if link[0] - penalty - self.margin >= required_snr[sf]:
+                return (sf, bw)
+        return self.base[:2]
+
+    # TX
+
+    def send_data(self, rx_addr, data):
+        """Queues data for rx_addr under its rate; returns the (sf, bw) chosen."""
+        rate = self.rate_for(rx_addr)
+        self._queues.setdefault(rate, deque()).append((rx_addr, data))
+        return rate
+
+    def pending(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_rate(self):
+        """Rate of the next frame: the current run continues up to max_run,
+        then the longest-waiting other rate gets its turn."""
+        if self.current in self._queues and self._run < self.max_run:
+            return self.current
+        for rate in self._queues:  # Only rates with frames waiting are kept
+            if rate != self.current:
+                return rate
+        return self.current if self.current in self._queues else None
+
+    def _configure(self, rate):
+        if rate != self.current:
+            self.lora.set_parameter(rate[0], rate[1], *self.base[2:])
+            self.current = rate
+            self.reconfigurations += 1
+            self._run = 0
+
+    def poll(self):
+        """Sends the next frame if the channel is free; returns the send_data response, else None.
+
+        Once nothing is waiting, the module is returned to the base rate.
+        """
+        now = self.clock()
+        if now < self._free_at:
+            return None
+        rate = self._next_rate()
+        if rate is None:
+            self._configure(self.base[:2])
+            return None
+        self._configure(rate)
+        rx_addr, data = self._queues[rate][0]
+        try:
+            response = self.lora.send_data(rx_addr, data)
+        except LoRaError as exc:
+            if exc.code != "AT_BUSY_ERROR":
+                raise
+            self._free_at = now + time_on_air(len(data), *rate, *self.base[2:])
+            return None
+        queue = self._queues[rate]
+        queue.popleft()
+        if not queue:
+            del self._queues[rate]  # Waiting rates keep their arrival order
+        self._run += 1
+        self._free_at = now + time_on_air(len(data), *rate, *self.base[2:]) + self.guard
+        return response
+
+    def flush(self, timeout=None):
+        """Sends everything queued and returns to the base rate (or gives up after timeout seconds)."""
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            self.poll()
+            if not self.pending() and self.current == self.base[:2]:
+                return True
+            now = self.clock()
+            if deadline is not None and now >= deadline:
+                return False
+            if self._free_at > now:
+                time.sleep(self._free_at - now)
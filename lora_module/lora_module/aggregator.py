@@ -0,0 +1,81 @@
+########################################################################
+### Outbound frame aggregation                                       ###
+###   Coalesces small messages bound for the same address into one   ###
+###   LoRa frame, so they share the preamble and AT round trip.      ###
+###   LoRaProp.get_received_data splits them apart on the far side.  ###
+########################################################################
+
+import time
+
+from .framing import aggregate_marker, max_payload, pack_messages, packed_size
+
+
+class Aggregator:
+    def __init__(
+            self,
+            lora,
+            linger=0.05,
+            threshold=None,
+            max_payload=max_payload,
+            clock=time.monotonic
+        ):
+        """Wraps anything with send_data(rx_addr, data), e.g. a LoRaProp or TxScheduler.
+
+        linger: longest time, in seconds, a message waits for company
+        threshold: packed frame size that triggers an immediate send
+            (defaults to max_payload)
+        max_payload: largest frame handed to send_data
+        """
+        self.lora = lora
+        self.linger = linger
+        self.max_payload = max_payload
+        self.threshold = threshold or max_payload
+        self.clock = clock
+        self._pending = {}  # rx_addr -> (first queued at, [messages])
+
+    def send_data(self, rx_addr, data):
+        """Queues data for rx_addr; sends once the frame is full or has lingered."""
+        if not isinstance(data, str):
+            raise Exception(f"Aggregator only carries str payloads, not {type(data).__name__}")
+        if packed_size([data]) > self.max_payload:
+            # Too big to share a frame; flush what is ahead of it to keep ordering
+            self.flush(rx_addr)
+            return self.lora.send_data(rx_addr, data)
+
+        if rx_addr in self._pending:
+            if packed_size(self._pending[rx_addr][1] + [data]) > self.max_payload:
+                self.flush(rx_addr)
+        if rx_addr not in self._pending:
+            self._pending[rx_addr] = (self.clock(), [])
+        messages = self._pending[rx_addr][1]
+        messages.append(data)
+
+        if packed_size(messages) >= self.threshold:
+            return self.flush(rx_addr)
+        return None
+
+    def pending(self):
+        """Number of messages waiting to be sent."""
+        return sum(len(messages) for _, messages in self._pending.values())
+
+    def poll(self):
+        """Sends every frame whose linger time has expired."""
+        now = self.clock()
+        for rx_addr, (queued_at, _) in list(self._pending.items()):
+            if now - queued_at >= self.linger:
+                self.flush(rx_addr)
+
+    def flush(self, rx_addr=None):
+        """Sends pending frames now, for one address or all of them."""
+        addresses = list(self._pending) if rx_addr is None else [rx_addr]
+        response = None
+        for address in addresses:
+            if address not in self._pending:
+                continue
+            _, messages = self._pending.pop(address)
+            if len(messages) == 1 and not messages[0].startswith(aggregate_marker):
+                # A lone message goes out as-is, without framing overhead
+                response = self.lora.send_data(address, messages[0])
+            else:
+                response = self.lora.send_data(address, pack_messages(messages))
+        return response
@@ -0,0 +1,226 @@
+########################################################################
+### asyncio transport for LoRA modules                               ###
+###   A single reader task owns the serial port. Unsolicited +RCV    ###
+###   lines go to an async queue, command replies resolve futures.   ###
+########################################################################
+
+import asyncio
+import serial
+
+from .lora_module import LoRaError, LoRaMode, error_messages, parse_received_line
+
+
+class AsyncLoRaModule:
+    def __init__(
+            self,
+            port,
+            baudrate=9600,
+            timeout=None
+        ):
+        """timeout is the per-command reply timeout in seconds (None waits forever)."""
+        self.ser = serial.Serial(port, baudrate, timeout=0)
+        self.timeout = timeout
+        self._buffer = bytearray()
+        self._reader = None
+        self._lock = None
+        self._readable = None
+        self._pending = None
+        self._response_lines = []
+        self._received = None
+
+    async def open(self):
+        """Starts the background reader. Must be awaited before any command."""
+        loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._readable = asyncio.Event()
+        self._received = asyncio.Queue()
+        loop.add_reader(self.ser.fileno(), self._readable.set)
+        self._reader = loop.create_task(self._read_loop())
+        return self
+
+    async def close(self):
+        """Stops the reader task and closes the serial port."""
+        if self._reader is not None:
+            asyncio.get_running_loop().remove_reader(self.ser.fileno())
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        self.ser.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                await self._readable.wait()
+                self._readable.clear()
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+                if not chunk:
+                    continue
+                self._buffer.extend(chunk)
+                while True:
+                    end = self._buffer.find(b"\n")
+                    if end < 0:
+                        break
+                    line = self._buffer[:end].decode(errors="replace").strip()
+                    del self._buffer[:end + 1]
+                    if line:
+                        self._dispatch(line)
+        except Exception as exc:
+            if self._pending is not None and not self._pending.done():
+                self._pending.set_exception(exc)
+            raise
+
+    def _dispatch(self, line):
+        """Routes one line to the RX queue or to the command awaiting a reply."""
+        if line.startswith("+RCV="):
+            try:
+                frame = parse_received_line(line)
+            except ValueError:
+                return  # Corrupt frame; the reader must keep going
+            self._received.put_nowait(frame)
+            return
+        if self._pending is None or self._pending.done():
+            return  # Unsolicited status line, e.g. +READY after power-up
+        self._response_lines.append(line)
+        if line in error_messages.keys() or line in ("OK", "+READY"):
+            self._pending.set_result(self._response_lines)
+
+    async def send_command(self, command):
+        """Sends an AT command and waits for its reply, without blocking the loop."""
+        async with self._lock:
+            self._response_lines = []
+            self._pending = asyncio.get_running_loop().create_future()
+            self.ser.write((command + "\r\n").encode())
+            try:
+                response_lines = await asyncio.wait_for(self._pending, self.timeout)
+            finally:
+                self._pending = None
+
+        status_line = response_lines[-1]
+        if status_line in ("OK", "+READY"):
+            return response_lines[:-1]
+        error_code = status_line.split("=")[-1]
+        self._handle_error(error_code)
+
+    def _handle_error(self, error_code):
+        """Handles error codes returned by the LoRa module."""
+        error_message = error_messages.get(error_code, "Unknown error code.")
+        raise LoRaError(error_code, error_message)
+
+    async def get_received_data(self):
+        """Waits for and returns the next received frame."""
+        return await self._received.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get_received_data()
+
+    async def reset(self):
+        """Resets the module."""
+        return await self.send_command("ATZ")
+
+    async def get_mode(self):
+        """Gets the operating mode of the module."""
+        return await self.send_command("AT+OPMODE=?")
+
+    async def set_mode(self, opmode):
+        """Sets the operating mode of the module.
+
+        opmode=0 : LoRAWAN
+        opmode=1 : Proprietary LoRA
+        """
+        return await self.send_command(f"AT+OPMODE={opmode}")
+
+    async def get_firmware_version(self):
+        """Gets the firmware version."""
+        return await self.send_command("AT+VER=?")
+
+    async def set_band(self, frequency):
+        """Sets the LoRa center frequency (in Hz)."""
+        return await self.send_command(f"AT+BAND={frequency}")
+
+    async def get_band(self):
+        """Retrieves the LoRa center frequency (in Hz)."""
+        return await self.send_command("AT+BAND=?")
+
+    async def set_parameters(self, sf, bw, cr, preamble):
+        """Sets the LoRa RF parameters."""
+        return await self.send_command(f"AT+PARAMETER={sf},{bw},{cr},{preamble}")
+
+    async def set_address(self, address):
+        """Sets the module address."""
+        return await self.send_command(f"AT+ADDRESS={address}")
+
+    async def set_network_id(self, network_id):
+        """Sets the LoRa network ID."""
+        return await self.send_command(f"AT+NETWORKID={network_id}")
+
+    async def send_data(self, address, data):
+        """Sends data to the specified address."""
+        return await self.send_command(f"AT+SEND={address},{len(data)},{data}")
+
+    async def set_password(self, password):
+        """Sets the AES128 encryption password."""
+        return await self.send_command(f"AT+CPIN={password}")
+
+    async def set_rf_power(self, power):
+        """Sets the RF output power (0-15 dBm)."""
+        return await self.send_command(f"AT+CRFOP={power}")
+
+    async def get_unique_id(self):
+        """Gets the module's unique ID."""
+        return await self.send_command("AT+UID=?")
+
+    async def factory_reset(self):
+        """Resets all parameters to factory defaults."""
+        return await self.send_command("AT+FACTORY")
+
+
+class AsyncLoRaProp(AsyncLoRaModule):
+    async def open(self):
+        """Starts the reader and puts the module into proprietary mode."""
+        await super().open()
+        await self.set_mode(LoRaMode.MODE_PROPRTY.value)
+        await self.reset() # Reset req'd for mode setting to take
+        return self
+
+    async def get_parameter(self):
+        """Gets current rf parameter settings (sf, bw, cr, preamble)"""
+        return await self.send_command("AT+PARAMETER=?")
+
+    async def set_parameter(self, sf, bw, cr, preamble):
+        """Sets rf parameter settings (sf, bw, cr, preamble)"""
+        return await self.send_command(f"AT+PARAMETER={sf},{bw},{cr},{preamble}")
+
+    async def get_address(self):
+        """Gets current node address (0-65535)"""
+        return await self.send_command("AT+ADDRESS=?")
+
+    async def get_node_pin(self):
+        """Gets eight character node pin"""
+        return await self.send_command("AT+CPIN=?")
+
+    async def set_node_pin(self, node_pin):
+        """Sets eight character node pin"""
+        return await self.send_command(f"AT+CPIN={node_pin}")
+
+    async def get_tx_power(self):
+        """Gets RF transmit power (in dBm)"""
+        return await self.send_command("AT+CRFOP=?")
+
+    async def set_tx_power(self, pwr_dbm):
+        """Sets RF transmit power,in dBm - (0-22dBM)"""
+        return await self.send_command(f"AT+CRFOP={pwr_dbm}")
+
+    async def send_data(self, rx_addr, data):
+        return await self.send_command(f"AT+SEND={rx_addr},{len(data)},{data}")
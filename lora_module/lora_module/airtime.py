@@ -0,0 +1,54 @@
+########################################################################
+### LoRa time-on-air model                                           ###
+###   Semtech AN1200.13 formula, using the RYLR993 AT+PARAMETER      ###
+###   encodings for bandwidth and coding rate.                       ###
+########################################################################
+
+import math
+
+# AT+PARAMETER bandwidth code -> Hz
+bandwidths = {
+    0: 7.8e3,
+    1: 10.4e3,
+    2: 15.6e3,
+    3: 20.8e3,
+    4: 31.25e3,
+    5: 41.7e3,
+    6: 62.5e3,
+    7: 125e3,
+    8: 250e3,
+    9: 500e3,
+}
+
+def symbol_time(sf, bw):
+    """Duration of one LoRa symbol in seconds (bw is an AT+PARAMETER code)."""
+    return (2 ** sf) / bandwidths[bw]
+
+def time_on_air(
+        payload_length,
+        sf=9,
+        bw=7,
+        cr=1,
+        preamble=12,
+        explicit_header=True,
+        crc=True,
+        low_data_rate=None
+    ):
+    """Seconds a payload_length byte frame occupies the channel.
+
+    sf: spreading factor (5-12)
+    bw: bandwidth code (7 = 125kHz, 8 = 250kHz, 9 = 500kHz)
+    cr: coding rate code (1 = 4/5 ... 4 = 4/8)
+    preamble: programmed preamble length in symbols
+    low_data_rate: force low data rate optimisation; by default it is on
+        when a symbol lasts longer than 16 ms, as the radio does.
+    """
+    t_sym = symbol_time(sf, bw)
+    if low_data_rate is None:
+        low_data_rate = t_sym > 0.016
+    de = 1 if low_data_rate else 0
+    ih = 0 if explicit_header else 1
+
+    numerator = 8 * payload_length - 4 * sf + 28 + 16 * int(crc) - 20 * ih
+    payload_symbols = 8 + max(math.ceil(numerator / (4 * (sf - 2 * de))) * (cr + 4), 0)
+    return (preamble + 4.25) * t_sym + payload_symbols * t_sym
@@ -0,0 +1,146 @@
+########################################################################
+### Compact binary payloads                                          ###
+###   A registry of fixed struct layouts, each identified by a one-  ###
+###   byte tag at the start of the payload. Messages are encoded on  ###
+###   send and decoded on receive, and runs of one type can be       ###
+###   decoded in a single pass into columns or NumPy arrays.         ###
+########################################################################
+
+import struct
+
+# struct codes whose NumPy equivalent differs (struct's standard sizes)
+_numpy_codes = {"l": "i", "L": "I"}
+
+
+def _numpy_format(fmt):
+    """NumPy dtype string for one little-endian struct format code."""
+    if fmt.endswith("s"):
+        return "S" + (fmt[:-1] or "1")
+    return "<" + _numpy_codes.get(fmt, fmt)
+
+
+class Schema:
+    def __init__(self, tag, name, fields):
+        """fields: (name, format) or (name, format, scale) tuples, where
+        format is one struct format code (e.g. "h", "B", "f", "4s") and
+        scale, if given, stores round(value * scale) and decodes
+        stored / scale, e.g. a temperature of 21.5 as the int16 215.
+        """
+        if not 0 <= tag <= 0xff:
+            raise Exception(f"Schema tag must fit one byte: {tag}")
+        self.tag = tag
+        self.name = name
+        self.fields = [field[0] for field in fields]
+        self.formats = [field[1] for field in fields]
+        self.scales = [field[2] if len(field) > 2 else None for field in fields]
+        # Little-endian and unpadded, tag first
+        self.struct = struct.Struct("<B" + "".join(self.formats))
+        self.size = self.struct.size
+
+    def encode(self, values):
+        """Payload for values (a mapping of every field)."""
+        packed = []
+        for name, scale in zip(self.fields, self.scales):
+            value = values[name]
+            packed.append(value if scale is None else round(value * scale))
+        return self.struct.pack(self.tag, *packed)
+
+    def decode(self, data):
+        """Field values of one payload, as a dict."""
+        fields = self.struct.unpack(data)[1:]
+        return {
+            name: value if scale is None else value / scale
+            for name, value, scale in zip(self.fields, fields, self.scales)
+        }
+
+    def dtype(self):
+        """NumPy structured dtype matching the payload layout."""
+        import numpy
+        return numpy.dtype([("tag", "u1")] + [(name, _numpy_format(fmt)) for name, fmt in zip(self.fields, self.formats)])
+
+
+def _payload(item):
+    """Raw bytes of a payload, or of a received frame's data."""
+    if isinstance(item, dict):
+        item = item["data"]
+    return item.encode() if isinstance(item, str) else item
+
+
+class SchemaRegistry:
+    def __init__(self):
+        self._by_tag = {}
+        self._by_name = {}
+
+    def register(self, tag, name, fields):
+        """Adds a message type; returns its Schema."""
+        if tag in self._by_tag or name in self._by_name:
+            raise Exception(f"Schema {name} (tag {tag}) clashes with one already registered")
+        schema = Schema(tag, name, fields)
+        self._by_tag[tag] = schema
+        self._by_name[name] = schema
+        return schema
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def encode(self, name, values=None, **fields):
+        """Payload of a name message; values given as a mapping and/or keywords.
+
+        Send it with LoRaProp.send_bytes.
+        """
+        return self._by_name[name].encode(dict(values or {}, **fields))
+
+    def identify(self, data):
+        """Schema a payload (or frame) claims by its tag, else None."""
+        data = _payload(data)
+        schema = self._by_tag.get(data[0]) if len(data) else None
+        if schema is None or len(data) != schema.size:
+            return None
+        return schema
+
+    def decode(self, data):
+        """(name, values) of a payload or received frame; raises if no schema matches."""
+        schema = self.identify(data)
+        if schema is None:
+            raise Exception("Payload matches no registered schema")
+        return schema.name, schema.decode(_payload(data))
+
+    def _run(self, items, schema):
+        """The payloads of one type among items, joined into one buffer."""
+        payloads = [_payload(item) for item in items]
+        return b"".join(p for p in payloads if len(p) == schema.size and p[0] == schema.tag)
+
+    def decode_columns(self, items, name):
+        """Every name message among payloads or frames, as {field: list}, in one pass.
+
+        Scaled fields are returned scaled; other types are skipped.
+        """
+        schema = self._by_name[name]
+        rows = schema.struct.iter_unpack(self._run(items, schema))
+        columns = list(zip(*rows))[1:] or [()] * len(schema.fields)
+        return {
+            field: list(column) if scale is None else [v / scale for v in column]
+            for field, column, scale in zip(schema.fields, columns, schema.scales)
+        }
+
+    def decode_batch(self, items, name):
+        """Every name message among payloads or frames, as {field: NumPy array}.
+
+        The matching payloads are joined and viewed through the schema's
+        structured dtype, so thousands of frames decode in one call.
+        Without numpy (pip install lora_module[numpy]) the columns come
+        back as lists, as from decode_columns.
+        """
+        try:
+            import numpy
+        except ImportError:
+            return self.decode_columns(items, name)
+        schema = self._by_name[name]
+        records = numpy.frombuffer(self._run(items, schema), dtype=schema.dtype())
+        return {
+            field: records[field] if scale is None else records[field] / scale
+            for field, scale in zip(schema.fields, schema.scales)
+        }
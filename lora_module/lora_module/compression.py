@@ -0,0 +1,140 @@
+########################################################################
+### Payload compression with shared dictionaries                     ###
+###   Short telemetry frames do not compress on their own, so both   ###
+###   ends prime raw deflate with the same pre-trained dictionary.   ###
+###   A flag byte marks compressed frames; everything else passes    ###
+###   through, so plain senders and receivers still interoperate.    ###
+########################################################################
+
+import zlib
+from collections import Counter
+
+from .framing import compressed_header_size, compressed_marker, is_compressed, stored_dictionary
+
+# Raw deflate: no zlib header or checksum, 6 bytes a frame cannot spare
+_wbits = -15
+
+
+def train_dictionary(samples, size=1024, min_length=3, max_length=32):
+    """Builds a zdict from sample payloads (bytes or str).
+
+    Substrings that recur across samples are scored by how often they
+    occur times how many bytes a match saves; the best are packed in,
+    strongest last, since deflate codes near matches most cheaply.
+    """
+    samples = [s.encode() if isinstance(s, str) else bytes(s) for s in samples]
+    counts = Counter()
+    for sample in samples:
+        seen = set()
+        for length in range(min_length, max_length + 1):
+            for start in range(len(sample) - length + 1):
+                seen.add(sample[start:start + length])
+        counts.update(seen)  # Once per sample: recurrence across frames is what helps
+    scored = sorted(counts.items(), key=lambda item: item[1] * (len(item[0]) - 2), reverse=True)
+
+    chosen = []
+    used = 0
+    for substring, count in scored:
+        if count < 2:
+            break
+        if used + len(substring) > size:
+            continue
+        if any(substring in kept for kept in chosen):
+            continue
+        chosen.append(substring)
+        used += len(substring)
+        if used >= size - min_length:
+            break
+    return b"".join(reversed(chosen))
+
+
+class Compressor:
+    def __init__(self, lora, dictionaries, current=None, level=9, text=False):
+        """Wraps a LoRaProp opened with binary=True (send_bytes, get_received_data).
+
+        dictionaries: shared zdict bytes, or {id: zdict} with ids 0-254,
+            so dictionaries can be rolled out while older ones still decode
+        current: id of the dictionary new frames are compressed with
+            (the highest by default)
+        text: return received payloads as str instead of bytes
+
+        A frame is only sent compressed if that makes it smaller.
+        """
+        if not isinstance(dictionaries, dict):
+            dictionaries = {0: dictionaries}
+        if stored_dictionary in dictionaries:
+            raise Exception(f"Dictionary id {stored_dictionary} is reserved")
+        self.lora = lora
+        self.text = text
+        self.current = max(dictionaries) if current is None else current
+        # Primed once; each frame works on a copy
+        self._compressors = {
+            i: zlib.compressobj(level, zlib.DEFLATED, _wbits, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+            for i, zdict in dictionaries.items()
+        }
+        self._decompressors = {i: zlib.decompressobj(_wbits, zdict) for i, zdict in dictionaries.items()}
+        self.stats = {"sent": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0, "received": 0, "errors": 0}
+
+    def compress(self, data):
+        """On-air form of data: flagged and compressed if that is smaller, else data itself."""
+        data = data.encode() if isinstance(data, str) else bytes(data)
+        compressor = self._compressors[self.current].copy()
+        packed = compressor.compress(data) + compressor.flush()
+        if compressed_header_size + len(packed) < len(data):
+            return compressed_marker + bytes((self.current,)) + packed
+        if is_compressed(data):
+            return compressed_marker + bytes((stored_dictionary,)) + data
+        return data
+
+    def decompress(self, data):
+        """Original payload of an on-air frame; raises on unknown dictionaries or corrupt data."""
+        if not is_compressed(data):
+            return data
+        dictionary = data[1] if len(data) > 1 else None
+        if dictionary == stored_dictionary:
+            return bytes(data[compressed_header_size:])
+        decompressor = self._decompressors.get(dictionary)
+        if decompressor is None:
+            raise Exception(f"Frame compressed with unknown dictionary {dictionary}")
+        decompressor = decompressor.copy()
+        payload = decompressor.decompress(data[compressed_header_size:]) + decompressor.flush()
+        if not decompressor.eof:
+            raise zlib.error("Truncated compressed frame")
+        return payload
+
+    def ratio(self):
+        """Bytes sent on air per payload byte (lower is better)."""
+        return self.stats["bytes_out"] / self.stats["bytes_in"] if self.stats["bytes_in"] else 1.0
+
+    def send_data(self, rx_addr, data):
+        """Sends data (str or any bytes-like object), compressed when that helps."""
+        frame = self.compress(data)
+        self.stats["sent"] += 1
+        self.stats["compressed"] += is_compressed(frame) and frame[1] != stored_dictionary
+        self.stats["bytes_in"] += len(data.encode() if isinstance(data, str) else memoryview(data).cast("B"))
+        self.stats["bytes_out"] += len(frame)
+        return self.lora.send_bytes(rx_addr, frame)
+
+    def _unpack(self, frame):
+        data = frame["data"]
+        if isinstance(data, (bytes, bytearray)) and is_compressed(data):
+            try:
+                data = self.decompress(data)
+            except Exception:
+                self.stats["errors"] += 1  # Left as received
+            else:
+                frame = dict(frame, data=data, length=len(data))
+        self.stats["received"] += 1
+        if self.text and not isinstance(frame["data"], str):
+            frame["data"] = frame["data"].decode(errors="replace")
+        return frame
+
+    def get_received_data(self):
+        """Next received frame with its payload decompressed, else None."""
+        frame = self.lora.get_received_data()
+        return None if frame is None else self._unpack(frame)
+
+    def drain_received(self):
+        """Generator over every frame already received, decompressed."""
+        for frame in self.lora.drain_received():
+            yield self._unpack(frame)
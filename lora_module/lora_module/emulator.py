@@ -0,0 +1,522 @@
+########################################################################
+### RYLR993 emulator for hardware-free testing                       ###
+###   Rylr993 is the AT command state machine; EmulatedModule puts   ###
+###   one on a pty so the library opens it like a real serial port.  ###
+###   Modules sharing a Channel hear each other's AT+SEND frames     ###
+###   after their time on air, with configurable RSSI/SNR and loss.  ###
+###   Modules in LoRaWAN mode talk to an emulated Network instead.   ###
+########################################################################
+
+import argparse
+import os
+import random
+import select
+import termios
+import threading
+import time
+import tty
+import uuid
+from collections import deque
+
+from .airtime import bandwidths, time_on_air
+from .framing import max_payload
+from .lora_module import uart_rates
+
+factory_settings = {
+    "OPMODE": "0",
+    "BAND": "915000000",
+    "PARAMETER": "9,7,1,12",
+    "ADDRESS": "0",
+    "NETWORKID": "18",
+    "CPIN": "00000000",
+    "CRFOP": "22",
+    "NJM": "1",
+    "APPEUI": "0000000000000000",
+    "APPKEY": "0" * 32,
+    "DEVADDR": "00000000",
+    "NWKSKEY": "0" * 32,
+    "APPSKEY": "0" * 32,
+    "FCU": "0",
+}
+
+# MHDR, FHDR, FPort and MIC around a LoRaWAN application payload
+lorawan_overhead = 13
+
+
+class Channel:
+    def __init__(self, rssi=-60, snr=9, loss=0.0, time_scale=1.0, carrier_sense=False, seed=None):
+        """The shared medium between emulated modules.
+
+        rssi, snr, loss: defaults for every link; override with set_link()
+        time_scale: multiplies every airtime delay (0 delivers instantly)
+        carrier_sense: refuse AT+SEND with AT_BUSY_ERROR while anyone on
+            the same band is transmitting, not only the sender itself
+        """
+        self.rssi = rssi
+        self.snr = snr
+        self.loss = loss
+        self.time_scale = time_scale
+        self.carrier_sense = carrier_sense
+        self.random = random.Random(seed)
+        self.radios = []
+        self.links = {}  # (sender, receiver) -> (rssi, snr, loss)
+        self.lock = threading.Lock()
+        self._busy_until = {}  # band -> time the last transmission ends
+
+    def attach(self, radio):
+        with self.lock:
+            self.radios.append(radio)
+
+    def detach(self, radio):
+        with self.lock:
+            if radio in self.radios:
+                self.radios.remove(radio)
+
+    def set_link(self, sender, receiver, rssi=None, snr=None, loss=None):
+        """Sets link quality from sender to receiver (both Rylr993 or EmulatedModule)."""
+        sender = getattr(sender, "module", sender)
+        receiver = getattr(receiver, "module", receiver)
+        self.links[(sender, receiver)] = (
+            self.rssi if rssi is None else rssi,
+            self.snr if snr is None else snr,
+            self.loss if loss is None else loss,
+        )
+
+    def busy(self, band, now):
+        return self._busy_until.get(band, 0) > now
+
+    def transmit(self, sender, dest, payload, airtime):
+        """Delivers payload to every module that can hear it after airtime seconds."""
+        now = time.monotonic()
+        with self.lock:
+            band = sender.settings["BAND"]
+            self._busy_until[band] = max(self._busy_until.get(band, 0), now + airtime)
+            receivers = []
+            for radio in self.radios:
+                if radio is sender or not radio.hears(sender, dest):
+                    continue
+                rssi, snr, loss = self.links.get((sender, radio), (self.rssi, self.snr, self.loss))
+                if loss and self.random.random() < loss:
+                    continue
+                receivers.append((radio, rssi, snr))
+
+        source = int(sender.settings["ADDRESS"])
+        for radio, rssi, snr in receivers:
+            if self.time_scale:
+                timer = threading.Timer(airtime * self.time_scale, radio.receive, (source, payload, rssi, snr))
+                timer.daemon = True
+                timer.start()
+            else:
+                radio.receive(source, payload, rssi, snr)
+
+
+class Network:
+    def __init__(self, join_delay=5.0, rx_delay=1.0, rssi=-80, snr=5, accept_joins=True, time_scale=1.0, seed=None):
+        """A LoRaWAN network server for modules in OPMODE 0.
+
+        join_delay: seconds from AT+JOIN to +EVT:JOINED (or JOIN_FAILED)
+        rx_delay: seconds from the end of an uplink to its ack or downlink
+        accept_joins: False makes every join fail
+        time_scale: multiplies both delays (0 answers instantly)
+
+        Sessions are kept by device address, and an uplink is only
+        accepted if its frame counter is above the last one seen, as a
+        real network server does.
+        """
+        self.join_delay = join_delay
+        self.rx_delay = rx_delay
+        self.rssi = rssi
+        self.snr = snr
+        self.accept_joins = accept_joins
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.joins = 0
+        self.sessions = {}  # device address -> {"dev_eui", "nwk_skey", "app_skey", "fcnt"}
+        self.uplinks = []  # (device address, port, confirmed, data), accepted ones only
+        self.lock = threading.Lock()
+        self._downlinks = {}  # DevEUI -> deque of (port, data)
+
+    def queue_downlink(self, dev_eui, port, data):
+        """Queues data for the device; it goes out after the device's next uplink."""
+        with self.lock:
+            self._downlinks.setdefault(getattr(dev_eui, "dev_eui", dev_eui), deque()).append((port, data))
+
+    def forget(self, dev_addr):
+        """Drops a session, as a network server does when a device is re-registered."""
+        with self.lock:
+            self.sessions.pop(dev_addr, None)
+
+    def join(self, dev_eui):
+        """Opens a session for dev_eui; returns (device address, nwk_skey, app_skey) or None."""
+        with self.lock:
+            if not self.accept_joins:
+                return None
+            self.joins += 1
+            dev_addr = f"{self.random.getrandbits(32):08X}"
+            nwk_skey = f"{self.random.getrandbits(128):032X}"
+            app_skey = f"{self.random.getrandbits(128):032X}"
+            self.sessions[dev_addr] = {"dev_eui": dev_eui, "nwk_skey": nwk_skey, "app_skey": app_skey, "fcnt": -1}
+            return dev_addr, nwk_skey, app_skey
+
+    def uplink(self, settings, dev_eui, port, confirmed, data):
+        """Handles one uplink; returns (accepted, downlink (port, data) or None)."""
+        with self.lock:
+            session = self.sessions.get(settings["DEVADDR"])
+            fcnt = int(settings["FCU"])
+            if (session is None or session["nwk_skey"] != settings["NWKSKEY"]
+                    or session["app_skey"] != settings["APPSKEY"] or fcnt <= session["fcnt"]):
+                return False, None
+            session["fcnt"] = fcnt
+            self.uplinks.append((settings["DEVADDR"], port, confirmed, data))
+            queue = self._downlinks.get(session["dev_eui"])
+            return True, queue.popleft() if queue else None
+
+
+class Rylr993:
+    def __init__(self, channel=None, uid=None, version="RYLR993 EMULATOR 1.0", network=None, clock=time.monotonic):
+        """AT command state machine of one module.
+
+        handle() takes one command (bytes, without line ending) and returns
+        the reply lines; frames heard on the channel, and LoRaWAN events
+        from network, are passed to output. clock times transmissions.
+        """
+        self.channel = channel
+        self.clock = clock
+        self.network = network
+        self.uid = uid or uuid.uuid4().hex[:24].upper()
+        self.dev_eui = self.uid[-16:]
+        self.joined = False
+        self.version = version
+        self.settings = dict(factory_settings)
+        self.uart_rate = 9600
+        self.output = None
+        self.sent = 0
+        self.received = 0
+        self._tx_until = 0.0
+        if channel is not None:
+            channel.attach(self)
+
+    def hears(self, sender, dest):
+        """Whether a frame from sender to dest reaches this module's host."""
+        mine = self.settings
+        theirs = sender.settings
+        if mine["OPMODE"] != "1" or theirs["OPMODE"] != mine["OPMODE"]:
+            return False
+        for key in ("BAND", "PARAMETER", "NETWORKID", "CPIN"):
+            if mine[key] != theirs[key]:
+                return False
+        return dest == 0 or dest == int(mine["ADDRESS"])
+
+    def receive(self, source, payload, rssi, snr):
+        self.received += 1
+        if self.output is not None:
+            header = f"+RCV={source},{len(payload)},".encode()
+            self.output(header + payload + f",{rssi},{snr}\r\n".encode())
+
+    def _event(self, line, delay, then=None):
+        """Outputs +EVT:line after delay seconds (scaled by the network's
+        time_scale), calling then() just before."""
+        delay *= self.network.time_scale if self.network else 1.0
+        data = f"+EVT:{line}\r\n".encode()
+
+        def fire():
+            if then is not None:
+                then()
+            if self.output is not None:
+                self.output(data)
+        if delay <= 0:
+            fire()
+            return
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        timer.start()
+
+    def has_session(self):
+        if self.settings["NJM"] == "1":
+            return self.joined
+        return self.settings["DEVADDR"] != factory_settings["DEVADDR"]
+
+    def airtime(self, length):
+        return time_on_air(length, *(int(v) for v in self.settings["PARAMETER"].split(",")))
+
+    def handle(self, command):
+        """Executes one AT command; returns the reply lines (str)."""
+        if command == b"AT":
+            return ["OK"]
+        if command == b"ATZ":
+            self._tx_until = 0.0
+            self.joined = False  # An OTAA session lives in RAM only
+            return ["+RESET", "+READY"]
+        if command == b"AT+JOIN":
+            return self._join()
+        if not command.startswith(b"AT+"):
+            return ["AT_ERROR"]
+
+        name, _, value = command[3:].partition(b"=")
+        name = name.decode(errors="replace")
+        if name == "SEND":
+            return self._send(value)
+        value = value.decode(errors="replace")
+
+        if name == "IPR":
+            if value == "?":
+                return [f"+IPR={self.uart_rate}", "OK"]
+            if not value.isdigit() or int(value) not in uart_rates:
+                return ["AT_PARAM_ERROR"]
+            self.uart_rate = int(value)  # Takes effect after this reply
+            return ["OK"]
+
+        if value == "?":
+            if name == "UID":
+                return [f"+UID={self.uid}", "OK"]
+            if name == "VER":
+                return [f"+VER={self.version}", "OK"]
+            if name == "DEVEUI":
+                return [f"+DEVEUI={self.dev_eui}", "OK"]
+            if name == "NJS":
+                return [f"+NJS={int(self.has_session())}", "OK"]
+            if name in self.settings:
+                return [f"+{name}={self.settings[name]}", "OK"]
+            return ["AT_ERROR"]
+
+        if name == "FACTORY":
+            self.settings = dict(factory_settings)
+            return ["OK"]
+        if name not in self.settings or name in ("UID", "VER"):
+            return ["AT_ERROR"]
+        if not self._valid(name, value):
+            return ["AT_PARAM_ERROR"]
+        self.settings[name] = value
+        return ["OK"]
+
+    def _valid(self, name, value):
+        try:
+            if name == "OPMODE":
+                return value in ("0", "1")
+            if name == "BAND":
+                return 100000000 <= int(value) <= 1000000000
+            if name == "PARAMETER":
+                sf, bw, cr, preamble = (int(v) for v in value.split(","))
+                return 5 <= sf <= 12 and bw in bandwidths and 1 <= cr <= 4 and 4 <= preamble <= 65535
+            if name == "ADDRESS":
+                return 0 <= int(value) <= 65535
+            if name == "NETWORKID":
+                return 0 <= int(value) <= 65535
+            if name == "CPIN":
+                return len(value) == 8 and all(c in "0123456789abcdefABCDEF" for c in value)
+            if name == "CRFOP":
+                return 0 <= int(value) <= 22
+            if name == "NJM":
+                return value in ("0", "1")
+            if name == "FCU":
+                return 0 <= int(value) < 2 ** 32
+            if name in ("APPEUI", "DEVADDR", "APPKEY", "NWKSKEY", "APPSKEY"):
+                int(value, 16)
+                return len(value) == len(factory_settings[name])
+        except ValueError:
+            return False
+        return True
+
+    def _join(self):
+        if self.settings["OPMODE"] != "0" or self.settings["NJM"] != "1":
+            return ["AT_ERROR"]
+        self.joined = False
+        session = self.network.join(self.dev_eui) if self.network else None
+        delay = self.network.join_delay if self.network else 5.0
+        if session is None:
+            self._event("JOIN_FAILED", delay)
+            return ["OK"]
+        self.settings["DEVADDR"], self.settings["NWKSKEY"], self.settings["APPSKEY"] = session
+        self.settings["FCU"] = "0"
+        self._event("JOINED", delay, then=lambda: setattr(self, "joined", True))
+        return ["OK"]
+
+    def _send_uplink(self, value):
+        try:
+            port, confirmed, payload = value.split(b",", 2)
+            port, confirmed = int(port), int(confirmed)
+        except ValueError:
+            return ["AT_PARAM_ERROR"]
+        if not 1 <= port <= 223 or confirmed not in (0, 1):
+            return ["AT_PARAM_ERROR"]
+        if not self.has_session():
+            return ["AT_NO_NETWORK_JOINED"]
+        if len(payload) > max_payload:
+            return ["AT_TEST_PARAM_OVERFLOW"]
+        now = self.clock()
+        if self._tx_until > now:
+            return ["AT_BUSY_ERROR"]
+
+        scale = self.network.time_scale if self.network else 1.0
+        rx_delay = self.network.rx_delay if self.network else 1.0
+        airtime = self.airtime(len(payload) + lorawan_overhead)
+        # The module stays busy through its receive windows
+        self._tx_until = now + (airtime + rx_delay) * scale
+        self.sent += 1
+        accepted, downlink = False, None
+        if self.network is not None:
+            accepted, downlink = self.network.uplink(self.settings, self.dev_eui, port, confirmed, payload)
+        self.settings["FCU"] = str(int(self.settings["FCU"]) + 1)
+        if confirmed:
+            self._event("SEND_CONFIRMED_OK" if accepted else "SEND_CONFIRMED_FAILED", airtime + rx_delay)
+        if downlink is not None:
+            rssi, snr = self.network.rssi, self.network.snr
+            self._event(f"RX_1:{rssi}:{snr}:UNICAST:{downlink[0]}:{downlink[1]}", airtime + rx_delay)
+        return ["OK"]
+
+    def _send(self, value):
+        if self.settings["OPMODE"] == "0":
+            return self._send_uplink(value)
+        try:
+            dest, length, payload = value.split(b",", 2)
+            dest, length = int(dest), int(length)
+        except ValueError:
+            return ["AT_PARAM_ERROR"]
+        if length != len(payload) or not 0 <= dest <= 65535:
+            return ["AT_PARAM_ERROR"]
+        if length > max_payload:
+            return ["AT_TEST_PARAM_OVERFLOW"]
+
+        now = self.clock()
+        band = self.settings["BAND"]
+        if self._tx_until > now or (self.channel and self.channel.carrier_sense and self.channel.busy(band, now)):
+            return ["AT_BUSY_ERROR"]
+        airtime = self.airtime(length)
+        scale = self.channel.time_scale if self.channel else 1.0
+        self._tx_until = now + airtime * scale
+        self.sent += 1
+        if self.channel is not None:
+            self.channel.transmit(self, dest, payload, airtime)
+        return ["OK"]
+
+
+class EmulatedModule:
+    def __init__(self, channel=None, uid=None, latency=0.0, baudrate=None, reset_time=0.0, network=None):
+        """A Rylr993 behind a pty; open .port with LoRaModule/LoRaProp
+        (or LoRaWAN, with a Network).
+
+        latency: seconds before each command is answered
+        reset_time: seconds an ATZ reboot takes before +READY
+        baudrate: if set, the module's UART rate (changed by AT+IPR):
+            replies are delayed by their wire time, and while the host
+            side of the pty is set to another rate it only gets garbage
+        """
+        self.module = Rylr993(channel, uid, network=network)
+        self.module.output = self._write
+        self.latency = latency
+        self.reset_time = reset_time
+        self.baudrate = baudrate
+        if baudrate:
+            self.module.uart_rate = baudrate
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._write_lock = threading.Lock()
+        self._buffer = bytearray()
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @property
+    def settings(self):
+        return self.module.settings
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        if self.module.channel is not None:
+            self.module.channel.detach(self.module)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _host_rate_matches(self):
+        speed = termios.tcgetattr(self._slave)[5]
+        return speed == getattr(termios, f"B{self.module.uart_rate}")
+
+    def _write(self, data):
+        if self.baudrate:
+            time.sleep(len(data) * 10 / self.module.uart_rate)
+        with self._write_lock:
+            if self._running:
+                os.write(self._master, data)
+
+    def _serve(self):
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                self._buffer.extend(os.read(self._master, 4096))
+            except OSError:
+                return
+            for command in self._commands():
+                if self.latency:
+                    time.sleep(self.latency)
+                if self.baudrate and not self._host_rate_matches():
+                    self._write(b"\xf8\x80\x00")  # What a rate mismatch looks like
+                    continue
+                replies = self.module.handle(command)
+                if command == b"ATZ" and self.reset_time:
+                    time.sleep(self.reset_time)
+                self._write("".join(line + "\r\n" for line in replies).encode())
+
+    def _commands(self):
+        return split_commands(self._buffer)
+
+
+def split_commands(buffer):
+    """Splits complete commands off a bytearray of host input.
+
+    AT+SEND payloads are taken by their length field, so they may
+    contain any byte, line endings included.
+    """
+    while True:
+        if buffer.startswith(b"AT+SEND="):
+            header_end = buffer.find(b",", buffer.find(b",") + 1)
+            if header_end > 0:
+                try:
+                    length = int(buffer[buffer.find(b",") + 1:header_end])
+                except ValueError:
+                    length = None
+                if length is not None:
+                    end = header_end + 1 + length
+                    if len(buffer) < end + 2:
+                        return
+                    if buffer[end:end + 2] == b"\r\n":
+                        command = bytes(buffer[:end])
+                        del buffer[:end + 2]
+                        yield command
+                        continue
+        end = buffer.find(b"\n")
+        if end < 0:
+            return
+        command = bytes(buffer[:end]).strip()
+        del buffer[:end + 1]
+        if command:
+            yield command
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run emulated RYLR993 modules on ptys')
+    parser.add_argument('--count', type=int, default=2, help='Number of modules on the channel')
+    parser.add_argument('--loss', type=float, default=0.0, help='Packet loss probability')
+    parser.add_argument('--latency', type=float, default=0.0, help='Command reply latency in seconds')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Airtime multiplier')
+    args = parser.parse_args()
+
+    channel = Channel(loss=args.loss, time_scale=args.time_scale)
+    modules = [EmulatedModule(channel, latency=args.latency) for _ in range(args.count)]
+    for module in modules:
+        print(module.port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for module in modules:
+            module.close()
@@ -0,0 +1,228 @@
+########################################################################
+### Off-radio-thread HTTP forwarding of received frames              ###
+###   Frames are queued, batched by count or linger time and POSTed  ###
+###   over pooled keep-alive connections with retry and backoff.     ###
+###   While the upstream is down, batches spill to a JSON-lines file ###
+###   and are replayed once it answers again.                        ###
+########################################################################
+
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpForwarder:
+    def __init__(
+            self,
+            url,
+            batch_size=20,
+            linger=0.5,
+            timeout=5,
+            max_retries=3,
+            backoff=0.5,
+            max_backoff=30,
+            spool_path=None,
+            pool_size=4,
+            queue_size=10000
+        ):
+        """POSTs frames to url from a background thread.
+
+        batch_size: frames per POST; a batch of one is sent as
+            {"message": frame} like the original lora_server, larger
+            batches as {"messages": [frame, ...]}
+        linger: longest time, in seconds, a frame waits for its batch to fill
+        timeout: per-request timeout in seconds
+        max_retries, backoff, max_backoff: a failed POST is retried with
+            exponential backoff before its batch is spilled
+        spool_path: JSON-lines file for batches the upstream did not take;
+            without one they are dropped (and counted). A replay cut short
+            by a crash is merged back into it on start(); lines that do not
+            parse (e.g. torn by the crash) are skipped and counted as corrupt
+        queue_size: frames buffered in memory before spilling directly
+
+        A 4xx answer (other than 408 and 429, which are retried) means the
+        upstream refused the batch: retrying cannot help, so its frames are
+        counted as rejected and, with a spool, kept in spool_path + ".rejected".
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.linger = linger
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.spool_path = spool_path
+        self.stats = {"posted": 0, "retries": 0, "spilled": 0, "replayed": 0, "dropped": 0, "rejected": 0, "corrupt": 0}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._spool_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._recover()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Flushes queued frames (to upstream or the spool) and stops the thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.session.close()
+
+    def submit(self, frame):
+        """Queues a frame for forwarding; never blocks the caller."""
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            self._spill([frame])
+
+    def pending(self):
+        """Frames queued in memory."""
+        return self._queue.qsize()
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                if self._deliver(batch):
+                    self._replay()
+                else:
+                    self._spill(batch)
+            elif not self._stopping.is_set():
+                self._replay()
+
+    def _post(self, batch):
+        """POSTs a batch: "posted", "rejected" (a 4xx), or None if it should be retried."""
+        body = {"message": batch[0]} if len(batch) == 1 else {"messages": batch}
+        try:
+            response = self.session.post(self.url, json=body, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        status = response.status_code
+        if status < 400:
+            return "posted"
+        if status < 500 and status not in (408, 429):
+            self._reject(batch)
+            return "rejected"
+        return None
+
+    def _reject(self, batch):
+        self.stats["rejected"] += len(batch)
+        if self.spool_path:
+            with self._spool_lock:
+                with open(self.spool_path + ".rejected", "a") as f:
+                    for frame in batch:
+                        f.write(json.dumps(frame) + "\n")
+
+    def _deliver(self, batch):
+        """POSTs a batch, retrying with exponential backoff; True once the
+        upstream has answered for it (posted or rejected)."""
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            result = self._post(batch)
+            if result is not None:
+                if result == "posted":
+                    self.stats["posted"] += len(batch)
+                return True
+            if attempt == self.max_retries or self._stopping.is_set():
+                break
+            self.stats["retries"] += 1
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+        return False
+
+    def _spill(self, batch):
+        if not self.spool_path:
+            self.stats["dropped"] += len(batch)
+            return
+        with self._spool_lock:
+            with open(self.spool_path, "a") as f:
+                for frame in batch:
+                    f.write(json.dumps(frame) + "\n")
+        self.stats["spilled"] += len(batch)
+
+    def _recover(self):
+        """Tidies up after a crash: ends a torn last spool line, so new
+        frames are not glued onto it, and moves frames left in a replay
+        file back into the spool."""
+        if not self.spool_path:
+            return
+        replaying = self.spool_path + ".replay"
+        with self._spool_lock:
+            if os.path.exists(self.spool_path) and os.path.getsize(self.spool_path):
+                with open(self.spool_path, "rb+") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+            if not os.path.exists(replaying):
+                return
+            with open(replaying) as src, open(self.spool_path, "a") as dst:
+                for line in src:
+                    if line.strip():
+                        dst.write(line if line.endswith("\n") else line + "\n")
+            os.remove(replaying)
+
+    def _load(self, path):
+        """Spooled frames in path, skipping lines that do not parse."""
+        frames = []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    frames.append(json.loads(line))
+                except ValueError:
+                    self.stats["corrupt"] += 1
+        return frames
+
+    def _replay(self):
+        """Re-sends spooled frames once the upstream is answering again."""
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        replaying = self.spool_path + ".replay"
+        with self._spool_lock:
+            if os.path.getsize(self.spool_path) == 0:
+                return
+            os.replace(self.spool_path, replaying)
+        frames = self._load(replaying)
+        for start in range(0, len(frames), self.batch_size):
+            batch = frames[start:start + self.batch_size]
+            result = self._post(batch)
+            if result is None:
+                # Still down: put the rest back and try again later
+                self.stats["spilled"] -= len(frames) - start
+                self._spill(frames[start:])
+                break
+            if result == "posted":
+                self.stats["replayed"] += len(batch)
+        os.remove(replaying)
@@ -0,0 +1,162 @@
+########################################################################
+### Fragmentation and reassembly of payloads larger than one frame  ###
+###   Fragmenter splits and sends, keeping recent messages so that   ###
+###   only the fragments a receiver reports missing are resent.      ###
+###   Reassembler rebuilds messages within bounded memory.           ###
+########################################################################
+
+import random
+import time
+from collections import OrderedDict
+
+from .framing import fragment_message, max_payload, parse_fragment
+
+
+class Fragmenter:
+    def __init__(self, lora, max_payload=max_payload, history=8):
+        """Wraps anything with send_data(rx_addr, data).
+
+        history: number of recent messages kept for resend requests
+
+        Message ids start at a random value, so a restarted sender is
+        unlikely to reuse the id of a message receivers just completed.
+        """
+        self.lora = lora
+        self.max_payload = max_payload
+        self.history = history
+        self._next_id = random.randrange(0x100)
+        self._sent = OrderedDict()  # (rx_addr, msg_id) -> fragment frames
+
+    def send_data(self, rx_addr, data):
+        """Sends data as fragments; returns the message id."""
+        if not isinstance(data, str):
+            raise Exception(f"Fragmenter only carries str payloads, not {type(data).__name__}")
+        msg_id = self._next_id
+        self._next_id = (self._next_id + 1) % 0x100
+        frames = fragment_message(msg_id, data, self.max_payload)
+
+        self._sent[(rx_addr, msg_id)] = frames
+        while len(self._sent) > self.history:
+            self._sent.popitem(last=False)
+
+        for frame in frames:
+            self.lora.send_data(rx_addr, frame)
+        return msg_id
+
+    def resend(self, rx_addr, msg_id, missing):
+        """Resends the listed fragments; returns how many were still available."""
+        frames = self._sent.get((rx_addr, msg_id))
+        if frames is None:
+            return 0
+        resent = 0
+        for index in missing:
+            if index < len(frames):
+                self.lora.send_data(rx_addr, frames[index])
+                resent += 1
+        return resent
+
+
+class Reassembler:
+    def __init__(
+            self,
+            timeout=30,
+            nack_after=5,
+            max_nacks=3,
+            max_messages=16,
+            max_bytes=64 * 1024,
+            clock=time.monotonic
+        ):
+        """Collects fragments per (sender address, message id).
+
+        timeout: seconds after the last fragment before a partial message is dropped
+        nack_after: seconds of silence before missing fragments are reported
+        max_nacks: resend requests per partial message before giving up on it
+        max_messages, max_bytes: bounds on buffered partial messages; the
+            oldest partial message is evicted when either is exceeded
+
+        Fragments of a message completed less than timeout seconds ago are
+        taken as late duplicates; after that the id is free for a new message.
+        """
+        self.timeout = timeout
+        self.nack_after = nack_after
+        self.max_nacks = max_nacks
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.evicted = []  # (address, msg_id, missing) of dropped messages
+        self._partial = OrderedDict()  # key -> [last seen, total, {index: chunk}, nacks]
+        self._bytes = 0
+        self._completed = OrderedDict()  # key -> time completed
+
+    def add(self, frame):
+        """Feeds a received fragment frame; returns the whole message frame once complete."""
+        fragment = parse_fragment(frame["data"])
+        if fragment is None:
+            return frame
+        msg_id, index, total, chunk = fragment
+        key = (frame["address"], msg_id)
+        completed = self._completed.get(key)
+        if completed is not None:
+            if self.clock() - completed < self.timeout:
+                return None  # Late duplicate of a message already delivered
+            del self._completed[key]  # An old id reused, e.g. by a restarted sender
+
+        entry = self._partial.get(key)
+        if entry is None or entry[1] != total:
+            if entry is not None:
+                self._drop(key)
+            entry = self._partial[key] = [self.clock(), total, {}, 0]
+        entry[0] = self.clock()
+        if index not in entry[2]:
+            entry[2][index] = chunk
+            self._bytes += len(chunk)
+        self._partial.move_to_end(key)
+
+        if len(entry[2]) == total:
+            self._drop(key)
+            self._completed[key] = self.clock()
+            self._completed.move_to_end(key)
+            while len(self._completed) > 64:
+                self._completed.popitem(last=False)
+            data = "".join(entry[2][i] for i in range(total))
+            return dict(frame, data=data, length=len(data))
+
+        while len(self._partial) > self.max_messages or self._bytes > self.max_bytes:
+            self._evict(next(iter(self._partial)))
+        return None
+
+    def missing(self, address, msg_id):
+        """Fragment indexes not yet received for a partial message."""
+        entry = self._partial.get((address, msg_id))
+        if entry is None:
+            return []
+        return [i for i in range(entry[1]) if i not in entry[2]]
+
+    def pending(self):
+        """{(address, msg_id): missing indexes} for every partial message."""
+        return {key: self.missing(*key) for key in self._partial}
+
+    def poll(self):
+        """Evicts timed out messages and returns (address, msg_id, missing)
+        for partial messages that have gone quiet and should be re-requested.
+        """
+        now = self.clock()
+        stalled = []
+        for key, entry in list(self._partial.items()):
+            idle = now - entry[0]
+            if idle >= self.timeout or (idle >= self.nack_after and entry[3] >= self.max_nacks):
+                self._evict(key)
+            elif idle >= self.nack_after:
+                entry[0] = now
+                entry[3] += 1
+                stalled.append(key + (self.missing(*key),))
+        return stalled
+
+    def _drop(self, key):
+        entry = self._partial.pop(key)
+        self._bytes -= sum(len(chunk) for chunk in entry[2].values())
+
+    def _evict(self, key):
+        self.evicted.append(key + (self.missing(*key),))
+        del self.evicted[:-self.max_messages]
+        self._drop(key)
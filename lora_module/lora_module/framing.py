@@ -0,0 +1,153 @@
+########################################################################
+### Payload framing shared by the TX helpers and get_received_data   ###
+###   Frames start with a control character so that plain text       ###
+###   payloads are passed through untouched.                         ###
+########################################################################
+
+# Largest payload the module accepts in one AT+SEND
+max_payload = 240
+
+# Several short messages packed into one frame: marker, then for each
+# message two hex digits of length followed by the message itself
+aggregate_marker = "\x1d"
+
+def is_aggregate(data):
+    return data.startswith(aggregate_marker)
+
+def packed_size(messages):
+    """Frame size of pack_messages(messages)."""
+    return len(aggregate_marker) + sum(2 + len(m) for m in messages)
+
+def pack_messages(messages):
+    """Packs messages into one length-prefixed aggregate frame."""
+    for message in messages:
+        if len(message) > 0xff:
+            raise Exception(f"Message too long to aggregate: {len(message)}")
+    return aggregate_marker + "".join(f"{len(m):02x}{m}" for m in messages)
+
+def unpack_messages(data):
+    """Splits an aggregate frame back into its messages.
+
+    Frames that are not aggregates, or that are truncated, are returned
+    whole as a single message.
+    """
+    if not is_aggregate(data):
+        return [data]
+    messages = []
+    pos = len(aggregate_marker)
+    while pos < len(data):
+        try:
+            length = int(data[pos:pos + 2], 16)
+        except ValueError:
+            return [data]
+        message = data[pos + 2:pos + 2 + length]
+        if len(message) != length:
+            return [data]
+        messages.append(message)
+        pos += 2 + length
+    return messages
+
+# One piece of a message too large for a single frame: marker, then
+# message id, fragment index and fragment count, two hex digits each
+fragment_marker = "\x1e"
+fragment_header_size = len(fragment_marker) + 6
+
+# Receiver's request to resend fragments: marker, message id, then the
+# missing fragment indexes, two hex digits each
+nack_marker = "\x15"
+
+def is_fragment(data):
+    return data.startswith(fragment_marker)
+
+def is_nack(data):
+    return data.startswith(nack_marker)
+
+def fragment_message(msg_id, data, max_payload=max_payload):
+    """Splits data into fragment frames of at most max_payload characters."""
+    chunk_size = max_payload - fragment_header_size
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)] or [""]
+    if len(chunks) > 0xff:
+        raise Exception(f"Message needs {len(chunks)} fragments, at most 255 are supported")
+    return [
+        f"{fragment_marker}{msg_id:02x}{index:02x}{len(chunks):02x}{chunk}"
+        for index, chunk in enumerate(chunks)
+    ]
+
+def parse_fragment(data):
+    """Returns (msg_id, index, total, chunk) for a fragment frame, else None."""
+    if not is_fragment(data) or len(data) < fragment_header_size:
+        return None
+    try:
+        msg_id, index, total = (int(data[i:i + 2], 16) for i in (1, 3, 5))
+    except ValueError:
+        return None
+    if index >= total:
+        return None
+    return msg_id, index, total, data[fragment_header_size:]
+
+def pack_nack(msg_id, missing, max_payload=max_payload):
+    """Builds a resend request; missing indexes beyond one frame are left for the next one."""
+    missing = list(missing)[:(max_payload - len(nack_marker) - 2) // 2]
+    return nack_marker + f"{msg_id:02x}" + "".join(f"{index:02x}" for index in missing)
+
+def parse_nack(data):
+    """Returns (msg_id, [missing indexes]) for a resend request, else None."""
+    if not is_nack(data) or len(data) < 3:
+        return None
+    try:
+        values = [int(data[i:i + 2], 16) for i in range(1, len(data), 2)]
+    except ValueError:
+        return None
+    return values[0], values[1:]
+
+# Reliable transport (see reliable.py). Data: marker, sender epoch and
+# sequence number, two hex digits each, then the payload. Ack: marker,
+# sender epoch, the receiver's own epoch (so a sender notices when the
+# receiver restarts), next sequence number expected, then a hex bitmap of
+# the sequence numbers after it that were received out of order (bit i is
+# expected + 1 + i), left out when empty
+reliable_marker = "\x16"
+reliable_header_size = len(reliable_marker) + 4
+ack_marker = "\x06"
+
+def is_reliable(data):
+    return data.startswith(reliable_marker)
+
+def is_ack(data):
+    return data.startswith(ack_marker)
+
+def pack_reliable(epoch, seq, data):
+    return f"{reliable_marker}{epoch:02x}{seq:02x}{data}"
+
+def parse_reliable(data):
+    """Returns (epoch, seq, payload) for a reliable data frame, else None."""
+    if not is_reliable(data) or len(data) < reliable_header_size:
+        return None
+    try:
+        epoch, seq = int(data[1:3], 16), int(data[3:5], 16)
+    except ValueError:
+        return None
+    return epoch, seq, data[reliable_header_size:]
+
+def pack_ack(epoch, receiver_epoch, expected, received=0):
+    """Builds an ack; received is the out-of-order bitmap as an int."""
+    return f"{ack_marker}{epoch:02x}{receiver_epoch:02x}{expected:02x}" + (f"{received:x}" if received else "")
+
+def parse_ack(data):
+    """Returns (epoch, receiver epoch, expected, bitmap) for an ack, else None."""
+    if not is_ack(data) or len(data) < 7:
+        return None
+    try:
+        return int(data[1:3], 16), int(data[3:5], 16), int(data[5:7], 16), int(data[7:] or "0", 16)
+    except ValueError:
+        return None
+
+# Compressed binary frame (see compression.py): marker byte, the id of the
+# shared dictionary used (stored_dictionary: not compressed, sent as is
+# because the payload itself starts with the marker), then raw deflate data
+compressed_marker = b"\x1a"
+compressed_header_size = len(compressed_marker) + 1
+stored_dictionary = 0xff
+
+def is_compressed(data):
+    return data[:1] == compressed_marker
@@ -0,0 +1,335 @@
+########################################################################
+### Event-driven socket <-> LoRa gateway                             ###
+###   One selector waits on the listening socket, every client       ###
+###   connection and the serial port, so frames and messages are     ###
+###   handled as soon as they arrive instead of on a polling tick.   ###
+########################################################################
+
+import argparse
+import logging
+import selectors
+import socket
+import time
+from collections import deque
+
+from .aggregator import Aggregator
+from .forwarder import HttpForwarder
+from .framing import max_payload
+from .journal import JournalWriter
+from .lora_module import LoRaError, LoRaProp
+from .metrics import LoRaMetrics, Metrics
+from .pool import RadioPool
+from .scheduler import TxScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Gateway:
+    def __init__(
+            self,
+            lora,
+            host='localhost',
+            port=8001,
+            dest=101,
+            upstream=None,
+            tx_queue_size=64,
+            linger=0.2,
+            duty_cycle=1.0,
+            forwarder=None,
+            metrics=None,
+            max_buffer=4096
+        ):
+        """Bridges newline-framed TCP clients to a LoRaProp.
+
+        Every line a client sends becomes one message to LoRa address dest.
+        Frames received from LoRa are passed to forward(), which hands them
+        to forwarder, by default an HttpForwarder POSTing to upstream (if
+        set) from its own thread, so a slow upstream never stalls the radio.
+        Clients stay connected; when tx_queue_size messages are waiting,
+        reading from clients pauses until the queue has drained to half,
+        so TCP flow control pushes back on senders. Messages only move on
+        to the aggregator and scheduler while fewer than tx_queue_size are
+        waiting there for airtime, so a slow radio pauses clients too.
+
+        Messages are aggregated (see Aggregator, linger) and paced by their
+        airtime within duty_cycle (see TxScheduler).
+
+        lora may also be a RadioPool: frames from every radio are forwarded
+        (tagged with frame["radio"]) and messages go out on whichever radio
+        the pool picks; the pool's own schedulers then set the duty cycle.
+
+        metrics: a metrics.Metrics that gets queue-depth gauges and a
+            LoRaMetrics hook on every radio
+        max_buffer: bytes a client may send without a newline before it
+            is disconnected
+
+        Lines longer than one frame (max_payload bytes) are refused with an
+        "ERROR ..." line back to that client; a message the radio rejects
+        is logged and dropped, so neither can stop the gateway.
+        """
+        self.lora = lora
+        self.dest = dest
+        self.upstream = upstream
+        if forwarder is None and upstream:
+            forwarder = HttpForwarder(upstream, batch_size=1).start()
+        self.forwarder = forwarder
+        self.tx_queue_size = tx_queue_size
+        self.max_buffer = max_buffer
+        if isinstance(lora, RadioPool):
+            self.radios = list(lora.radios.values())
+            self.scheduler = lora
+        else:
+            self.radios = [lora]
+            self.scheduler = TxScheduler(lora, duty_cycle=duty_cycle)
+        self.tx = Aggregator(self.scheduler, linger=linger)
+        self.tx_queue = deque()
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}  # socket -> bytearray of unframed input
+        self.paused = set()
+        self._running = False
+        if metrics is not None:
+            self._register_metrics(metrics)
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((host, port))
+        self.server_socket.listen(16)
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ, self._accept)
+        for radio in self.radios:
+            self.selector.register(radio.ser.fileno(), selectors.EVENT_READ, self._serial_readable)
+        # Lets stop() wake a select() that is blocked with no timeout
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self.selector.register(self._wakeup, selectors.EVENT_READ, self._woken)
+
+    def _register_metrics(self, metrics):
+        if isinstance(self.lora, RadioPool):
+            for name, radio in self.lora.radios.items():
+                radio.add_hook(LoRaMetrics(metrics, radio=name))
+        else:
+            self.lora.add_hook(LoRaMetrics(metrics))
+        metrics.describe("lora_gateway_queue_depth", "gauge", "Messages waiting at each gateway stage")
+        metrics.set("lora_gateway_queue_depth", lambda: len(self.tx_queue), stage="clients")
+        metrics.set("lora_gateway_queue_depth", self.tx.pending, stage="aggregator")
+        metrics.set("lora_gateway_queue_depth", self.scheduler.pending, stage="scheduler")
+        metrics.describe("lora_gateway_clients", "gauge", "Connected TCP clients")
+        metrics.set("lora_gateway_clients", lambda: len(self.clients))
+        metrics.set("lora_gateway_clients", lambda: len(self.paused), state="paused")
+        if self.forwarder is not None:
+            metrics.set("lora_gateway_queue_depth", self.forwarder.pending, stage="forwarder")
+            metrics.describe("lora_forwarder_frames_total", "counter", "Frames handled by the upstream forwarder")
+            for outcome in self.forwarder.stats:
+                metrics.set("lora_forwarder_frames_total", lambda outcome=outcome: self.forwarder.stats[outcome], outcome=outcome)
+
+    @property
+    def address(self):
+        """(host, port) the gateway listens on."""
+        return self.server_socket.getsockname()
+
+    def serve_forever(self):
+        self._running = True
+        while self._running:
+            self.run_once(self._timeout())
+
+    def stop(self):
+        self._running = False
+        self._waker.send(b"\0")
+
+    def close(self):
+        if self.forwarder is not None:
+            self.forwarder.stop()
+        for client in list(self.clients):
+            self._disconnect(client)
+        self.selector.close()
+        self.server_socket.close()
+        self._wakeup.close()
+        self._waker.close()
+
+    def _woken(self, wakeup):
+        wakeup.recv(64)
+
+    def run_once(self, timeout=None):
+        """Waits for one round of events and handles them."""
+        for key, _ in self.selector.select(timeout):
+            key.data(key.fileobj)
+        self._service_tx()
+        self._resume_clients()
+
+    def _radio_backlog(self):
+        """Messages handed on to the aggregator and scheduler but not yet sent."""
+        return self.tx.pending() + self.scheduler.pending()
+
+    def _timeout(self):
+        """How long select() may block: forever unless something is due."""
+        if self.tx_queue and self._radio_backlog() < self.tx_queue_size:
+            return 0
+        timeouts = []
+        due = self.scheduler.next_send_time()
+        if due is not None:
+            timeouts.append(max(due - time.monotonic(), 0))
+        if self.tx.pending():
+            timeouts.append(self.tx.linger)
+        if any(radio.reassembler.pending() for radio in self.radios):
+            timeouts.append(1.0)
+        return min(timeouts) if timeouts else None
+
+    def _accept(self, server_socket):
+        client, addr = server_socket.accept()
+        logger.info("Connection from %s", addr)
+        client.setblocking(False)
+        self.clients[client] = bytearray()
+        self.selector.register(client, selectors.EVENT_READ, self._client_readable)
+
+    def _disconnect(self, client):
+        if client in self.paused:
+            self.paused.discard(client)
+        else:
+            self.selector.unregister(client)
+        del self.clients[client]
+        client.close()
+
+    def _client_readable(self, client):
+        try:
+            data = client.recv(4096)
+        except ConnectionError:
+            data = b""
+        if not data:
+            self._disconnect(client)
+            return
+        self.clients[client].extend(data)
+        self._take_lines(client)
+        if client in self.clients and len(self.clients[client]) > self.max_buffer and b"\n" not in self.clients[client]:
+            logger.warning("Disconnecting client sending over %d bytes without a newline", self.max_buffer)
+            self._reply(client, f"ERROR line longer than {self.max_buffer} bytes")
+            self._disconnect(client)
+
+    def _reply(self, client, line):
+        try:
+            client.send(line.encode() + b"\n")
+        except OSError:
+            pass  # Best effort; the client may already be gone
+
+    def _take_lines(self, client):
+        """Moves complete lines from a client buffer to the TX queue while there is room."""
+        buffer = self.clients[client]
+        while len(self.tx_queue) < self.tx_queue_size:
+            end = buffer.find(b"\n")
+            if end < 0:
+                return
+            message = buffer[:end].decode('utf-8', errors='replace').rstrip("\r")
+            del buffer[:end + 1]
+            if len(message.encode()) > max_payload:
+                logger.warning("Refused a %d byte message", len(message.encode()))
+                self._reply(client, f"ERROR message longer than {max_payload} bytes")
+            elif message:
+                logger.debug("Received from socket: %s", message)
+                self.tx_queue.append(message)
+        if client not in self.paused:
+            self.selector.unregister(client)
+            self.paused.add(client)
+
+    def _resume_clients(self):
+        if not self.paused or len(self.tx_queue) + self._radio_backlog() > self.tx_queue_size // 2:
+            return
+        for client in list(self.paused):
+            self.paused.discard(client)
+            self.selector.register(client, selectors.EVENT_READ, self._client_readable)
+            self._take_lines(client)
+
+    def _serial_readable(self, fileno):
+        for frame in self.lora.drain_received():
+            self.forward(frame)
+
+    def _service_tx(self):
+        if self.tx_queue and self._radio_backlog() < self.tx_queue_size:
+            message = self.tx_queue.popleft()
+            try:
+                self.tx.send_data(self.dest, message)
+            except Exception as exc:  # LoRaError, or a frame the duty cycle can never fit
+                logger.warning("Dropped message %r: %s", message, exc)
+            else:
+                logger.debug("Queued for LoRa: %s", message)
+        for stage in (self.tx, self.scheduler):
+            try:
+                stage.poll()
+            except LoRaError as exc:
+                logger.warning("Dropped a frame: %s", exc)
+        # Frames that arrived during the AT+SEND round trip are already buffered
+        for frame in self.lora.drain_received():
+            self.forward(frame)
+
+    def forward(self, frame):
+        """Hands a received frame upstream."""
+        logger.debug("Received from LoRa: %s", frame)
+        if self.forwarder is not None:
+            self.forwarder.submit(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='LoRa radio Tx/Rx gateway'
+    )
+    parser.add_argument(
+        'device',
+        type=str,
+        nargs='+',
+        help='Name of serial device file (e.g. /dev/ttyUSB0); several devices are pooled'
+    )
+    parser.add_argument('--host', type=str, default='localhost', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8001, help='TCP port to listen on')
+    parser.add_argument('--address', type=int, default=100, help='LoRa address of this gateway')
+    parser.add_argument('--dest', type=int, default=101, help='LoRa address messages are sent to')
+    parser.add_argument(
+        '--upstream',
+        type=str,
+        default='http://100.26.26.26:8000/message/recv',
+        help='URL received messages are POSTed to'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=1,
+        help='Frames per POST; above 1 the upstream receives {"messages": [...]}'
+    )
+    parser.add_argument('--linger', type=float, default=0.5, help='Seconds a frame waits for its batch')
+    parser.add_argument('--spool', type=str, default=None, help='File frames are kept in while upstream is down')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port')
+    parser.add_argument('--journal', type=str, default=None, help='Append every received frame to this journal')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    radios = []
+    for device in args.device:
+        radio = LoRaProp(device)
+        radio.set_address(args.address)
+        radios.append(radio)
+    lora = radios[0] if len(radios) == 1 else RadioPool(radios, duty_cycle=1.0)
+    journal = JournalWriter(args.journal) if args.journal else None
+    if journal is not None:
+        for radio in radios:
+            radio.add_hook(journal)
+    forwarder = HttpForwarder(
+        args.upstream,
+        batch_size=args.batch_size,
+        linger=args.linger,
+        spool_path=args.spool
+    ).start()
+    metrics = None
+    if args.metrics_port is not None:
+        metrics = Metrics()
+        metrics.serve(args.host, args.metrics_port)
+    gateway = Gateway(lora, args.host, args.port, args.dest, args.upstream, forwarder=forwarder, metrics=metrics)
+    logger.info("Starting gateway; listening on port %d", args.port)
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.close()
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == '__main__':
+    main()
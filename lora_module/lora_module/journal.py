@@ -0,0 +1,251 @@
+########################################################################
+### Append-only journal of received frames                           ###
+###   Records are appended to a compact binary log, fsynced in       ###
+###   batches, with a fixed-width sidecar index (time, address,      ###
+###   offset) so a memory-mapped reader can replay or query by time  ###
+###   and source address without parsing the whole log.              ###
+########################################################################
+
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+
+magic = b"LRJ1"
+# time (s since epoch), address, rssi, snr, payload length
+_header = struct.Struct("<dHhhH")
+_crc = struct.Struct("<I")
+# time, address, record offset
+_entry = struct.Struct("<dHQ")
+_record_overhead = _header.size + _crc.size
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def _scan(buf, offset, end):
+    """Yields (offset, header fields) of the intact records in buf[offset:end]."""
+    while offset + _record_overhead <= end:
+        fields = _header.unpack_from(buf, offset)
+        payload_start = offset + _record_overhead
+        payload_end = payload_start + fields[4]
+        if payload_end > end:
+            return
+        crc, = _crc.unpack_from(buf, offset + _header.size)
+        check = zlib.crc32(buf[payload_start:payload_end], zlib.crc32(buf[offset:offset + _header.size]))
+        if crc != check:
+            return
+        yield offset, fields
+        offset = payload_end
+
+
+class JournalWriter:
+    def __init__(self, path, sync_every=64, sync_interval=1.0):
+        """Appends frames to the journal at path (created if missing).
+
+        sync_every, sync_interval: fsync after that many records or that
+            many seconds since the last fsync, whichever comes first
+        A torn or corrupt tail left by a crash is cut off on open, and
+        index entries missing for intact records are rebuilt.
+
+        Also usable as a LoRaModule hook: lora.add_hook(writer) journals
+        every received frame.
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._recover()
+        self._log = open(path, "ab")
+        self._index = open(index_path(path), "ab")
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def _recover(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < len(magic):
+            with open(self.path, "wb") as f:
+                f.write(magic)
+            open(index_path(self.path), "wb").close()
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if data[:len(magic)] != magic:
+            raise Exception(f"{self.path} is not a frame journal")
+
+        entries = b""
+        if os.path.exists(index_path(self.path)):
+            with open(index_path(self.path), "rb") as f:
+                entries = f.read()
+        count = len(entries) // _entry.size
+        # Keep index entries up to the last one pointing at an intact record
+        start = len(magic)
+        while count:
+            _, _, offset = _entry.unpack_from(entries, (count - 1) * _entry.size)
+            intact = next(_scan(data, offset, len(data)), None)
+            if intact is not None and intact[0] == offset:
+                start = offset
+                count -= 1  # Re-added below by the scan
+                break
+            count -= 1
+
+        rebuilt = bytearray(entries[:count * _entry.size])
+        end = start
+        for offset, fields in _scan(data, start, len(data)):
+            rebuilt += _entry.pack(fields[0], fields[1], offset)
+            end = offset + _record_overhead + fields[4]
+        if end < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        with open(index_path(self.path), "wb") as f:
+            f.write(rebuilt)
+
+    def append(self, frame, timestamp=None):
+        """Journals one frame (dict as returned by get_received_data); returns its offset."""
+        data = frame["data"]
+        if isinstance(data, str):
+            data = data.encode()
+        stamp = time.time() if timestamp is None else timestamp
+        header = _header.pack(stamp, frame["address"], frame["rssi"], frame["snr"], len(data))
+        offset = self._log.tell()
+        self._log.write(header + _crc.pack(zlib.crc32(data, zlib.crc32(header))) + data)
+        self._index.write(_entry.pack(stamp, frame["address"], offset))
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._synced_at >= self.sync_interval:
+            self.sync()
+        return offset
+
+    def sync(self):
+        """Flushes and fsyncs the log, then the index."""
+        for f in (self._log, self._index):
+            f.flush()
+            os.fsync(f.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self._log.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def on_command(self, command, seconds, status):
+        pass
+
+    def on_frame(self, frame):
+        self.append(frame)
+
+
+class JournalReader:
+    def __init__(self, path, binary=False):
+        """Memory-maps a journal and its index for replay and queries.
+
+        Sees the records that were synced when it was opened (or last
+        refresh()ed). Records are assumed to be appended in time order.
+        binary=True returns payloads as bytes instead of decoded text.
+        """
+        self.path = path
+        self.binary = binary
+        self._log = None
+        self._index = None
+        self._by_address = None
+        self.refresh()
+
+    @staticmethod
+    def _map(path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def refresh(self):
+        """Re-maps the files to pick up records appended since."""
+        self.close()
+        self._log = self._map(self.path)
+        if self._log[:len(magic)] != magic:
+            raise Exception(f"{self.path} is not a frame journal")
+        self._index = self._map(index_path(self.path))
+        self._count = len(self._index) // _entry.size
+        # Entries written ahead of their record (crash between the two) are ignored
+        while self._count and not self._complete(self._entry(self._count - 1)[2]):
+            self._count -= 1
+        self._by_address = None
+
+    def _complete(self, offset):
+        if offset + _record_overhead > len(self._log):
+            return False
+        return offset + _record_overhead + _header.unpack_from(self._log, offset)[4] <= len(self._log)
+
+    def close(self):
+        for mapped in (self._log, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, i):
+        return _entry.unpack_from(self._index, i * _entry.size)
+
+    def record(self, i):
+        """The i-th frame as a dict, with its journal time under "time"."""
+        offset = self._entry(i)[2]
+        stamp, address, rssi, snr, length = _header.unpack_from(self._log, offset)
+        start = offset + _record_overhead
+        data = self._log[start:start + length]
+        return {
+            "time": stamp,
+            "address": address,
+            "length": length,
+            "data": data if self.binary else data.decode(errors="replace"),
+            "rssi": rssi,
+            "snr": snr,
+        }
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self.record(i)
+
+    def _bisect(self, stamp):
+        """Index of the first record at or after stamp."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < stamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def between(self, start=None, end=None):
+        """Frames with start <= time < end (either bound may be None)."""
+        first = 0 if start is None else self._bisect(start)
+        last = self._count if end is None else self._bisect(end)
+        for i in range(first, last):
+            yield self.record(i)
+
+    def from_address(self, address, start=None, end=None):
+        """Frames from one source address, optionally within a time range."""
+        if self._by_address is None:
+            # One pass over the index; later queries are lookups
+            self._by_address = {}
+            for i, (_, source, _) in enumerate(_entry.iter_unpack(self._index[:self._count * _entry.size])):
+                self._by_address.setdefault(source, array("L")).append(i)
+        for i in self._by_address.get(address, ()):
+            stamp = self._entry(i)[0]
+            if start is not None and stamp < start:
+                continue
+            if end is not None and stamp >= end:
+                break
+            yield self.record(i)
@@ -6,9 +6,19 @@
 ###   Believed compatible with other REYAX LoRA AT Modules           ###
 ########################################################################
 
+import os
+import random
 import serial
+import time
+from collections import deque
 from enum import Enum
 
+from .airtime import time_on_air
+from .fragments import Fragmenter, Reassembler
+from .framing import is_aggregate, is_fragment, is_nack, pack_nack, parse_nack, unpack_messages
+from .mesh import DuplicateFilter, RebroadcastScheduler, counter_modulus, format_sequence, origin_id, parse_sequence, sequence_length
+from .rxparser import RxParser
+
 error_messages = {
     "AT_ERROR": "Generic AT error",
     "AT_PARAM_ERROR": "Parameter of the command is wrong.",
@@ -18,6 +28,133 @@ error_messages = {
     "AT_RX_ERROR": "Error detection during the reception of the command."
 }
 
+class LoRaError(Exception):
+    """Error status returned by the module; code is e.g. AT_BUSY_ERROR."""
+    def __init__(self, code, message):
+        super().__init__(f"Error {code}: {message}")
+        self.code = code
+
+def reply_prefix(command):
+    """The prefix of the reply line to an AT+KEY command (b"+KEY="), else None."""
+    head = bytes(command[:32])
+    if not head.startswith(b"AT+"):
+        return None
+    key = head[3:].split(b"=")[0].split(b"?")[0].strip()
+    return b"+" + key + b"="
+
+def parse_received_line(line):
+    """Parses a +RCV=addr,len,data,rssi,snr line into a dict.
+
+    The payload may contain commas; use RxParser for raw byte streams.
+    """
+    address, length, rest = line[5:].split(",", 2)
+    data, rssi, snr = rest.rsplit(",", 2)
+    return {
+        "address": int(address),
+        "length": int(length),
+        "data": data,
+        "rssi": int(rssi),
+        "snr": int(snr),
+    }
+
+def parse_event_line(line):
+    """Parses an asynchronous +EVT line of a LoRaWAN module into a dict.
+
+    +EVT:JOINED gives {"event": "JOINED"}; downlinks, e.g.
+    +EVT:RX_1:-70:8:UNICAST:2:data, also carry window, rssi, snr, type,
+    port and data (which may contain colons).
+    """
+    body = line[5:]
+    if not body.startswith("RX_"):
+        return {"event": body}
+    window, rssi, snr, kind, port, data = body[3:].split(":", 5)
+    return {
+        "event": "RX",
+        "window": window,
+        "rssi": int(rssi),
+        "snr": int(snr),
+        "type": kind,
+        "port": int(port),
+        "data": data,
+    }
+
+# LoRaWAN session registers: device address, session keys, uplink frame counter
+session_registers = ("DEVADDR", "NWKSKEY", "APPSKEY", "FCU")
+
+# apply_config() profile keys and the AT register each one maps to
+config_registers = {
+    "mode": "OPMODE",
+    "band": "BAND",
+    "parameter": "PARAMETER",
+    "address": "ADDRESS",
+    "network_id": "NETWORKID",
+    "node_pin": "CPIN",
+    "tx_power": "CRFOP",
+}
+
+# Registers that only take effect after an ATZ
+reset_registers = ("OPMODE",)
+
+def split_setting(line):
+    """Splits a query reply like +BAND=915000000 into (prefix, value)."""
+    prefix, sep, value = line.partition("=")
+    return (prefix, value) if sep else ("", line)
+
+def load_profile(profile):
+    """Normalises a config profile to {register: value-string}.
+
+    profile may be a dict, a path to a YAML file or a YAML string. The RF
+    parameter can be given as a list, a dict with sf/bw/cr/preamble keys
+    or a comma separated string.
+    """
+    if isinstance(profile, str):
+        import yaml
+        if os.path.exists(profile):
+            with open(profile) as f:
+                profile = yaml.safe_load(f)
+        else:
+            profile = yaml.safe_load(profile)
+
+    registers = {}
+    for key, value in (profile or {}).items():
+        if key not in config_registers:
+            raise Exception(f"Unknown config setting: {key}")
+        if key == "parameter":
+            if isinstance(value, dict):
+                value = [value[k] for k in ("sf", "bw", "cr", "preamble")]
+            if isinstance(value, (list, tuple)):
+                value = ",".join(str(v) for v in value)
+        registers[config_registers[key]] = str(value)
+    return registers
+
+# UART rates the module can be switched to with AT+IPR, fastest first
+uart_rates = (115200, 57600, 38400, 19200, 9600, 4800, 2400, 1200)
+
+# Order detect_baudrate() tries rates in: the two usual defaults first
+probe_rates = (9600, 115200, 57600, 38400, 19200, 4800, 2400, 1200)
+
+def detect_baudrate(ser, rates=probe_rates, probe_timeout=0.1):
+    """Finds the UART rate the module answers at and leaves ser set to it.
+
+    Each rate gets an AT ping and at most probe_timeout seconds to answer
+    OK; raises if none does.
+    """
+    timeout = ser.timeout
+    ser.timeout = probe_timeout
+    try:
+        for rate in rates:
+            ser.baudrate = rate
+            ser.reset_input_buffer()
+            # The leading line ending ends any garbage sent at a wrong rate
+            ser.write(b"\r\nAT\r\n")
+            deadline = time.monotonic() + probe_timeout
+            while time.monotonic() < deadline:
+                if ser.readline().strip().endswith(b"OK"):
+                    return rate
+    finally:
+        ser.timeout = timeout
+    raise Exception(f"No answer from the module at any of {list(rates)} baud")
+
 class LoRaMode(Enum):
     MODE_LORAWAN = 0
     MODE_PROPRTY = 1
@@ -27,19 +164,145 @@ class LoRaModule:
             self, 
             port, 
             baudrate=9600, 
-            timeout=1
+            timeout=1,
+            command_timeout=None,
+            fast_uart=False,
+            lazy=False
         ):
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
+        """baudrate="auto" probes the usual rates (see detect_baudrate).
+        command_timeout: seconds to wait for a command's reply before
+            raising LoRaError("TIMEOUT"); None waits forever
+        fast_uart: switch the module to its fastest UART rate (AT+IPR)
+        lazy: leave the port closed until it is first used (or open())
+        port may also be an already open serial.Serial-like object.
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.fast_uart = fast_uart
+        self.command_timeout = command_timeout
+        self.hooks = []
+        self._ser = None
+        if not lazy:
+            self.open()
+
+    @property
+    def ser(self):
+        """The serial port, opened on first access."""
+        if self._ser is None:
+            self.open()
+        return self._ser
+
+    @ser.setter
+    def ser(self, value):
+        self._ser = value
+
+    def open(self):
+        """Opens the port and brings the module up; does nothing if already open."""
+        if self._ser is not None:
+            return
+        baudrate = probe_rates[0] if self.baudrate == "auto" else self.baudrate
+        if isinstance(self.port, str):
+            self._ser = serial.Serial(self.port, baudrate, timeout=self.timeout)
+        else:
+            self._ser = self.port
+        if self.baudrate == "auto":
+            detect_baudrate(self._ser)
+        if self.fast_uart and self._ser.baudrate != uart_rates[0]:
+            self.set_uart_rate(uart_rates[0])
+        self._startup()
+
+    def _startup(self):
+        """Module setup run once the port is open."""
+        pass
+
+    def add_hook(self, hook):
+        """Registers an observer (see metrics.LoRaMetrics) with
+        on_command(command, seconds, status) and on_frame(frame)."""
+        self.hooks.append(hook)
+
+    def _notify_command(self, command, seconds, error=None):
+        status = "OK" if error is None else getattr(error, "code", "ERROR")
+        for hook in self.hooks:
+            hook.on_command(command, seconds, status)
 
     def send_command(self, command):
         """Sends an AT command and waits for a response."""
-        command_with_newline = command + "\r\n"
-        self.ser.write(command_with_newline.encode())
-
+        return self.send_raw_command((command + "\r\n").encode())
+
+    def send_raw_command(self, raw):
+        """Sends an already encoded AT command, line ending included, and
+        waits for a response; raw may be any bytes-like object."""
+        started = time.monotonic()
+        self.ser.write(raw)
+        if not self.hooks:
+            return self._read_response(raw)
+        # Latin-1 maps each byte to one character, so payload lengths survive
+        command = bytes(raw).decode("latin-1").rstrip("\r\n")
+        try:
+            response = self._read_response(raw)
+        except Exception as exc:
+            self._notify_command(command, time.monotonic() - started, exc)
+            raise
+        self._notify_command(command, time.monotonic() - started)
+        return response
+
+    def send_commands(self, commands):
+        """Pipelines AT commands: writes them back to back, then collects
+        the replies in order.
+
+        Returns a list of (command, response, seconds) where seconds is the
+        time from the previous reply (or the write) to this one. Raises on
+        the first error, after every reply has been drained.
+        """
+        if not commands:
+            return []
+        self.ser.write("".join(command + "\r\n" for command in commands).encode())
+
+        results = []
+        error = None
+        last = time.monotonic()
+        for command in commands:
+            failure = None
+            try:
+                response = self._read_response(command.encode())
+            except Exception as exc:
+                response = None
+                failure = exc
+                error = error or Exception(f"{command}: {exc}")
+            now = time.monotonic()
+            results.append((command, response, now - last))
+            if self.hooks:
+                self._notify_command(command, now - last, failure)
+            last = now
+        if error:
+            raise error
+        return results
+
+    def _read_response(self, command=b""):
+        """Reads reply lines up to the status line of one command.
+
+        command is the command in flight; its reply line, like a status
+        line, ends a frame that claimed more payload than it carried.
+        """
         response_lines = []
         status_line = ""
+        prefix = reply_prefix(command)
+        deadline = None if self.command_timeout is None else time.monotonic() + self.command_timeout
         while True:
-            line = self.ser.readline().decode().strip()
+            if deadline is not None and time.monotonic() >= deadline:
+                self._abandon_receiving()  # Whatever it was waiting for is not coming
+                raise LoRaError("TIMEOUT", f"No reply within {self.command_timeout} s")
+            raw = self.ser.readline()
+            if self._receiving() and self._is_reply(raw, prefix):
+                self._abandon_receiving()  # The frame was cut short; this line is ours
+            elif raw.startswith(b"+RCV=") or self._receiving():
+                self._on_received_line(raw)  # A frame arrived mid-command
+                continue
+            if raw.startswith(b"+EVT:"):
+                self._on_event_line(raw)  # So did an asynchronous event
+                continue
+            line = raw.decode(errors="replace").strip()
             if not line:
                 continue  # Ignore empty lines
             response_lines.append(line)
@@ -55,10 +318,33 @@ class LoRaModule:
         else:
             raise Exception(f"Unexpected response: {response_lines}")
 
+    def _is_reply(self, raw, prefix):
+        """Whether raw is a status line, or the reply line starting with prefix."""
+        line = raw.strip()
+        if line in (b"OK", b"+READY") or line.decode(errors="replace") in error_messages.keys():
+            return True
+        return prefix is not None and line.startswith(prefix)
+
+    def _on_received_line(self, raw):
+        """Called with +RCV lines read while waiting for a command reply."""
+        pass
+
+    def _receiving(self):
+        """Whether a frame cut short by a line ending in its payload still needs more lines."""
+        return False
+
+    def _abandon_receiving(self):
+        """Drops a partly received frame when a command times out waiting behind it."""
+        pass
+
+    def _on_event_line(self, raw):
+        """Called with +EVT lines read while waiting for a command reply."""
+        pass
+
     def _handle_error(self, error_code):
         """Handles error codes returned by the LoRa module."""
         error_message = error_messages.get(error_code, "Unknown error code.")
-        raise Exception(f"Error {error_code}: {error_message}")
+        raise LoRaError(error_code, error_message)
 
     def reset(self):
         """Resets the module."""
@@ -121,26 +407,198 @@ class LoRaModule:
         """Resets all parameters to factory defaults."""
         return self.send_command("AT+FACTORY")
 
+    def get_uart_rate(self):
+        """Gets the module's UART baud rate."""
+        return self.send_command("AT+IPR=?")
+
+    def set_uart_rate(self, rate):
+        """Switches the module's UART to rate and follows it on the host side."""
+        if rate not in uart_rates:
+            raise Exception(f"Unsupported UART rate: {rate}")
+        response = self.send_command(f"AT+IPR={rate}")
+        self.ser.flush()
+        detect_baudrate(self.ser, rates=(rate,))
+        return response
+
 class LoRaWAN(LoRaModule):
+    def __init__(self, port, baudrate=9600, timeout=1, command_timeout=None, fast_uart=False, lazy=False):
+        """Join results, confirmed-uplink results and downlinks arrive as
+        +EVT lines after the command that caused them has returned; read
+        them with drain_events(), or use lorawan.LoRaWANSession.
+
+        baudrate, command_timeout, fast_uart, lazy: see LoRaModule
+        """
+        self._events = deque()
+        self._event_buffer = bytearray()
+        super().__init__(port, baudrate, timeout, command_timeout, fast_uart, lazy)
+
     def send_data(self, port, confirmed, data):
+        """Sends an uplink on an application port; confirmed=1 asks the
+        network to ack it (the result arrives as an event)."""
         return self.send_command(f"AT+SEND={port},{confirmed},{data}")
 
+    def join(self):
+        """Starts an over-the-air join; +EVT:JOINED or +EVT:JOIN_FAILED follows."""
+        return self.send_command("AT+JOIN")
+
+    def get_join_status(self):
+        """Whether the module holds a network session (1) or not (0)."""
+        return self.send_command("AT+NJS=?")
+
+    def get_join_mode(self):
+        """Gets the join mode (see set_join_mode)."""
+        return self.send_command("AT+NJM=?")
+
+    def set_join_mode(self, mode):
+        """mode=1 : OTAA (join with AT+JOIN)
+        mode=0 : ABP (session set directly with set_session)
+        """
+        return self.send_command(f"AT+NJM={mode}")
+
+    def get_dev_eui(self):
+        """Gets the module's DevEUI."""
+        return self.send_command("AT+DEVEUI=?")
+
+    def set_app_eui(self, app_eui):
+        """Sets the AppEUI (JoinEUI) used to join."""
+        return self.send_command(f"AT+APPEUI={app_eui}")
+
+    def set_app_key(self, app_key):
+        """Sets the AppKey used to join."""
+        return self.send_command(f"AT+APPKEY={app_key}")
+
+    def get_session(self):
+        """The current session as {register: value} for session_registers, in one pipelined batch."""
+        results = self.send_commands([f"AT+{key}=?" for key in session_registers])
+        return {
+            key: split_setting(response[0])[1] if response else ""
+            for key, (_, response, _) in zip(session_registers, results)
+        }
+
+    def set_session(self, session):
+        """Installs a saved session ({register: value}) in ABP mode, skipping a join."""
+        self.send_commands(["AT+NJM=0"] + [f"AT+{key}={session[key]}" for key in session_registers])
+
+    def drain_events(self):
+        """Generator over every +EVT event received so far, as parsed by parse_event_line."""
+        waiting = self.ser.in_waiting
+        if waiting > 0:
+            self._event_buffer += self.ser.read(waiting)
+        while True:
+            end = self._event_buffer.find(b"\n")
+            if end < 0:
+                break
+            raw = bytes(self._event_buffer[:end + 1])
+            del self._event_buffer[:end + 1]
+            if raw.startswith(b"+EVT:"):
+                self._on_event_line(raw)
+        while self._events:
+            yield self._events.popleft()
+
+    def _on_event_line(self, raw):
+        line = raw.decode(errors="replace").strip()
+        try:
+            self._events.append(parse_event_line(line))
+        except ValueError:
+            pass  # Malformed downlink line
+
 
 class LoRaProp(LoRaModule):
-    def __init__(self, port, baudrate=9600, timeout=1):
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        self.set_mode(LoRaMode.MODE_PROPRTY.value) 
+    def __init__(
+            self,
+            port,
+            baudrate=9600,
+            timeout=1,
+            cached=False,
+            command_timeout=None,
+            fast_uart=False,
+            fast_start=False,
+            lazy=False,
+            binary=False,
+            hex_payloads=False
+        ):
+        """cached=True keeps a shadow copy of the module settings: getters
+        are answered locally once known, and setters that would not change
+        anything are dropped. Settings changed behind the object's back
+        (e.g. raw send_command calls) need an invalidate_cache().
+
+        fast_start=True asks for the operating mode first and only sets it
+        (and reboots the module) when it is not proprietary LoRa already,
+        so a restart costs one round trip instead of a reset.
+
+        binary=True returns received payloads as bytes rather than text;
+        frames framed by the text helpers (aggregates, fragments, nacks)
+        are then passed through as they are. hex_payloads=True is for
+        firmware that takes and reports payloads as hex: send_bytes
+        hex-encodes, and received payloads are decoded back to bytes.
+
+        baudrate, command_timeout, fast_uart, lazy: see LoRaModule
+        """
+        self.cached = cached
+        self.fast_start = fast_start
+        self.hex_payloads = hex_payloads
+        self._shadow = {}
+        self._rx_backlog = deque()
+        self._rx_frames = deque()  # Parsed but not yet handed to hooks and _queue_frame
+        self._rx_parser = RxParser(binary=binary, hex_payloads=hex_payloads)
+        self.fragmenter = Fragmenter(self)
+        self.reassembler = Reassembler()
+        super().__init__(port, baudrate, timeout, command_timeout, fast_uart, lazy)
+
+    def _startup(self):
+        mode = str(LoRaMode.MODE_PROPRTY.value)
+        if self.fast_start:
+            response = self.get_mode()
+            if isinstance(response, list) and response and split_setting(response[0])[1] == mode:
+                return
+        self.set_mode(mode)
         self.reset() # Reset req'd for mode setting to take
 
+    def invalidate_cache(self):
+        """Forgets every shadowed setting; the next getters hit the module."""
+        self._shadow.clear()
+
+    def _query(self, key):
+        """Reads AT+<key>=?, from the shadow copy when cached and known."""
+        if self.cached and key in self._shadow:
+            prefix, value = self._shadow[key]
+            return [f"{prefix}={value}"]
+        response = self.send_command(f"AT+{key}=?")
+        if self.cached and response:
+            self._shadow[key] = split_setting(response[0])
+        return response
+
+    def _configure(self, key, value):
+        """Writes AT+<key>=<value>, skipped when cached and already set."""
+        value = str(value)
+        shadowed = self._shadow.get(key)
+        if self.cached and shadowed is not None and shadowed[1] == value:
+            return []
+        response = self.send_command(f"AT+{key}={value}")
+        if self.cached:
+            prefix = shadowed[0] if shadowed is not None else f"+{key}"
+            self._shadow[key] = (prefix, value)
+        return response
+
+    def reset(self):
+        """Resets the module and drops the shadowed settings."""
+        self.invalidate_cache()
+        return super().reset()
+
+    def set_mode(self, opmode):
+        """Sets the operating mode and drops the shadowed settings."""
+        self.invalidate_cache()
+        return super().set_mode(opmode)
+
     def get_band(self):
         """Gets current frequency setting, in Hz"""
-        return self.send_command(f"AT+BAND=?")
+        return self._query("BAND")
 
     def set_band(self,frequency):
         """Sets current frequency setting, in Hz 
         e.g. frequency=915000000 for 915MHz
         """
-        return self.send_command(f"AT+BAND={frequency}")
+        return self._configure("BAND", frequency)
 
     def get_parameter(self):
         """Gets current rf parameter settings (sf, bw, cr, preamble)
@@ -150,7 +608,7 @@ class LoRaProp(LoRaModule):
         preamble: programmed preamble
 
         """
-        return self.send_command(f"AT+PARAMETER=?")
+        return self._query("PARAMETER")
 
     def set_parameter(self, sf, bw, cr, preamble):
         """Sets rf parameter settings 
@@ -160,51 +618,218 @@ class LoRaProp(LoRaModule):
         preamble: programmed preamble
 
         """
-        return self.send_command(f"AT+PARAMETER={sf},{bw},{cr},{preamble}")
+        return self._configure("PARAMETER", f"{sf},{bw},{cr},{preamble}")
+
+    def set_parameters(self, sf, bw, cr, preamble):
+        return self.set_parameter(sf, bw, cr, preamble)
+
+    def get_rf_parameters(self):
+        """Gets current rf parameter settings as an (sf, bw, cr, preamble) tuple of ints"""
+        _, value = split_setting(self.get_parameter()[0])
+        return tuple(int(v) for v in value.split(","))
+
+    def time_on_air(self, payload_length):
+        """Seconds on air for a payload_length byte frame at the current rf parameters"""
+        return time_on_air(payload_length, *self.get_rf_parameters())
 
     def get_address(self):
         """Gets current node address (0-65535)"""
-        return self.send_command(f"AT+ADDRESS=?")
+        return self._query("ADDRESS")
 
     def set_address(self, address):
         """Sets current node address (0-65535)"""
-        return self.send_command(f"AT+ADDRESS={address}")
+        return self._configure("ADDRESS", address)
+
+    def get_network_id(self):
+        """Gets current LoRa network ID"""
+        return self._query("NETWORKID")
+
+    def set_network_id(self, network_id):
+        """Sets current LoRa network ID"""
+        return self._configure("NETWORKID", network_id)
 
     def get_node_pin(self):
         """Gets eight character node pin"""
-        return self.send_command(f"AT+CPIN=?")
+        return self._query("CPIN")
 
     def set_node_pin(self, node_pin):
         """Sets eight character node pin"""
-        return self.send_command(f"AT+CPIN={node_pin}")
+        return self._configure("CPIN", node_pin)
+
+    def set_password(self, password):
+        return self.set_node_pin(password)
 
     def get_tx_power(self):
         """Gets RF transmit power (in dBm)"""
-        return self.send_command(f"AT+CRFOP=?")
+        return self._query("CRFOP")
 
     def set_tx_power(self, pwr_dbm):
         """Sets RF transmit power,in dBm - (0-22dBM)"""
-        return self.send_command(f"AT+CRFOP={pwr_dbm}")
+        return self._configure("CRFOP", pwr_dbm)
+
+    def set_rf_power(self, power):
+        return self.set_tx_power(power)
+
+    def _read_settings(self, keys, timings):
+        """Current values of several registers, querying the unknown ones in one pipelined batch."""
+        values = {}
+        missing = []
+        for key in keys:
+            if self.cached and key in self._shadow:
+                values[key] = self._shadow[key][1]
+            else:
+                missing.append(key)
+        for command, response, seconds in self.send_commands([f"AT+{key}=?" for key in missing]):
+            key = command[3:-2]
+            prefix, values[key] = split_setting(response[0]) if response else (f"+{key}", "")
+            if self.cached:
+                self._shadow[key] = (prefix, values[key])
+            timings.append((command, seconds))
+        return values
+
+    def _write_settings(self, settings, timings):
+        """Pipelines AT+<key>=<value> for every setting and shadows the results."""
+        results = self.send_commands([f"AT+{key}={value}" for key, value in settings.items()])
+        for command, response, seconds in results:
+            timings.append((command, seconds))
+        if self.cached:
+            for key, value in settings.items():
+                prefix = self._shadow[key][0] if key in self._shadow else f"+{key}"
+                self._shadow[key] = (prefix, value)
+
+    def apply_config(self, profile):
+        """Brings the module to the settings in profile with the fewest commands.
+
+        profile is a dict, YAML file path or YAML string using the keys of
+        config_registers, e.g. {"band": 915000000, "address": 101,
+        "parameter": [9, 7, 1, 12]}. Current values are read in one
+        pipelined batch, only differing settings are written (also
+        pipelined), and ATZ is issued only when a reset_registers setting
+        changed.
+
+        Returns a dict with the applied "changes", whether a "reset" was
+        needed, per-command "timings" as (command, seconds) and the total
+        "elapsed" seconds.
+        """
+        started = time.monotonic()
+        desired = load_profile(profile)
+        timings = []
+        changes = {}
+        reset = False
+
+        needs_reset = {k: v for k, v in desired.items() if k in reset_registers}
+        if needs_reset:
+            current = self._read_settings(list(needs_reset), timings)
+            changed = {k: v for k, v in needs_reset.items() if current.get(k) != v}
+            if changed:
+                self._write_settings(changed, timings)
+                changes.update(changed)
+                before = time.monotonic()
+                self.reset()
+                timings.append(("ATZ", time.monotonic() - before))
+                reset = True
+
+        rest = {k: v for k, v in desired.items() if k not in reset_registers}
+        current = self._read_settings(list(rest), timings)
+        changed = {k: v for k, v in rest.items() if current.get(k) != v}
+        self._write_settings(changed, timings)
+        changes.update(changed)
+
+        return {
+            "changes": changes,
+            "reset": reset,
+            "timings": timings,
+            "elapsed": time.monotonic() - started,
+        }
 
     def send_data(self, rx_addr, data):
+        if not isinstance(data, str):
+            return self.send_bytes(rx_addr, data)
         payload_length = len(data)
         return self.send_command(f"AT+SEND={rx_addr},{payload_length},{data}")
+
+    def send_bytes(self, rx_addr, buf):
+        """Sends a binary payload from any buffer-protocol object (bytes,
+        bytearray, memoryview, array...), without a text round trip."""
+        view = memoryview(buf).cast("B")
+        payload = view.hex().encode() if self.hex_payloads else view
+        header = b"AT+SEND=%d,%d," % (rx_addr, len(payload))
+        return self.send_raw_command(b"".join((header, payload, b"\r\n")))
     
+    def send_fragmented(self, rx_addr, data):
+        """Sends data of any size as numbered fragments; returns the message id.
+
+        The receiving LoRaProp reassembles them in get_received_data and asks
+        for just the missing fragments if some are lost.
+        """
+        return self.fragmenter.send_data(rx_addr, data)
+
     def get_received_data(self):
-        """Checks for and returns received data (if any)."""
-        if self.ser.in_waiting > 0:
-            line = self.ser.readline().decode().strip()
-            if line.startswith("+RCV="):
-                parts = line[5:].split(",")
-                return {
-                    "address": int(parts[0]),
-                    "length": int(parts[1]),
-                    "data": parts[2],
-                    "rssi": int(parts[3]),
-                    "snr": int(parts[4]),
-                }
+        """Checks for and returns received data (if any).
+
+        Aggregated frames are split apart and returned one message per call;
+        fragmented messages are returned once complete.
+        """
+        if not self._rx_backlog:
+            self._service_reassembly()
+            self._read_frames()
+        if self._rx_backlog:
+            return self._rx_backlog.popleft()
         return None  # No data received
 
+    def drain_received(self):
+        """Generator over every frame already received, read in one bulk pass."""
+        self._service_reassembly()
+        self._read_frames()
+        while self._rx_backlog:
+            yield self._rx_backlog.popleft()
+
+    def _read_frames(self):
+        """Reads everything waiting on the port and queues the complete frames."""
+        waiting = self.ser.in_waiting
+        if waiting > 0:
+            self._rx_parser.feed(self.ser.read(waiting))
+        self._rx_frames.extend(self._rx_parser.frames())
+        while self._rx_frames:
+            frame = self._rx_frames.popleft()
+            for hook in self.hooks:
+                hook.on_frame(frame)
+            self._queue_frame(frame)
+
+    def _on_received_line(self, raw):
+        self._rx_parser.feed(raw)
+        self._rx_frames.extend(self._rx_parser.frames())
+
+    def _receiving(self):
+        return self._rx_parser.awaiting_payload()
+
+    def _abandon_receiving(self):
+        self._rx_parser.discard()
+
+    def _queue_frame(self, frame):
+        """Unpacks aggregates, reassembles fragments and answers resend requests."""
+        if not isinstance(frame["data"], str):
+            self._rx_backlog.append(frame)
+            return
+        parts = [frame]
+        if is_aggregate(frame["data"]):
+            parts = [dict(frame, data=m, length=len(m)) for m in unpack_messages(frame["data"])]
+        for part in parts:
+            if is_nack(part["data"]):
+                request = parse_nack(part["data"])
+                if request is not None:
+                    self.fragmenter.resend(part["address"], *request)
+            elif is_fragment(part["data"]):
+                message = self.reassembler.add(part)
+                if message is not None:
+                    self._rx_backlog.append(message)
+            else:
+                self._rx_backlog.append(part)
+
+    def _service_reassembly(self):
+        """Asks senders of stalled fragmented messages for the missing pieces."""
+        for address, msg_id, missing in self.reassembler.poll():
+            self.send_data(address, pack_nack(msg_id, missing))
 
     def factory_reset(self):
         """Restores device to mfg defaults
@@ -217,73 +842,105 @@ class LoRaProp(LoRaModule):
         Address: 0
         NetID: 18
         Tx Power: 22dBm"""
+        self.invalidate_cache()
         return self.send_command(f"AT+FACTORY")
 
 class LoRAMesh(LoRaProp):
-    def __init__(self, port, baudrate=9600, timeout=1):
-        super().__init__(port, baudrate, timeout)
-        self.reset()
+    def __init__(
+            self,
+            port,
+            baudrate=9600,
+            timeout=1,
+            dedup_window=64,
+            dedup_ttl=30,
+            rebroadcast_jitter=(0.1, 1.0),
+            suppress_after=3,
+            fast_start=False,
+            lazy=False,
+            clock=time.monotonic,
+            rng=None
+        ):
+        """rebroadcast_jitter: (min, max) seconds a relay waits for its slot
+        suppress_after: copies of a frame heard while waiting that cancel our relay
+        clock, rng: time source and random.Random for the duplicate filter,
+            relay slots and sequence counter (a simulator injects its own)
+        fast_start, lazy: see LoRaProp
+        """
+        self.origin = None
+        self.random = rng or random.Random()
+        self._counter = self.random.randrange(counter_modulus)
+        self.duplicates = DuplicateFilter(dedup_window, dedup_ttl, clock=clock)
+        self.rebroadcasts = RebroadcastScheduler(rebroadcast_jitter, suppress_after, clock=clock, rng=self.random)
+        super().__init__(port, baudrate, timeout, fast_start=fast_start, lazy=lazy)
+
+    def _startup(self):
+        super()._startup()
         self.set_address(0) # Addr 0 == broadcast mode
-        self.received_sequences = []
+        # The UID never changes, so read it once rather than per broadcast
+        self.origin = origin_id(self.get_unique_id()[0])
 
     def send_broadcast(self, data):
         """Broadcast data to all LoRa nodes by setting the address field to 0."""
         sequence_number = self._generate_sequence_number()
         payload = sequence_number + data
+        return self._broadcast(payload)
+
+    def _broadcast(self, payload):
         payload_length = len(payload)
         return self.send_command(f"AT+SEND=0,{payload_length},{payload}")
 
-    def relay_data(self, data, timeout=30):
-        """Relay received data if it hasn't been received before, based on sequence number."""
-        received_data = self.get_received_data()
+    def relay_data(self, data=None, timeout=30):
+        """Relay received data if it hasn't been received before, based on sequence number.
+
+        data is a frame from get_received_data(); if None, one is read now.
+        New frames are scheduled for a jittered relay slot rather than sent
+        at once; repeats count towards suppressing the pending relay. The
+        frame is forwarded unchanged so its origin sequence is kept.
+
+        Returns the response of the last relay sent by this call, if any.
+        """
+        received_data = data if data is not None else self.get_received_data()
         if received_data:
-            sequence_number = received_data['data'][:12]  
+            sequence_number = received_data['data'][:sequence_length]
             if not self._has_received_sequence(sequence_number, timeout):
-                return self.send_broadcast(received_data['data'])
-        return None
+                self.rebroadcasts.schedule(sequence_number, received_data['data'])
+            else:
+                self.rebroadcasts.heard(sequence_number)
+        return self.service_relays()
+
+    def service_relays(self):
+        """Sends every relay whose slot has come; call this regularly."""
+        response = None
+        for payload in self.rebroadcasts.due():
+            response = self._broadcast(payload)
+        return response
 
     def _generate_sequence_number(self):
-        """Generates a unique sequence number using the device UID."""
-        uid = self.get_unique_id()[0]  # Use UID as sequence number
-        return uid[:12]  
+        """Next sequence number: this node's origin id plus its counter."""
+        self.open()  # The origin id is read at startup
+        sequence_number = format_sequence(self.origin, self._counter)
+        self._counter = (self._counter + 1) % counter_modulus
+        # Our own broadcasts echoed back by neighbours must not be relayed
+        self.duplicates.seen(*parse_sequence(sequence_number))
+        return sequence_number
 
     def _has_received_sequence(self, sequence_number, timeout):
-        """Checks if the sequence number has been received within a specified timeout."""
-        current_time = time.time()
-        # Remove entries older than the timeout
-        self.received_sequences = [
-            (seq, ts) for seq, ts in self.received_sequences
-            if current_time - ts <= timeout
-        ]
-        # Check if the sequence number is already in the list
-        for seq, ts in self.received_sequences:
-            if seq == sequence_number:
-                return True
-
-        # If sequence number is not found, store it in the cache
-        self._store_sequence(sequence_number)
-        return False
-
-    def _store_sequence(self, sequence_number):
-        """Stores the sequence number with the current timestamp."""
-        current_time = time.time()
-        self.received_sequences.append((sequence_number, current_time))
-
-        # Keep only the last 128 sequence numbers
-        if len(self.received_sequences) > 128:
-            self.received_sequences.pop(0)
+        """Checks (and records) whether the sequence number was seen within timeout seconds.
 
+        Frames without a valid sequence are reported as seen so they are not relayed.
+        """
+        sequence = parse_sequence(sequence_number)
+        if sequence is None:
+            return True
+        return self.duplicates.seen(*sequence, ttl=timeout)
 
     def handle_collision(self):
         """Handles signal collision by relaying at random times.
 
-        Default to random time b/t 100ms and 1 sec
+        Relays wait a random slot in rebroadcast_jitter (default 100ms to
+        1 sec) on the rebroadcast scheduler, so this returns immediately.
         """
-        import random
-        import time
-        delay = random.uniform(0.1, 1.0)  
-        time.sleep(delay)
-        self.relay_data(self.get_received_data())
+        return self.relay_data(self.get_received_data())
 
     def send_data_with_collision_prevention(self, data):
         """Send data with collision prevention logic."""
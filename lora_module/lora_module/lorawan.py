@@ -0,0 +1,366 @@
+########################################################################
+### LoRaWAN session layer                                            ###
+###   Joins once and saves the session, so a restart resumes it      ###
+###   instead of joining again; turns the module's +EVT lines into   ###
+###   events instead of blocking calls; and packs application        ###
+###   uplinks into as few frames as the fair-use airtime allows.     ###
+########################################################################
+
+import json
+import os
+import time
+from collections import OrderedDict, deque
+
+from .airtime import time_on_air
+from .framing import aggregate_marker, pack_messages, packed_size
+from .lora_module import LoRaError, LoRaMode, session_registers, split_setting
+
+# MHDR, FHDR, FPort and MIC around every application payload
+lorawan_overhead = 13
+
+
+def _value(response):
+    """Value of a one-line query reply such as ['+NJS=1']."""
+    if isinstance(response, list) and response:
+        return split_setting(response[0])[1]
+    return None
+
+
+class LoRaWANSession:
+    def __init__(
+            self,
+            lora,
+            state_path=None,
+            fair_use=30.0,
+            window=86400,
+            max_payload=51,
+            linger=60.0,
+            rf_parameters=(10, 7, 1, 8),
+            counter_reserve=16,
+            max_session_age=30 * 86400,
+            join_timeout=20.0,
+            join_backoff=(15.0, 3600.0),
+            confirm_timeout=30.0,
+            max_confirm_failures=3,
+            clock=time.monotonic
+        ):
+        """Wraps a LoRaWAN module.
+
+        state_path: JSON file the session is saved to after a join and
+            restored from by start(), so a restart skips the join
+        fair_use: seconds of uplink airtime allowed per window (The Things
+            Network allows 30 s a day); uplinks are spaced so that an
+            uplink taking t seconds on air is followed by a gap of
+            t * window / fair_use, and messages queued meanwhile share
+            the next frame
+        max_payload: largest application payload of one uplink (51 bytes
+            fits every data rate in most regions)
+        linger: longest time, in seconds, a message waits for company
+            once the fair-use gap allows a send
+        rf_parameters: (sf, bw, cr, preamble) uplinks are assumed to go
+            out at, for the airtime estimate
+        counter_reserve: uplinks sent between saves of the frame counter;
+            the saved value is always ahead of the real one, so a restored
+            session never reuses a counter the network has seen
+        max_session_age: seconds after a join that a saved session is
+            still trusted
+        join_timeout, join_backoff: a join with no answer within
+            join_timeout seconds counts as failed; failed joins are retried
+            after join_backoff[0] seconds, doubling up to join_backoff[1]
+        confirm_timeout: seconds a confirmed uplink waits for its result
+        max_confirm_failures: confirmed uplinks in a row that go unacked
+            before the session is dropped and the device joins again
+        """
+        self.lora = lora
+        self.state_path = state_path
+        self.fair_use = fair_use
+        self.window = window
+        self.max_payload = max_payload
+        self.linger = linger
+        self.rf_parameters = rf_parameters
+        self.counter_reserve = counter_reserve
+        self.max_session_age = max_session_age
+        self.join_timeout = join_timeout
+        self.join_backoff = join_backoff
+        self.confirm_timeout = confirm_timeout
+        self.max_confirm_failures = max_confirm_failures
+        self.clock = clock
+        self.dev_eui = None
+        self.state = "idle"  # idle, joining, waiting (to retry a join) or joined
+        self.session = None  # {register: value} plus "dev_eui", "fcnt_up" (reserved) and "joined_at"
+        self.fcnt_up = 0
+        self.stats = {"joins": 0, "restored": 0, "uplinks": 0, "messages": 0, "airtime": 0.0}
+        self._events = deque()
+        self._queues = OrderedDict()  # (port, confirmed) -> [first queued at, [messages]]
+        self._outstanding = None  # (port, messages, sent at) of the confirmed uplink awaiting its result
+        self._confirm_failures = 0
+        self._next_uplink = 0.0
+        self._join_deadline = None
+        self._join_retry_at = None
+        self._join_delay = join_backoff[0]
+        self._flushing = False
+
+    # Session
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except ValueError:
+            return None  # Torn write; join again
+
+    def _save(self):
+        if not self.state_path:
+            return
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.session, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.state_path)
+
+    def forget(self):
+        """Drops the saved session, so the next start() joins again."""
+        self.session = None
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def _adopt(self, registers, fcnt_up, joined_at):
+        """Takes registers as the current session and saves it with the counter reserved ahead."""
+        self.fcnt_up = fcnt_up
+        self.session = dict(
+            registers,
+            dev_eui=self.dev_eui,
+            fcnt_up=fcnt_up + self.counter_reserve,
+            joined_at=joined_at,
+        )
+        self._save()
+        self.state = "joined"
+        self._confirm_failures = 0
+        self._join_delay = self.join_backoff[0]
+
+    def start(self):
+        """Brings the session up as cheaply as possible; returns how.
+
+        "module": the module still holds a session (only the host restarted)
+        "restored": the saved session was installed without a join
+        "joining": an over-the-air join was started; a "joined" event follows
+        """
+        mode = str(LoRaMode.MODE_LORAWAN.value)
+        if _value(self.lora.get_mode()) != mode:
+            self.lora.set_mode(mode)
+            self.lora.reset()  # Reset req'd for mode setting to take
+        self.dev_eui = _value(self.lora.get_dev_eui())
+        saved = self._load()
+        if saved is not None and (saved.get("dev_eui") != self.dev_eui
+                                  or time.time() - saved.get("joined_at", 0) > self.max_session_age):
+            saved = None
+
+        if _value(self.lora.get_join_status()) == "1":
+            registers = self.lora.get_session()
+            fcnt_up = int(registers["FCU"])
+            joined_at = time.time()
+            if saved is not None and saved["DEVADDR"] == registers["DEVADDR"]:
+                joined_at = saved["joined_at"]
+            self._adopt(registers, fcnt_up, joined_at)
+            self._emit("joined", how="module")
+            return "module"
+        if saved is not None:
+            registers = {key: saved[key] for key in session_registers}
+            registers["FCU"] = str(saved["fcnt_up"])
+            self.lora.set_session(registers)
+            self._adopt(registers, saved["fcnt_up"], saved["joined_at"])
+            self.stats["restored"] += 1
+            self._emit("joined", how="restored")
+            return "restored"
+        self._join()
+        return "joining"
+
+    def _join(self):
+        self.session = None
+        self.state = "joining"
+        self.lora.set_join_mode(1)
+        self.lora.join()
+        self._join_deadline = self.clock() + self.join_timeout
+
+    def _join_failed(self):
+        self.state = "waiting"
+        self._join_retry_at = self.clock() + self._join_delay
+        self._join_delay = min(self._join_delay * 2, self.join_backoff[1])
+        self._emit("join_failed", retry_in=self._join_retry_at - self.clock())
+
+    def _rejoin(self):
+        """The network no longer knows our session: forget it and join again."""
+        self.forget()
+        if self._outstanding is not None:
+            port, messages, _ = self._outstanding
+            self._requeue(port, True, messages)
+            self._outstanding = None
+        self._join()
+
+    # Events
+
+    def _emit(self, event, **fields):
+        self._events.append(dict(fields, event=event))
+
+    def _on_event(self, event):
+        name = event["event"]
+        if name == "JOINED" and self.state == "joining":
+            self._join_deadline = None
+            self.stats["joins"] += 1
+            self._adopt(self.lora.get_session(), 0, time.time())
+            self._emit("joined", how="join")
+        elif name.startswith("JOIN_FAILED") and self.state == "joining":
+            self._join_failed()
+        elif name.startswith("SEND_CONFIRMED") and self._outstanding is not None:
+            port, messages, _ = self._outstanding
+            self._outstanding = None
+            if name == "SEND_CONFIRMED_OK":
+                self._confirm_failures = 0
+                self._emit("confirmed", port=port, messages=messages)
+            else:
+                self._confirm_failed(port, messages)
+        elif name == "RX":
+            self._emit("downlink", **{k: v for k, v in event.items() if k != "event"})
+
+    def _confirm_failed(self, port, messages):
+        self._confirm_failures += 1
+        self._emit("failed", port=port, messages=messages)
+        if self._confirm_failures >= self.max_confirm_failures:
+            self._rejoin()
+
+    def get_event(self):
+        """Next event, else None. Every event is a dict with an "event" key:
+
+        joined (how: "module", "restored" or "join"), join_failed (retry_in),
+        sent (port, messages) for unconfirmed uplinks accepted by the module,
+        confirmed / failed (port, messages) for confirmed uplinks, and
+        downlink (port, data, rssi, snr, window, type).
+        """
+        self.poll()
+        if self._events:
+            return self._events.popleft()
+        return None
+
+    # Uplinks
+
+    def send(self, port, data, confirmed=False):
+        """Queues data for an uplink on port; returns the number of messages waiting."""
+        if len(data) > self.max_payload or (data.startswith(aggregate_marker) and packed_size([data]) > self.max_payload):
+            raise Exception(f"Message too long for one uplink: {len(data)} > {self.max_payload}")
+        key = (port, bool(confirmed))
+        if key not in self._queues:
+            self._queues[key] = [self.clock(), []]
+        self._queues[key][1].append(data)
+        return self.pending()
+
+    def _requeue(self, port, confirmed, messages):
+        """Puts messages back at the head of their queue."""
+        key = (port, confirmed)
+        if key in self._queues:
+            self._queues[key][1][:0] = messages
+        else:
+            self._queues[key] = [self.clock(), list(messages)]
+            self._queues.move_to_end(key, last=False)
+
+    def pending(self):
+        """Messages queued or awaiting a confirmed-uplink result."""
+        waiting = sum(len(messages) for _, messages in self._queues.values())
+        return waiting + (len(self._outstanding[1]) if self._outstanding else 0)
+
+    def airtime(self, length):
+        """Time on air of an uplink carrying length bytes of application payload."""
+        return time_on_air(length + lorawan_overhead, *self.rf_parameters)
+
+    def _take(self, messages):
+        """Splits off the longest head of messages that fits one uplink; returns (payload, count)."""
+        if len(messages) == 1 and not messages[0].startswith(aggregate_marker):
+            return messages[0], 1  # A lone message goes out as-is, without framing overhead
+        count = 0
+        while count < len(messages) and packed_size(messages[:count + 1]) <= self.max_payload:
+            count += 1
+        if count == 0:
+            return messages[0], 1  # Fits only unframed (send() keeps marker-led messages framable)
+        return pack_messages(messages[:count]), count
+
+    def _next_batch(self, now):
+        """Queue to send from now, or None: the oldest one that is full or has lingered."""
+        for key, (queued_at, messages) in self._queues.items():
+            if self._flushing or now - queued_at >= self.linger or packed_size(messages) >= self.max_payload:
+                return key
+        return None
+
+    def next_uplink_time(self):
+        """Earliest clock time the next uplink may go out (None if nothing is queued)."""
+        if not self._queues:
+            return None
+        oldest = min(queued_at for queued_at, _ in self._queues.values())
+        return max(self._next_uplink, oldest if self._flushing else oldest + self.linger)
+
+    def _uplink(self, now):
+        key = self._next_batch(now)
+        if key is None:
+            return
+        port, confirmed = key
+        payload, count = self._take(self._queues[key][1])
+        try:
+            self.lora.send_data(port, int(confirmed), payload)
+        except LoRaError as exc:
+            if exc.code == "AT_NO_NETWORK_JOINED":
+                self._rejoin()
+                return
+            if exc.code != "AT_BUSY_ERROR":
+                raise
+            self._next_uplink = now + 1.0  # Still in the previous uplink's receive windows
+            return
+        messages = self._queues[key][1][:count]
+        del self._queues[key][1][:count]
+        if not self._queues[key][1]:
+            del self._queues[key]
+        seconds = self.airtime(len(payload))
+        self._next_uplink = now + seconds * self.window / self.fair_use
+        self.stats["uplinks"] += 1
+        self.stats["messages"] += count
+        self.stats["airtime"] += seconds
+        self.fcnt_up += 1
+        if self.fcnt_up >= self.session["fcnt_up"]:
+            self.session["fcnt_up"] = self.fcnt_up + self.counter_reserve
+            self._save()
+        if confirmed:
+            self._outstanding = (port, messages, now)
+        else:
+            self._emit("sent", port=port, messages=messages)
+
+    def poll(self):
+        """Handles module events and due timeouts, then sends an uplink if one is due."""
+        for event in self.lora.drain_events():
+            self._on_event(event)
+        now = self.clock()
+        if self.state == "joining" and now >= self._join_deadline:
+            self._join_failed()
+        elif self.state == "waiting" and now >= self._join_retry_at:
+            self._join()
+        if self._outstanding is not None and now - self._outstanding[2] >= self.confirm_timeout:
+            port, messages, _ = self._outstanding
+            self._outstanding = None
+            self._confirm_failed(port, messages)
+        if self.state == "joined" and self._outstanding is None and now >= self._next_uplink:
+            self._uplink(now)
+
+    def flush(self, timeout=None, interval=0.05):
+        """Sends everything queued without waiting for company, still within
+        fair use; returns False if timeout seconds elapsed first."""
+        deadline = None if timeout is None else self.clock() + timeout
+        self._flushing = True
+        try:
+            while True:
+                self.poll()
+                if not self.pending():
+                    return True
+                if deadline is not None and self.clock() >= deadline:
+                    return False
+                time.sleep(interval)
+        finally:
+            self._flushing = False
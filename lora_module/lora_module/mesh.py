@@ -0,0 +1,162 @@
+########################################################################
+### Helpers for LoRAMesh flooding                                    ###
+########################################################################
+
+import heapq
+import random
+import time
+import zlib
+
+# Mesh frames start with a 12 character sequence: an 8 hex digit origin
+# id (CRC32 of the module UID) and a 4 hex digit per-origin counter
+sequence_length = 12
+counter_modulus = 0x10000
+
+def origin_id(uid):
+    """Short, stable origin id for a module UID."""
+    return f"{zlib.crc32(uid.encode()) & 0xffffffff:08x}"
+
+def format_sequence(origin, counter):
+    return f"{origin}{counter % counter_modulus:04x}"
+
+def parse_sequence(data):
+    """Returns (origin, counter) from a mesh frame's payload, else None."""
+    if len(data) < sequence_length:
+        return None
+    try:
+        return data[:8], int(data[8:sequence_length], 16)
+    except ValueError:
+        return None
+
+
+class DuplicateFilter:
+    def __init__(self, window=64, ttl=30, clock=time.monotonic, reset_after=1024):
+        """Per-origin sliding-window bitmap over the wrapping sequence counter.
+
+        Each origin costs one dict entry: the highest counter seen, a bitmap
+        of the window counters before it, and when it was last heard. Checks
+        are O(1); origins silent for ttl seconds are forgotten.
+
+        window: how far behind the highest counter duplicates are tracked;
+            anything older is treated as a duplicate
+        reset_after: a counter this far behind the highest is taken as the
+            origin having rebooted (it draws a fresh counter), and restarts
+            its window; rejected frames never refresh last heard, so an
+            origin that is merely behind is forgotten after ttl
+        """
+        self.window = window
+        self.reset_after = max(reset_after, window)
+        self.ttl = ttl
+        self.clock = clock
+        self._mask = (1 << window) - 1
+        self._origins = {}  # origin -> [highest counter, bitmap, last heard]
+        self._last_sweep = clock()
+
+    def __len__(self):
+        return len(self._origins)
+
+    def seen(self, origin, counter, ttl=None):
+        """Records (origin, counter); returns True if it had been seen before."""
+        now = self.clock()
+        ttl = self.ttl if ttl is None else ttl
+        if now - self._last_sweep > self.ttl:
+            self._sweep(now)
+
+        entry = self._origins.get(origin)
+        if entry is None or now - entry[2] > ttl:
+            self._origins[origin] = [counter, 1, now]
+            return False
+
+        ahead = (counter - entry[0]) % counter_modulus
+        if ahead == 0:
+            return True
+        if ahead < counter_modulus // 2:
+            # Newer than anything so far: slide the window forward
+            entry[0] = counter
+            entry[1] = ((entry[1] << ahead) | 1) & self._mask
+            entry[2] = now
+            return False
+
+        behind = counter_modulus - ahead
+        if behind >= self.reset_after:
+            self._origins[origin] = [counter, 1, now]  # The origin restarted its counter
+            return False
+        if behind >= self.window:
+            return True
+        bit = 1 << behind
+        if entry[1] & bit:
+            return True
+        entry[1] |= bit
+        entry[2] = now
+        return False
+
+    def _sweep(self, now):
+        """Forgets origins not heard from for ttl seconds."""
+        self._last_sweep = now
+        stale = [o for o, entry in self._origins.items() if now - entry[2] > self.ttl]
+        for origin in stale:
+            del self._origins[origin]
+
+
+class RebroadcastScheduler:
+    def __init__(self, jitter=(0.1, 1.0), suppress_after=3, clock=time.monotonic, rng=None):
+        """Heap of pending relays, each waiting a random slot in the jitter window.
+
+        Counter-based suppression: a relay is cancelled once its sequence has
+        been heard suppress_after times (the first reception included) while
+        waiting, since the neighbourhood has then been covered already.
+
+        jitter: (min, max) seconds a relay waits before going out
+        suppress_after: copies heard that cancel a pending relay (0 disables)
+        rng: random.Random drawing the slots (a private one by default)
+        """
+        self.jitter = jitter
+        self.suppress_after = suppress_after
+        self.clock = clock
+        self.random = rng or random.Random()
+        self.suppressed = 0
+        self._heap = []  # (due, order, sequence)
+        self._pending = {}  # sequence -> [payload, times heard]
+        self._order = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, sequence, payload):
+        """Queues payload for relaying at a random time within the jitter window."""
+        due = self.clock() + self.random.uniform(*self.jitter)
+        self._pending[sequence] = [payload, 1]
+        heapq.heappush(self._heap, (due, self._order, sequence))
+        self._order += 1
+
+    def heard(self, sequence):
+        """Counts another copy of sequence; cancels its relay at the threshold.
+
+        Returns True if the relay was cancelled.
+        """
+        entry = self._pending.get(sequence)
+        if entry is None:
+            return False
+        entry[1] += 1
+        if self.suppress_after and entry[1] >= self.suppress_after:
+            del self._pending[sequence]  # Its heap slot is skipped when it comes due
+            self.suppressed += 1
+            return True
+        return False
+
+    def next_due(self):
+        """Clock time of the next relay (None if nothing is pending)."""
+        while self._heap and self._heap[0][2] not in self._pending:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def due(self):
+        """Pops and returns the payloads of every relay whose slot has come."""
+        now = self.clock()
+        payloads = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, sequence = heapq.heappop(self._heap)
+            entry = self._pending.pop(sequence, None)
+            if entry is not None:
+                payloads.append(entry[0])
+        return payloads
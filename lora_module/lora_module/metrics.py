@@ -0,0 +1,176 @@
+########################################################################
+### Instrumentation                                                  ###
+###   Metrics keeps counters, gauges and fixed-bucket histograms and ###
+###   renders them in Prometheus text format; LoRaMetrics is a hook  ###
+###   for LoRaModule.add_hook() that feeds it command timings, error ###
+###   codes, traffic counts and link quality.                        ###
+########################################################################
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+rssi_buckets = (-130, -120, -110, -100, -90, -80, -70, -60, -50, -40, -30)
+snr_buckets = (-20, -15, -10, -5, 0, 5, 10, 15)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self):
+        """A registry of metric series, keyed by name and label set.
+
+        Series are created on first use; describe() adds the HELP text and,
+        for histograms, the bucket bounds (latency_buckets by default).
+        """
+        self._kinds = {}  # name -> (type, help, buckets)
+        self._series = {}  # name -> {labels: value, [bucket counts, sum, count] or callable}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help="", buckets=None):
+        with self._lock:
+            self._kinds[name] = (kind, help, tuple(buckets or latency_buckets))
+            self._series.setdefault(name, {})
+
+    def _get(self, name, kind):
+        series = self._series.get(name)
+        if series is None:
+            self._kinds.setdefault(name, (kind, "", latency_buckets))
+            series = self._series[name] = {}
+        return series
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._get(name, "counter")
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Sets a gauge; value may be a callable evaluated at every render
+        (which also suits counters kept elsewhere)."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._get(name, "gauge")[key] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._get(name, "histogram")
+            buckets = self._kinds[name][2]
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def value(self, name, **labels):
+        """Current value of a counter or gauge ((sum, count) for histograms)."""
+        with self._lock:
+            entry = self._series.get(name, {}).get(tuple(sorted(labels.items())))
+        if callable(entry):
+            return entry()
+        if isinstance(entry, list):
+            return entry[1], entry[2]
+        return entry
+
+    def render(self):
+        """The registry in Prometheus text exposition format."""
+        with self._lock:
+            snapshot = [
+                (name, self._kinds[name], [(k, list(v) if isinstance(v, list) else v) for k, v in series.items()])
+                for name, series in self._series.items()
+            ]
+        lines = []
+        for name, (kind, help, buckets), series in snapshot:
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, entry in series:
+                if kind != "histogram":
+                    value = entry() if callable(entry) else entry
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                counts, total, count = entry
+                cumulative = 0
+                for bound, n in zip(buckets + (None,), counts):
+                    cumulative += n
+                    le = "+Inf" if bound is None else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="localhost", port=9100):
+        """Serves render() at /metrics from a background thread; returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class LoRaMetrics:
+    def __init__(self, metrics, **labels):
+        """Hook recording a radio's traffic into metrics; labels (e.g.
+        radio="915") are added to every series."""
+        self.metrics = metrics
+        self.labels = labels
+        metrics.describe("lora_command_seconds", "histogram", "AT command round-trip time")
+        metrics.describe("lora_commands_total", "counter", "AT commands by final status")
+        metrics.describe("lora_tx_frames_total", "counter", "Frames accepted by AT+SEND")
+        metrics.describe("lora_tx_bytes_total", "counter", "Payload bytes accepted by AT+SEND")
+        metrics.describe("lora_rx_frames_total", "counter", "Frames received")
+        metrics.describe("lora_rx_bytes_total", "counter", "Payload bytes received")
+        metrics.describe("lora_rssi_dbm", "histogram", "RSSI of received frames", rssi_buckets)
+        metrics.describe("lora_snr_db", "histogram", "SNR of received frames", snr_buckets)
+        metrics.describe("lora_last_rssi_dbm", "gauge", "RSSI of the last received frame")
+        metrics.describe("lora_last_snr_db", "gauge", "SNR of the last received frame")
+
+    def on_command(self, command, seconds, status):
+        """Called after every AT command with its round trip and OK or the error code."""
+        name = command[3:].split("=", 1)[0] if command.startswith("AT+") else command
+        self.metrics.observe("lora_command_seconds", seconds, command=name, **self.labels)
+        self.metrics.inc("lora_commands_total", command=name, status=status, **self.labels)
+        if name == "SEND" and status == "OK":
+            self.metrics.inc("lora_tx_frames_total", **self.labels)
+            self.metrics.inc("lora_tx_bytes_total", len(command.split(",", 2)[-1]), **self.labels)
+
+    def on_frame(self, frame):
+        """Called with every +RCV frame as parsed, before unpacking or reassembly."""
+        self.metrics.inc("lora_rx_frames_total", **self.labels)
+        self.metrics.inc("lora_rx_bytes_total", frame["length"], **self.labels)
+        self.metrics.observe("lora_rssi_dbm", frame["rssi"], **self.labels)
+        self.metrics.observe("lora_snr_db", frame["snr"], **self.labels)
+        self.metrics.set("lora_last_rssi_dbm", frame["rssi"], **self.labels)
+        self.metrics.set("lora_last_snr_db", frame["snr"], **self.labels)
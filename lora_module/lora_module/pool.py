@@ -0,0 +1,137 @@
+########################################################################
+### Several radios driven from one process                           ###
+###   RadioPool waits on every module's serial port with a single    ###
+###   selector, merges their RX into one stream tagged with the      ###
+###   radio, and spreads TX by free airtime and queue depth.         ###
+########################################################################
+
+import selectors
+import time
+
+from .scheduler import TxScheduler
+
+
+class RadioPool:
+    def __init__(self, radios, duty_cycle=0.01, window=3600, guard=0.05, clock=time.monotonic):
+        """Owns several LoRaProp instances.
+
+        radios: dict of name -> LoRaProp, or a list of LoRaProp named by
+            their serial port
+        duty_cycle, window, guard: passed to each radio's TxScheduler
+
+        Received frames carry the name of the radio that heard them in
+        frame["radio"].
+        """
+        if not isinstance(radios, dict):
+            radios = {lora.ser.port: lora for lora in radios}
+        if not radios:
+            raise Exception("RadioPool needs at least one radio")
+        self.radios = radios
+        self.clock = clock
+        self.schedulers = {
+            name: TxScheduler(lora, duty_cycle=duty_cycle, window=window, guard=guard, clock=clock)
+            for name, lora in radios.items()
+        }
+        self.selector = selectors.DefaultSelector()
+        for name, lora in radios.items():
+            self.selector.register(lora.ser.fileno(), selectors.EVENT_READ, name)
+
+    def __len__(self):
+        return len(self.radios)
+
+    def close(self):
+        self.selector.close()
+        for lora in self.radios.values():
+            lora.ser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # RX
+
+    def _drain(self, name):
+        for frame in self.radios[name].drain_received():
+            frame["radio"] = name
+            yield frame
+
+    def drain_received(self):
+        """Generator over every frame already received by any radio."""
+        for name in self.radios:
+            yield from self._drain(name)
+
+    def receive(self, timeout=None):
+        """Waits up to timeout seconds for frames on any radio; returns them as a list."""
+        frames = []
+        for key, _ in self.selector.select(timeout):
+            frames.extend(self._drain(key.data))
+        return frames
+
+    def reassembly_pending(self):
+        """Whether any radio is waiting for fragments."""
+        return any(lora.reassembler.pending() for lora in self.radios.values())
+
+    # TX
+
+    def backlog(self, name):
+        """Airtime (in seconds) already queued on a radio."""
+        scheduler = self.schedulers[name]
+        return sum(scheduler.airtime(data) for _, data, _ in scheduler.queue)
+
+    def pick(self, data):
+        """Name of the radio that can carry data soonest.
+
+        Radios with enough duty-cycle budget left for their backlog plus
+        data are preferred; among them the least backlogged one wins,
+        then the one with the most free airtime.
+        """
+        best, best_key = None, None
+        for name, scheduler in self.schedulers.items():
+            backlog = self.backlog(name)
+            remaining = scheduler.remaining_airtime()
+            fits = remaining >= backlog + scheduler.airtime(data)
+            key = (not fits, backlog, -remaining)
+            if best_key is None or key < best_key:
+                best, best_key = name, key
+        return best
+
+    def send_data(self, rx_addr, data, radio=None):
+        """Queues data for rx_addr on radio (picked if None); returns the radio's name."""
+        name = radio if radio is not None else self.pick(data)
+        self.schedulers[name].send_data(rx_addr, data)
+        return name
+
+    def pending(self):
+        """Frames queued across all radios."""
+        return sum(len(scheduler.queue) for scheduler in self.schedulers.values())
+
+    def next_send_time(self):
+        """Earliest time any radio may send its head frame (None if all are idle)."""
+        times = [s.next_send_time() for s in self.schedulers.values() if s.queue]
+        return min(times) if times else None
+
+    def poll(self):
+        """Sends every head frame that is due; returns {radio name: response}."""
+        responses = {}
+        for name, scheduler in self.schedulers.items():
+            response = scheduler.poll()
+            if response is not None:
+                responses[name] = response
+        return responses
+
+    def flush(self, timeout=None):
+        """Blocks until every radio's queue has drained (or timeout seconds elapsed)."""
+        deadline = None if timeout is None else self.clock() + timeout
+        while self.pending():
+            self.poll()
+            due = self.next_send_time()
+            now = self.clock()
+            if due is None:
+                continue
+            if deadline is not None and now >= deadline:
+                return False
+            if due > now:
+                time.sleep((due if deadline is None else min(due, deadline)) - now)
+        return True
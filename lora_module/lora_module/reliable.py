@@ -0,0 +1,319 @@
+########################################################################
+### Reliable, ordered delivery over LoRaProp.send_data               ###
+###   Selective repeat: a window of frames per destination is kept   ###
+###   in flight, acks are cumulative with a bitmap of frames held    ###
+###   out of order, and only frames whose own timer expires are      ###
+###   resent. Timeouts adapt to measured round trips (RFC 6298).     ###
+########################################################################
+
+import random
+import time
+from collections import OrderedDict, deque
+
+from .framing import (
+    is_ack,
+    is_reliable,
+    max_payload,
+    pack_ack,
+    pack_reliable,
+    parse_ack,
+    parse_reliable,
+    reliable_header_size,
+)
+from .lora_module import LoRaError
+
+sequence_space = 0x100
+
+
+class _Sender:
+    def __init__(self, epoch, initial_rto):
+        self.epoch = epoch
+        self.next_seq = 0
+        self.queue = deque()
+        self.in_flight = OrderedDict()  # seq -> [data, sent at, retries]
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self.peer_epoch = None  # The receiver's epoch, from its acks
+
+
+class _Receiver:
+    def __init__(self, epoch):
+        self.epoch = epoch
+        self.expected = 0
+        self.held = {}  # seq -> frame received out of order
+        self.gap_since = None
+        self.ack_due = None
+        self.unacked = 0
+
+
+class ReliableLink:
+    def __init__(
+            self,
+            lora,
+            window=8,
+            initial_rto=3.0,
+            min_rto=0.5,
+            max_rto=60.0,
+            max_retries=8,
+            ack_delay=0.1,
+            ack_every=4,
+            reorder_timeout=60.0,
+            clock=time.monotonic
+        ):
+        """Wraps a LoRaProp (anything with send_data and drain_received).
+
+        window: frames in flight per destination, at most 128
+        initial_rto: retransmission timeout before any round trip is measured
+        min_rto, max_rto: bounds on the adaptive timeout
+        max_retries: resends before a frame is given up (see failed)
+        ack_delay, ack_every: acks are held back up to ack_delay seconds or
+            ack_every frames so one ack covers several; frames arriving out
+            of order are acked at once
+        reorder_timeout: seconds a receiver waits for a missing frame before
+            delivering what it holds after the gap
+
+        Each link picks a random epoch; a receiver that sees a new epoch
+        from a sender starts that sender's sequence over. Acks carry the
+        receiver's epoch too: when it changes, the receiver has restarted
+        and lost its state, so the sender takes a new epoch and resends
+        every unacked frame from sequence 0. Frames the restarted receiver
+        already delivered may then be delivered twice.
+        """
+        if not 0 < window <= sequence_space // 2:
+            raise Exception(f"Window must be between 1 and {sequence_space // 2}")
+        self.lora = lora
+        self.window = window
+        self.initial_rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.max_retries = max_retries
+        self.ack_delay = ack_delay
+        self.ack_every = ack_every
+        self.reorder_timeout = reorder_timeout
+        self.clock = clock
+        self.epoch = random.randrange(sequence_space)
+        self.max_payload = max_payload - reliable_header_size
+        self.failed = []  # (rx_addr, data) given up after max_retries
+        self.stats = {"sent": 0, "resent": 0, "acked": 0, "acks_sent": 0, "delivered": 0, "duplicates": 0, "restarts": 0}
+        self._senders = {}
+        self._receivers = {}
+        self._received = deque()
+
+    def _sender(self, rx_addr):
+        sender = self._senders.get(rx_addr)
+        if sender is None:
+            sender = self._senders[rx_addr] = _Sender(self.epoch, self.initial_rto)
+        return sender
+
+    # TX
+
+    def send_data(self, rx_addr, data):
+        """Queues data for reliable delivery to rx_addr; sends what the window allows."""
+        if not isinstance(data, str):
+            raise Exception(f"ReliableLink only carries str payloads, not {type(data).__name__}")
+        if len(data) > self.max_payload:
+            raise Exception(f"Message too long for one reliable frame: {len(data)} > {self.max_payload}")
+        self._sender(rx_addr).queue.append(data)
+        self._fill(rx_addr, self._senders[rx_addr], self.clock())
+
+    def in_flight(self, rx_addr=None):
+        """Frames sent but not yet acked (to rx_addr, or to anyone)."""
+        senders = self._senders.values() if rx_addr is None else [self._sender(rx_addr)]
+        return sum(len(s.in_flight) for s in senders)
+
+    def pending(self):
+        """Frames queued or in flight, to anyone."""
+        return sum(len(s.queue) + len(s.in_flight) for s in self._senders.values())
+
+    def rto(self, rx_addr):
+        """Current retransmission timeout towards rx_addr, in seconds."""
+        return self._sender(rx_addr).rto
+
+    def _transmit(self, rx_addr, sender, seq, now):
+        entry = sender.in_flight[seq]
+        try:
+            self.lora.send_data(rx_addr, pack_reliable(sender.epoch, seq, entry[0]))
+        except LoRaError as exc:
+            if exc.code != "AT_BUSY_ERROR":
+                raise
+            return False  # Left unsent; the next poll tries again
+        entry[1] = now
+        self.stats["sent" if entry[2] == 0 else "resent"] += 1
+        return True
+
+    def _fill(self, rx_addr, sender, now):
+        while sender.queue and len(sender.in_flight) < self.window:
+            seq = sender.next_seq
+            sender.next_seq = (seq + 1) % sequence_space
+            sender.in_flight[seq] = [sender.queue.popleft(), None, 0]
+            if not self._transmit(rx_addr, sender, seq, now):
+                return
+
+    def _sample_rtt(self, sender, rtt):
+        if sender.srtt is None:
+            sender.srtt, sender.rttvar = rtt, rtt / 2
+        else:
+            sender.rttvar = 0.75 * sender.rttvar + 0.25 * abs(sender.srtt - rtt)
+            sender.srtt = 0.875 * sender.srtt + 0.125 * rtt
+        sender.rto = min(max(sender.srtt + 4 * sender.rttvar, self.min_rto), self.max_rto)
+
+    def _on_ack(self, address, epoch, receiver_epoch, expected, bitmap, now):
+        sender = self._senders.get(address)
+        if sender is None or epoch != sender.epoch:
+            return  # Stale ack from before a restart
+        if sender.peer_epoch is None:
+            sender.peer_epoch = receiver_epoch
+        elif receiver_epoch != sender.peer_epoch:
+            # The receiver restarted: this ack describes state it built
+            # mid-stream, so nothing in it can be trusted
+            self._restart(address, sender, receiver_epoch, now)
+            return
+        for seq in list(sender.in_flight):
+            behind = (expected - seq) % sequence_space
+            ahead = (seq - expected - 1) % sequence_space
+            if 0 < behind <= sequence_space // 2 or (ahead < sequence_space // 2 and bitmap >> ahead & 1):
+                data, sent_at, retries = sender.in_flight.pop(seq)
+                self.stats["acked"] += 1
+                if retries == 0 and sent_at is not None:
+                    self._sample_rtt(sender, now - sent_at)  # Karn: first transmissions only
+
+    def _restart(self, rx_addr, sender, receiver_epoch, now):
+        """Starts the sequence to rx_addr over under a new epoch, unacked frames first."""
+        sender.epoch = (sender.epoch + random.randrange(1, sequence_space)) % sequence_space
+        sender.peer_epoch = receiver_epoch
+        sender.queue.extendleft(reversed([entry[0] for entry in sender.in_flight.values()]))
+        sender.in_flight.clear()
+        sender.next_seq = 0
+        self.stats["restarts"] += 1
+        self._fill(rx_addr, sender, now)
+
+    def _service_sender(self, rx_addr, sender, now):
+        timed_out = False
+        for seq, entry in list(sender.in_flight.items()):
+            data, sent_at, retries = entry
+            if sent_at is not None and now - sent_at < sender.rto:
+                continue
+            if sent_at is not None:
+                timed_out = True
+                if retries >= self.max_retries:
+                    del sender.in_flight[seq]
+                    self.failed.append((rx_addr, data))
+                    continue
+                entry[2] += 1
+            if not self._transmit(rx_addr, sender, seq, now):
+                break
+        if timed_out:
+            sender.rto = min(sender.rto * 2, self.max_rto)
+        self._fill(rx_addr, sender, now)
+
+    # RX
+
+    def _deliver(self, receiver, frame):
+        self._received.append(frame)
+        self.stats["delivered"] += 1
+        receiver.expected = (receiver.expected + 1) % sequence_space
+        while receiver.expected in receiver.held:
+            self._received.append(receiver.held.pop(receiver.expected))
+            self.stats["delivered"] += 1
+            receiver.expected = (receiver.expected + 1) % sequence_space
+
+    def _on_data(self, frame, epoch, seq, payload, now):
+        address = frame["address"]
+        receiver = self._receivers.get(address)
+        if receiver is None or receiver.epoch != epoch:
+            receiver = self._receivers[address] = _Receiver(epoch)
+        frame = dict(frame, data=payload, length=len(payload))
+
+        offset = (seq - receiver.expected) % sequence_space
+        if offset == 0:
+            self._deliver(receiver, frame)
+        elif offset < sequence_space // 2 and seq not in receiver.held:
+            receiver.held[seq] = frame
+        else:
+            self.stats["duplicates"] += 1  # Our ack was lost; ack again
+        if receiver.held:
+            receiver.gap_since = receiver.gap_since or now
+        else:
+            receiver.gap_since = None
+
+        receiver.unacked += 1
+        if receiver.held or offset != 0 or receiver.unacked >= self.ack_every:
+            receiver.ack_due = now
+        elif receiver.ack_due is None:
+            receiver.ack_due = now + self.ack_delay
+
+    def _service_receiver(self, address, receiver, now):
+        if receiver.held and now - receiver.gap_since >= self.reorder_timeout:
+            # Give up on the gap: resume at the oldest frame held
+            receiver.expected = min(receiver.held, key=lambda s: (s - receiver.expected) % sequence_space)
+            self._deliver(receiver, receiver.held.pop(receiver.expected))
+            receiver.gap_since = now if receiver.held else None
+        if receiver.ack_due is None or receiver.ack_due > now:
+            return
+        bitmap = 0
+        for seq in receiver.held:
+            bitmap |= 1 << ((seq - receiver.expected - 1) % sequence_space)
+        try:
+            self.lora.send_data(address, pack_ack(receiver.epoch, self.epoch, receiver.expected, bitmap))
+        except LoRaError as exc:
+            if exc.code != "AT_BUSY_ERROR":
+                raise
+            return  # Try again on the next poll
+        self.stats["acks_sent"] += 1
+        receiver.ack_due = None
+        receiver.unacked = 0
+
+    def poll(self):
+        """Handles received frames and acks, then sends due acks, resends and new frames."""
+        now = self.clock()
+        for frame in self.lora.drain_received():
+            data = frame["data"]
+            if not isinstance(data, str):
+                # A binary=True radio: protocol frames are text, other traffic stays bytes
+                text = bytes(data).decode(errors="replace")
+                if not (is_reliable(text) or is_ack(text)):
+                    self._received.append(frame)
+                    continue
+                frame, data = dict(frame, data=text), text
+            if is_reliable(data):
+                parsed = parse_reliable(data)
+                if parsed is not None:
+                    self._on_data(frame, *parsed, now)
+                    continue
+            elif is_ack(data):
+                parsed = parse_ack(data)
+                if parsed is not None:
+                    self._on_ack(frame["address"], *parsed, now)
+                    continue
+            self._received.append(frame)  # Ordinary traffic passes through
+        for address, receiver in self._receivers.items():
+            self._service_receiver(address, receiver, now)
+        for rx_addr, sender in self._senders.items():
+            self._service_sender(rx_addr, sender, now)
+
+    def get_received_data(self):
+        """Next delivered message (in order per sender) or passed-through frame, else None."""
+        self.poll()
+        if self._received:
+            return self._received.popleft()
+        return None
+
+    def next_event_time(self):
+        """Clock time of the next ack or retransmission due (None if nothing is)."""
+        times = [r.ack_due for r in self._receivers.values() if r.ack_due is not None]
+        times += [r.gap_since + self.reorder_timeout for r in self._receivers.values() if r.held]
+        for sender in self._senders.values():
+            times += [entry[1] + sender.rto for entry in sender.in_flight.values() if entry[1] is not None]
+        return min(times) if times else None
+
+    def flush(self, timeout=None, interval=0.01):
+        """Polls until every queued frame is acked or given up (or timeout seconds elapsed)."""
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            self.poll()
+            if not self.pending() and all(r.ack_due is None for r in self._receivers.values()):
+                return True
+            if deadline is not None and self.clock() >= deadline:
+                return False
+            time.sleep(interval)
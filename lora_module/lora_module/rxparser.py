@@ -0,0 +1,172 @@
+########################################################################
+### Incremental +RCV parser                                          ###
+###   Bytes read from the serial port are appended to one reusable   ###
+###   buffer; +RCV=addr,len,data,rssi,snr frames are cut out using   ###
+###   the length field, so payloads may contain commas or newlines.  ###
+########################################################################
+
+from binascii import unhexlify
+
+from .framing import max_payload
+
+_prefix = b"+RCV="
+
+class RxParser:
+    def __init__(self, size=4096, binary=False, hex_payloads=False, max_length=2 * max_payload):
+        """binary: frames carry data as bytes, copied once out of the
+            buffer, instead of decoded text
+        hex_payloads: payloads arrive hex encoded and are returned as
+            the bytes they encode (implies binary)
+        max_length: length fields above this are taken as corruption,
+            so a bad one cannot hold up the stream
+        """
+        self.binary = binary or hex_payloads
+        self.hex_payloads = hex_payloads
+        self.max_length = max_length
+        self._buffer = bytearray(size)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        """Bytes buffered but not yet parsed."""
+        return self._end - self._start
+
+    def awaiting_payload(self):
+        """Whether the unparsed bytes are the start of a +RCV frame still
+        missing part of its header or of its declared payload."""
+        buf, start, end = self._buffer, self._start, self._end
+        while start < end and buf[start] in b"\r\n":
+            start += 1
+        if not buf.startswith(_prefix, start, end):
+            return start < end and _prefix.startswith(buf[start:end])
+        address, pos = self._field(start + len(_prefix), end, b",")
+        if pos is None:
+            return True
+        if address is None:
+            return False
+        length, pos = self._field(pos, end, b",")
+        if pos is None:
+            return True
+        if length is None or length > self.max_length:
+            return False
+        return pos + length >= end
+
+    def discard(self):
+        """Drops the unparsed bytes, e.g. a frame that will never complete."""
+        self._start = self._end = 0
+
+    def feed(self, data):
+        """Appends raw bytes read from the port."""
+        n = len(data)
+        if self._end + n > len(self._buffer):
+            self._compact(n)
+        self._buffer[self._end:self._end + n] = data
+        self._end += n
+
+    def _compact(self, extra):
+        """Moves unparsed bytes to the front, growing the buffer only if it must."""
+        pending = self._end - self._start
+        if pending + extra > len(self._buffer):
+            size = len(self._buffer)
+            while size < pending + extra:
+                size *= 2
+            grown = bytearray(size)
+            grown[:pending] = self._buffer[self._start:self._end]
+            self._buffer = grown
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start, self._end = 0, pending
+
+    def frames(self):
+        """Yields every complete frame in the buffer as a dict.
+
+        Lines that are not +RCV frames (stray command replies) are
+        discarded; an incomplete frame stays buffered for the next feed.
+        """
+        buf = self._buffer
+        while self._start < self._end:
+            start, end = self._start, self._end
+            if buf[start] in b"\r\n":
+                self._start += 1
+                continue
+            if end - start < len(_prefix) and _prefix.startswith(buf[start:end]):
+                return
+            if buf.startswith(_prefix, start, end):
+                frame, resume = self._parse_frame(start + len(_prefix), end)
+                if resume is None:
+                    return
+                self._start = resume
+                if frame is not None:
+                    yield frame
+                continue
+            newline = buf.find(b"\n", start, end)
+            resync = buf.find(_prefix, start, end if newline < 0 else newline)
+            if resync >= 0:
+                self._start = resync  # A frame glued to the end of a junk tail
+                continue
+            if newline < 0:
+                return
+            self._start = newline + 1
+
+    def _field(self, pos, end, terminator):
+        """(int value, position after terminator); value None if malformed, position None if incomplete."""
+        stop = self._buffer.find(terminator, pos, end)
+        newline = self._buffer.find(b"\n", pos, end if stop < 0 else stop)
+        if newline >= 0:
+            return None, newline + 1
+        if stop < 0:
+            return None, None
+        try:
+            return int(self._buffer[pos:stop]), stop + len(terminator)
+        except ValueError:
+            return None, stop + len(terminator)
+
+    def _skip_line(self, pos, end):
+        newline = self._buffer.find(b"\n", pos, end)
+        return (None, None) if newline < 0 else (None, newline + 1)
+
+    def _parse_frame(self, pos, end):
+        """Returns (frame, resume position); resume is None when more bytes are needed."""
+        address, pos = self._field(pos, end, b",")
+        if address is None:
+            return None, pos
+        length, pos = self._field(pos, end, b",")
+        if length is None:
+            return None, pos
+        if length > self.max_length:
+            return self._skip_line(pos, end)
+
+        data_end = pos + length
+        if data_end >= end:
+            return None, None
+        if self._buffer[data_end] != ord(","):
+            return self._skip_line(pos, end)  # Length field disagrees with the payload
+        data = bytes(self._buffer[pos:data_end])
+
+        rssi, pos = self._field(data_end + 1, end, b",")
+        if rssi is None:
+            return None, pos
+        line_end = self._buffer.find(b"\n", pos, end)
+        if line_end < 0:
+            return None, None
+        try:
+            snr = int(self._buffer[pos:line_end].strip())
+        except ValueError:
+            return None, line_end + 1
+
+        if self.hex_payloads:
+            try:
+                data = unhexlify(data)
+            except ValueError:  # binascii.Error
+                return None, line_end + 1
+            length = len(data)
+        elif not self.binary:
+            data = data.decode(errors="replace")
+        frame = {
+            "address": address,
+            "length": length,
+            "data": data,
+            "rssi": rssi,
+            "snr": snr,
+        }
+        return frame, line_end + 1
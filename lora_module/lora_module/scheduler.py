@@ -0,0 +1,136 @@
+########################################################################
+### Duty-cycle aware transmit scheduler                              ###
+###   Queues send_data calls, spaces them by their time on air and   ###
+###   keeps total airtime within a regulatory duty-cycle budget.     ###
+########################################################################
+
+import random
+import time
+from collections import deque
+
+from .airtime import time_on_air
+from .lora_module import LoRaError
+
+
+class TxScheduler:
+    def __init__(
+            self,
+            lora,
+            duty_cycle=0.01,
+            window=3600,
+            guard=0.05,
+            max_retries=5,
+            rf_parameters=None,
+            clock=time.monotonic
+        ):
+        """Wraps a LoRaProp (anything with send_data and get_rf_parameters).
+
+        duty_cycle: fraction of window the radio may spend transmitting
+        window: length of the sliding duty-cycle window, in seconds
+        guard: extra gap left after each frame's time on air, in seconds
+        max_retries: AT_BUSY_ERROR retries before a frame is dropped
+        rf_parameters: (sf, bw, cr, preamble); read from the module if None
+        """
+        self.lora = lora
+        self.duty_cycle = duty_cycle
+        self.window = window
+        self.guard = guard
+        self.max_retries = max_retries
+        self.clock = clock
+        self.rf_parameters = rf_parameters or lora.get_rf_parameters()
+        self.queue = deque()
+        self._history = deque()  # (sent at, seconds on air)
+        self._used = 0.0
+        self._channel_free_at = 0.0
+
+    def refresh_parameters(self):
+        """Re-reads the rf parameters after they were changed on the module."""
+        self.rf_parameters = self.lora.get_rf_parameters()
+
+    def airtime(self, data):
+        """Time on air of data at the scheduler's rf parameters."""
+        return time_on_air(len(data), *self.rf_parameters)
+
+    def budget(self):
+        """Total airtime allowed per window, in seconds."""
+        return self.duty_cycle * self.window
+
+    def _expire(self, now):
+        while self._history and self._history[0][0] <= now - self.window:
+            _, seconds = self._history.popleft()
+            self._used -= seconds
+
+    def remaining_airtime(self):
+        """Airtime (in seconds) still available in the current window."""
+        self._expire(self.clock())
+        return max(self.budget() - self._used, 0.0)
+
+    def send_data(self, rx_addr, data):
+        """Queues data for rx_addr; returns the queue depth."""
+        if self.airtime(data) > self.budget():
+            raise Exception("Frame needs more airtime than the whole duty-cycle budget")
+        self.queue.append((rx_addr, data, 0))
+        return len(self.queue)
+
+    def pending(self):
+        """Number of frames waiting to be sent."""
+        return len(self.queue)
+
+    def next_send_time(self):
+        """Clock time at which the head of the queue may be sent (None if empty)."""
+        if not self.queue:
+            return None
+        now = self.clock()
+        self._expire(now)
+        needed = self.airtime(self.queue[0][1])
+        ready = max(now, self._channel_free_at)
+
+        available = self.budget() - self._used
+        for sent_at, seconds in self._history:
+            if available >= needed:
+                break
+            available += seconds
+            ready = max(ready, sent_at + self.window)
+        return ready
+
+    def poll(self):
+        """Sends the head of the queue if the channel and budget allow it.
+
+        Returns the send_data response, or None when nothing was sent.
+        """
+        due = self.next_send_time()
+        now = self.clock()
+        if due is None or due > now:
+            return None
+
+        rx_addr, data, retries = self.queue.popleft()
+        seconds = self.airtime(data)
+        try:
+            response = self.lora.send_data(rx_addr, data)
+        except LoRaError as exc:
+            if exc.code != "AT_BUSY_ERROR" or retries >= self.max_retries:
+                raise
+            # Someone else holds the channel; back off for a few frame times
+            backoff = seconds * random.uniform(1, 2 ** (retries + 1))
+            self._channel_free_at = now + backoff
+            self.queue.appendleft((rx_addr, data, retries + 1))
+            return None
+
+        self._history.append((now, seconds))
+        self._used += seconds
+        self._channel_free_at = now + seconds + self.guard
+        return response
+
+    def flush(self, timeout=None):
+        """Blocks until the queue has drained (or timeout seconds elapsed)."""
+        deadline = None if timeout is None else self.clock() + timeout
+        while self.queue:
+            due = self.next_send_time()
+            now = self.clock()
+            if deadline is not None and now >= deadline:
+                return False
+            if due > now:
+                time.sleep((due if deadline is None else min(due, deadline)) - now)
+                continue
+            self.poll()
+        return True
@@ -0,0 +1,431 @@
+########################################################################
+### Discrete-event mesh simulator                                    ###
+###   Runs unmodified LoRAMesh nodes against emulated RYLR993s on    ###
+###   virtual serial ports and a virtual clock. Frames take their    ###
+###   time on air; a log-distance path loss topology decides who     ###
+###   hears whom, and overlapping frames collide unless one is       ###
+###   strong enough to capture the receiver.                         ###
+########################################################################
+
+import argparse
+import heapq
+import json
+import math
+import random
+import time
+from collections import deque
+
+from .adr import required_snr
+from .airtime import bandwidths
+from .emulator import Rylr993, split_commands
+from .lora_module import LoRAMesh, LoRaError
+from .mesh import sequence_length
+
+
+class VirtualClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class VirtualSerial:
+    def __init__(self, module, port):
+        """Serial-port stand-in wired straight to a Rylr993: commands are
+        answered as soon as they are written, and frames the module hears
+        wait in the input buffer like on a real port."""
+        self.module = module
+        self.port = port
+        self.baudrate = 9600
+        self.timeout = 0
+        self._commands = bytearray()
+        self._input = bytearray()
+        module.output = self._input.extend
+
+    @property
+    def in_waiting(self):
+        return len(self._input)
+
+    def write(self, data):
+        self._commands += data
+        for command in split_commands(self._commands):
+            self._input += "".join(line + "\r\n" for line in self.module.handle(command)).encode()
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self._input[:size])
+        del self._input[:size]
+        return data
+
+    def readline(self):
+        end = self._input.find(b"\n")
+        return self.read(len(self._input) if end < 0 else end + 1)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Node:
+    def __init__(self, index, x, y):
+        self.index = index
+        self.x = x
+        self.y = y
+        self.radio = None
+        self.mesh = None
+        self.wake_at = None
+        self.transmissions = deque()  # (start, end) of recent own frames
+
+
+def _percentile(ordered, point):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+
+
+class MeshSimulator:
+    # Rylr993 channel interface
+    time_scale = 1.0
+    carrier_sense = False
+
+    def __init__(
+            self,
+            sf=9,
+            bw=7,
+            cr=1,
+            preamble=12,
+            tx_power=22,
+            path_loss=40.0,
+            path_loss_exponent=2.7,
+            shadowing=0.0,
+            noise_figure=6.0,
+            capture_threshold=6.0,
+            loss=0.0,
+            seed=None,
+            **mesh_options
+        ):
+        """A network of LoRAMesh nodes on one virtual channel.
+
+        sf, bw, cr, preamble: AT+PARAMETER every node is set to
+        tx_power: dBm, as AT+CRFOP
+        path_loss, path_loss_exponent, shadowing: log-distance model, in dB
+            at 1 m, its exponent, and the standard deviation of a fixed
+            per-link random offset; positions are in metres
+        noise_figure: receiver noise figure in dB, for the SNR
+        capture_threshold: dB a frame must exceed every overlapping
+            frame by, at the receiver, to survive the collision
+        loss: extra random loss probability on every link (see set_link)
+        mesh_options: passed to every LoRAMesh (rebroadcast_jitter,
+            suppress_after, dedup_ttl...)
+        """
+        self.parameters = (sf, bw, cr, preamble)
+        self.tx_power = tx_power
+        self.path_loss = path_loss
+        self.path_loss_exponent = path_loss_exponent
+        self.shadowing = shadowing
+        self.noise_floor = -174 + 10 * math.log10(bandwidths[bw]) + noise_figure
+        self.capture_threshold = capture_threshold
+        self.loss = loss
+        self.mesh_options = mesh_options
+        self.random = random.Random(seed)
+        self.clock = VirtualClock()
+        self.nodes = []
+        self.stats = {
+            "transmissions": 0, "originated": 0, "relays": 0, "delivered": 0,
+            "collisions": 0, "half_duplex": 0, "lost": 0, "busy": 0, "airtime": 0.0,
+        }
+        self._radios = {}  # Rylr993 -> node
+        self._links = None  # node index -> {neighbour index: (rssi, snr, loss)}
+        self._overrides = {}
+        self._events = []  # (time, order, callback, args)
+        self._order = 0
+        self._recent = deque()  # Frames that may still overlap new ones
+        self._longest = 0.0
+        self._busy_until = 0.0
+        self._busy_time = 0.0  # Union of all frames' time on air
+        self._traffic_until = math.inf
+        self._messages = {}  # sequence -> (origin index, sent at, set of receivers)
+        self._latencies = []
+
+    # Topology
+
+    def add_node(self, x, y):
+        """Adds a node at (x, y) metres; returns its index."""
+        node = _Node(len(self.nodes), x, y)
+        node.radio = Rylr993(self, uid=f"{node.index:024X}", clock=self.clock)
+        self._radios[node.radio] = node
+        rng = random.Random(self.random.random())
+        node.mesh = LoRAMesh(VirtualSerial(node.radio, f"sim{node.index}"), clock=self.clock, rng=rng, **self.mesh_options)
+        node.mesh.set_parameter(*self.parameters)
+        node.mesh.set_rf_power(self.tx_power)
+        self.nodes.append(node)
+        self._links = None
+        return node.index
+
+    def random_topology(self, count, width, height=None):
+        """Adds count nodes placed uniformly over a width x height metre area."""
+        height = width if height is None else height
+        return [self.add_node(self.random.uniform(0, width), self.random.uniform(0, height)) for _ in range(count)]
+
+    def set_link(self, sender, receiver, rssi=None, snr=None, loss=None):
+        """Overrides the modelled link from sender to receiver (node indexes);
+        loss=1.0 cuts it."""
+        self._overrides[(sender, receiver)] = (rssi, snr, loss)
+        self._links = None
+
+    def link(self, sender, receiver):
+        """(rssi, snr, loss) from sender to receiver as modelled, before overrides."""
+        a, b = self.nodes[sender], self.nodes[receiver]
+        distance = max(math.hypot(a.x - b.x, a.y - b.y), 1.0)
+        rssi = self.tx_power - self.path_loss - 10 * self.path_loss_exponent * math.log10(distance)
+        return rssi, rssi - self.noise_floor, self.loss
+
+    def _build_links(self):
+        """Per sender, every receiver whose SNR clears the demodulation
+        floor, and the power its frames arrive with at every node."""
+        floor = required_snr[self.parameters[0]]
+        shadow = random.Random(self.random.random())
+        self._links = {}
+        self._power = []
+        for a in range(len(self.nodes)):
+            heard = {}
+            power = [-math.inf] * len(self.nodes)
+            for b in range(len(self.nodes)):
+                if a == b:
+                    continue
+                rssi, snr, loss = self.link(a, b)
+                if self.shadowing:
+                    offset = shadow.gauss(0, self.shadowing)
+                    rssi, snr = rssi + offset, snr + offset
+                override = self._overrides.get((a, b))
+                if override is not None:
+                    rssi = rssi if override[0] is None else override[0]
+                    snr = snr if override[1] is None else override[1]
+                    loss = loss if override[2] is None else override[2]
+                power[b] = rssi
+                if snr >= floor and loss < 1.0:
+                    heard[b] = (rssi, snr, loss)
+            self._links[a] = heard
+            self._power.append(power)
+
+    def reachable(self, origin):
+        """Indexes of the nodes a flood from origin can reach at all."""
+        if self._links is None:
+            self._build_links()
+        seen = {origin}
+        frontier = [origin]
+        while frontier:
+            node = frontier.pop()
+            for neighbour in self._links[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    frontier.append(neighbour)
+        seen.discard(origin)
+        return seen
+
+    # Event loop
+
+    def schedule(self, at, callback, *args):
+        heapq.heappush(self._events, (at, self._order, callback, args))
+        self._order += 1
+
+    def _wake(self, node, at):
+        if node.wake_at is None or at < node.wake_at:
+            node.wake_at = at
+            self.schedule(at, self._service, node, at)
+
+    def _service(self, node, at):
+        """Lets a node's LoRAMesh handle what it received and send due relays."""
+        if node.wake_at != at:
+            return  # Superseded by an earlier wake
+        node.wake_at = None
+        try:
+            frames = list(node.mesh.drain_received())
+            for frame in frames:
+                self._record(node, frame)
+                node.mesh.relay_data(frame)
+            if not frames:
+                node.mesh.service_relays()
+        except LoRaError as exc:
+            if exc.code != "AT_BUSY_ERROR":
+                raise
+            self.stats["busy"] += 1  # Still on air: the relays due now are dropped
+        due = node.mesh.rebroadcasts.next_due()
+        if due is not None:
+            self._wake(node, max(due, self.clock.now))
+
+    def _record(self, node, frame):
+        message = self._messages.get(frame["data"][:sequence_length])
+        if message is None or node.index in message[2] or node.index == message[0]:
+            return
+        message[2].add(node.index)
+        self.stats["delivered"] += 1
+        self._latencies.append(self.clock.now - message[1])
+
+    def add_traffic(self, interval, payload_size=20, nodes=None):
+        """Each node (all by default) broadcasts payload_size byte messages
+        at exponentially distributed intervals averaging interval seconds,
+        until the traffic part of run() ends."""
+        for index in (range(len(self.nodes)) if nodes is None else nodes):
+            rng = random.Random(self.random.random())
+            self.schedule(self.clock.now + rng.expovariate(1 / interval), self._originate, index, interval, payload_size, rng)
+
+    def _originate(self, index, interval, payload_size, rng):
+        if self.clock.now >= self._traffic_until:
+            return
+        node = self.nodes[index]
+        try:
+            node.mesh.send_broadcast("x" * payload_size)
+        except LoRaError as exc:
+            if exc.code != "AT_BUSY_ERROR":
+                raise
+            self.stats["busy"] += 1
+        self.schedule(self.clock.now + rng.expovariate(1 / interval), self._originate, index, interval, payload_size, rng)
+
+    # Rylr993 channel interface
+
+    def attach(self, radio):
+        pass
+
+    def detach(self, radio):
+        pass
+
+    def busy(self, band, now):
+        return False
+
+    def transmit(self, sender, dest, payload, airtime):
+        """Called by a Rylr993 on AT+SEND: puts the frame on air until now + airtime."""
+        if self._links is None:
+            self._build_links()
+        node = self._radios[sender]
+        now = self.clock.now
+        end = now + airtime
+        frame = (now, end, node.index, dest, payload)
+        self._recent.append(frame)
+        self._longest = max(self._longest, airtime)
+        node.transmissions.append((now, end))
+        self.stats["transmissions"] += 1
+        self.stats["airtime"] += airtime
+        self._busy_time += max(0.0, end - max(now, self._busy_until))
+        self._busy_until = max(self._busy_until, end)
+
+        sequence = payload[:sequence_length].decode(errors="replace")
+        if sequence not in self._messages:
+            self._messages[sequence] = (node.index, now, set())  # The origin always sends first
+            self.stats["originated"] += 1
+        else:
+            self.stats["relays"] += 1
+        self.schedule(end, self._arrive, frame)
+
+    def _overlapping(self, frame):
+        start, end = frame[0], frame[1]
+        return [other for other in self._recent if other is not frame and other[0] < end and other[1] > start]
+
+    def _arrive(self, frame):
+        """End of a frame: decides, receiver by receiver, whether it got through."""
+        start, end, sender, dest, payload = frame
+        while self._recent and self._recent[0][1] < self.clock.now - self._longest:
+            self._recent.popleft()
+        overlapping = [self._power[other[2]] for other in self._overlapping(frame)]
+        # Strongest overlapping frame at each node; too weak to decode still interferes
+        interference = list(map(max, *overlapping)) if len(overlapping) > 1 else (overlapping or [None])[0]
+        source = self.nodes[sender].radio
+        address = int(source.settings["ADDRESS"])
+        for index, (rssi, snr, loss) in self._links[sender].items():
+            receiver = self.nodes[index]
+            if not receiver.radio.hears(source, dest):
+                continue
+            while receiver.transmissions and receiver.transmissions[0][1] < start:
+                receiver.transmissions.popleft()
+            if any(s < end and e > start for s, e in receiver.transmissions):
+                self.stats["half_duplex"] += 1  # Was transmitting itself
+                continue
+            if interference and rssi - interference[index] < self.capture_threshold:
+                self.stats["collisions"] += 1
+                continue
+            if loss and self.random.random() < loss:
+                self.stats["lost"] += 1
+                continue
+            receiver.radio.receive(address, payload, round(rssi), round(snr))
+            self._wake(receiver, self.clock.now)
+
+    def run(self, duration, settle=30.0):
+        """Simulates duration seconds of traffic, then up to settle more
+        seconds for floods in flight to finish; returns report()."""
+        if self._links is None:
+            self._build_links()
+        started = time.perf_counter()
+        begin = self.clock.now
+        horizon = self.clock.now + duration + settle
+        self._traffic_until = self.clock.now + duration
+        while self._events and self._events[0][0] <= horizon:
+            at, _, callback, args = heapq.heappop(self._events)
+            self.clock.now = at
+            callback(*args)
+        self.clock.now = max(self.clock.now, horizon)
+        wall_seconds = time.perf_counter() - started
+        report = self.report()
+        report["wall_seconds"] = wall_seconds
+        report["speedup"] = (horizon - begin) / wall_seconds
+        return report
+
+    def report(self):
+        """Delivery, latency and channel use over the messages originated so far."""
+        n = len(self.nodes)
+        ratios, reachable_ratios, complete = [], [], 0
+        reachable_from = {}
+        for origin, _, receivers in self._messages.values():
+            if origin not in reachable_from:
+                reachable_from[origin] = self.reachable(origin)
+            reachable = reachable_from[origin]
+            ratios.append(len(receivers) / (n - 1) if n > 1 else 1.0)
+            reachable_ratios.append(len(receivers) / len(reachable) if reachable else 1.0)
+            complete += receivers >= reachable
+        latencies = sorted(self._latencies)
+        report = {
+            "nodes": n,
+            "messages": len(self._messages),
+            "delivery_ratio": sum(ratios) / len(ratios) if ratios else None,
+            "reachable_delivery_ratio": sum(reachable_ratios) / len(reachable_ratios) if ratios else None,
+            "complete_floods": complete / len(ratios) if ratios else None,
+            "latency": {
+                "p50": _percentile(latencies, 50),
+                "p90": _percentile(latencies, 90),
+                "p99": _percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+            },
+            "simulated_seconds": self.clock.now,
+            "utilisation": self._busy_time / self.clock.now if self.clock.now else None,
+            "suppressed": sum(node.mesh.rebroadcasts.suppressed for node in self.nodes),
+        }
+        report.update(self.stats)
+        return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate LoRAMesh flooding on a random topology')
+    parser.add_argument('--nodes', type=int, default=50, help='Number of nodes')
+    parser.add_argument('--area', type=float, default=3000, help='Side of the square area, in metres')
+    parser.add_argument('--duration', type=float, default=3600, help='Simulated seconds of traffic')
+    parser.add_argument('--interval', type=float, default=600, help='Mean seconds between messages per node')
+    parser.add_argument('--payload', type=int, default=20, help='Message size in bytes')
+    parser.add_argument('--sf', type=int, default=9, help='Spreading factor')
+    parser.add_argument('--bw', type=int, default=7, help='Bandwidth code (7 = 125kHz)')
+    parser.add_argument('--jitter', type=float, nargs=2, default=(0.1, 1.0), help='Relay slot window, in seconds')
+    parser.add_argument('--suppress-after', type=int, default=3, help='Copies heard that cancel a relay')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    args = parser.parse_args()
+
+    sim = MeshSimulator(
+        sf=args.sf,
+        bw=args.bw,
+        seed=args.seed,
+        rebroadcast_jitter=tuple(args.jitter),
+        suppress_after=args.suppress_after,
+    )
+    sim.random_topology(args.nodes, args.area)
+    sim.add_traffic(args.interval, args.payload)
+    print(json.dumps(sim.run(args.duration), indent=2))
@@ -0,0 +1,103 @@
+########################################################################
+### Stand-in upstream HTTP server                                    ###
+###   Accepts the POSTs HttpForwarder sends, records every message   ###
+###   with its arrival time, and can be told to fail or stall so     ###
+###   outages can be exercised without the real server.              ###
+########################################################################
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+
+    def do_POST(self):
+        sink = self.server.sink
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if sink.delay:
+            time.sleep(sink.delay)
+        if sink.failing:
+            self.send_response(503 if sink.failing is True else sink.failing)
+        else:
+            sink._record(json.loads(body))
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpSink:
+    def __init__(self, host="127.0.0.1", port=0, verbose=False):
+        """Serves POSTs on (host, port) from a background thread.
+
+        Both {"message": frame} and {"messages": [...]} bodies are accepted;
+        each frame is appended to .messages and (arrival time, frame) to
+        .arrivals. Set .failing to answer 503 (or to a status code to answer
+        that) and .delay to stall replies.
+        """
+        self.messages = []
+        self.arrivals = []
+        self.requests = 0
+        self.failing = False
+        self.delay = 0.0
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/message/recv"
+
+    def _record(self, body):
+        frames = body["messages"] if "messages" in body else [body.get("message")]
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            for frame in frames:
+                self.messages.append(frame)
+                self.arrivals.append((now, frame))
+                if self.verbose:
+                    print(f"Received: {frame}")
+
+    def wait_for(self, count, timeout=5):
+        """Waits until count messages have arrived; returns whether they did."""
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.messages) >= count
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stand-in upstream that prints forwarded frames')
+    parser.add_argument('--host', type=str, default='localhost', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='TCP port to listen on')
+    args = parser.parse_args()
+
+    sink = HttpSink(args.host, args.port, verbose=True)
+    print(f"Listening on {sink.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sink.close()
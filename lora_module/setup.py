@@ -11,6 +11,15 @@ setup(
         'pyserial',
         'requests',
     ],
+    entry_points={
+        'console_scripts': [
+            'lora-gateway=lora_module.gateway:main',
+        ],
+    },
+    extras_require={
+        'yaml': ['PyYAML'],
+        'numpy': ['numpy'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
@@ -0,0 +1,61 @@
+"""Test doubles shared by the test modules."""
+
+class FakeClock:
+    """A clock that only moves when a test sets or advances now."""
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class Recorder:
+    """Stands in for a radio; records what send_data was given."""
+    def __init__(self):
+        self.sent = []
+
+    def send_data(self, rx_addr, data):
+        self.sent.append((rx_addr, data))
+        return []
+
+class FakeSerial:
+    """Answers AT commands from an in-memory register file and logs them."""
+
+    def __init__(self, *args, **kwargs):
+        self.settings = {"BAND": "915000000", "PARAMETER": "9,7,1,12",
+                         "ADDRESS": "0", "NETWORKID": "18", "CPIN": "00000000",
+                         "CRFOP": "22", "OPMODE": "1",
+                         "UID": "0123456789ABCDEF01234567"}
+        self.commands = []
+        self.replies = []
+
+    @property
+    def in_waiting(self):
+        return len(self._pending_bytes())
+
+    def _pending_bytes(self):
+        return b"".join((line + "\r\n").encode() for line in self.replies)
+
+    def read(self, size=1):
+        data = self._pending_bytes()
+        self.replies = [data[size:].decode()] if data[size:] else []
+        return data[:size]
+
+    def write(self, data):
+        for command in data.decode().split("\r\n"):
+            if command:
+                self._execute(command)
+
+    def _execute(self, command):
+        self.commands.append(command)
+        if command == "ATZ":
+            self.replies += ["+RESET", "+READY"]
+            return
+        key, _, value = command[3:].partition("=")
+        if value == "?":
+            self.replies += [f"+{key}={self.settings.get(key, '')}", "OK"]
+        else:
+            self.settings[key] = value
+            self.replies.append("OK")
+
+    def readline(self):
+        return (self.replies.pop(0) + "\r\n").encode() if self.replies else b""
@@ -0,0 +1,126 @@
+import time
+import unittest
+from lora_module.adr import AdrController
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.lora_module import LoRaProp
+from helpers import FakeClock
+
+class FakeLoRa:
+    def __init__(self):
+        self.parameters = (12, 7, 1, 12)
+        self.log = []
+
+    def get_rf_parameters(self):
+        return self.parameters
+
+    def set_parameter(self, sf, bw, cr, preamble):
+        self.parameters = (sf, bw, cr, preamble)
+        self.log.append(("set", sf, bw))
+
+    def send_data(self, rx_addr, data):
+        self.log.append(("send", rx_addr, self.parameters[0]))
+        return []
+
+class TestAdrController(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.lora = FakeLoRa()
+        self.adr = AdrController(self.lora, margin=10, min_samples=3, guard=0.0, clock=self.clock)
+
+    def hear(self, address, snr, times=3):
+        for _ in range(times):
+            self.adr.on_frame({"address": address, "snr": snr, "rssi": -80})
+
+    def drain(self):
+        while self.adr.pending() or self.adr.current != self.adr.base[:2]:
+            self.adr.poll()
+            self.clock.now += 10
+
+    def test_rate_follows_snr(self):
+        self.hear(1, 9)       # 9 - 10 = -1 dB, enough for SF7
+        self.hear(2, -6)      # -16 dB: SF11 needs -17.5
+        self.hear(3, -20)     # below every floor: stay at base
+        self.hear(4, 9, times=2)  # too few samples
+        self.assertEqual(self.adr.rate_for(1), (7, 7))
+        self.assertEqual(self.adr.rate_for(2), (11, 7))
+        self.assertEqual(self.adr.rate_for(3), (12, 7))
+        self.assertEqual(self.adr.rate_for(4), (12, 7))
+        self.assertEqual(self.adr.rate_for(0), (12, 7))
+
+    def test_stale_link_falls_back(self):
+        self.hear(1, 9)
+        self.clock.now += 601
+        self.assertEqual(self.adr.rate_for(1), (12, 7))
+
+    def test_sends_are_grouped_by_rate(self):
+        self.hear(1, 9)
+        for i in range(3):
+            self.adr.send_data(1, "near")
+            self.adr.send_data(5, "far")
+        self.drain()
+        # The module is already at the base rate, so the far peer goes first
+        self.assertEqual(self.lora.log, [
+            ("send", 5, 12), ("send", 5, 12), ("send", 5, 12),
+            ("set", 7, 7), ("send", 1, 7), ("send", 1, 7), ("send", 1, 7),
+            ("set", 12, 7),
+        ])
+        self.assertEqual(self.adr.reconfigurations, 2)
+
+    def test_max_run_lets_other_rates_in(self):
+        self.adr.max_run = 2
+        self.hear(1, 9)
+        for _ in range(4):
+            self.adr.send_data(1, "near")
+        self.adr.poll()
+        self.clock.now += 10
+        self.adr.send_data(5, "far")
+        self.drain()
+        rates = [entry[2] for entry in self.lora.log if entry[0] == "send"]
+        self.assertEqual(rates, [7, 7, 12, 7, 7])
+
+    def test_airtime_paces_sends(self):
+        self.adr.send_data(5, "a")
+        self.adr.send_data(5, "b")
+        self.adr.poll()
+        self.adr.poll()
+        self.assertEqual(len([e for e in self.lora.log if e[0] == "send"]), 1)
+
+class TestAdrEmulated(unittest.TestCase):
+
+    def test_near_peer_gets_fast_rate(self):
+        channel = Channel(snr=9, time_scale=0.01)
+        modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in modules:
+            self.addCleanup(module.close)
+        gateway = LoRaProp(modules[0].port)
+        gateway.set_parameter(12, 7, 1, 12)
+        gateway.set_address(100)
+        node = LoRaProp(modules[1].port)
+        node.set_parameter(12, 7, 1, 12)
+        node.set_address(101)
+        adr = AdrController(gateway, guard=0.0)
+        gateway.add_hook(adr)
+
+        for i in range(3):
+            node.send_data(100, f"report {i}")
+            time.sleep(0.05)
+        deadline = time.monotonic() + 2
+        while adr.links.get(101, [0, 0, 0])[2] < 3 and time.monotonic() < deadline:
+            gateway.get_received_data()
+            time.sleep(0.01)
+        self.assertEqual(adr.rate_for(101), (7, 7))
+
+        node.set_parameter(7, 7, 1, 12)  # The node is provisioned for the fast class
+        adr.send_data(101, "ack")
+        adr.flush(timeout=5)
+        deadline = time.monotonic() + 2
+        frame = None
+        while frame is None and time.monotonic() < deadline:
+            frame = node.get_received_data()
+            time.sleep(0.01)
+        self.assertEqual(frame["data"], "ack")
+        self.assertEqual(gateway.get_rf_parameters(), (12, 7, 1, 12))
+
+if __name__ == '__main__':
+    unittest.main()
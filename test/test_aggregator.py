@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+from lora_module.aggregator import Aggregator
+from lora_module.framing import pack_messages, unpack_messages
+from lora_module.lora_module import LoRaProp
+from helpers import FakeClock, FakeSerial, Recorder
+
+class TestAggregator(unittest.TestCase):
+
+    def test_round_trip(self):
+        messages = ["a", "", "hello, world", "x" * 200]
+        self.assertEqual(unpack_messages(pack_messages(messages)), messages)
+        self.assertEqual(unpack_messages("plain text"), ["plain text"])
+
+    def test_messages_share_a_frame_until_linger(self):
+        clock = FakeClock()
+        radio = Recorder()
+        tx = Aggregator(radio, linger=0.1, clock=clock)
+        tx.send_data(101, "t=21.5")
+        tx.send_data(101, "h=40")
+        tx.send_data(102, "solo")
+        tx.poll()
+        self.assertEqual(radio.sent, [])
+        clock.now += 0.1
+        tx.poll()
+        self.assertEqual(radio.sent, [(101, pack_messages(["t=21.5", "h=40"])), (102, "solo")])
+
+    def test_full_frame_is_sent_immediately(self):
+        radio = Recorder()
+        tx = Aggregator(radio, max_payload=20, clock=FakeClock())
+        tx.send_data(101, "x" * 10)
+        tx.send_data(101, "y" * 10)
+        self.assertEqual(radio.sent, [(101, "x" * 10)])
+        self.assertEqual(tx.pending(), 1)
+
+    def test_bytes_are_rejected(self):
+        radio = Recorder()
+        tx = Aggregator(radio, clock=FakeClock())
+        with self.assertRaises(Exception):
+            tx.send_data(101, b"\x01\x02")
+        self.assertEqual(tx.pending(), 0)
+        self.assertEqual(radio.sent, [])
+
+    def test_receiver_splits_aggregates(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null")
+        frame = pack_messages(["one", "two"])
+        lora.ser.replies.append(f"+RCV=7,{len(frame)},{frame},-50,8")
+        self.assertEqual(lora.get_received_data()["data"], "one")
+        self.assertEqual(lora.get_received_data()["data"], "two")
+        self.assertIsNone(lora.get_received_data())
+
+if __name__ == '__main__':
+    unittest.main()
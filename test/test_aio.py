@@ -0,0 +1,68 @@
+import asyncio
+import os
+import pty
+import tty
+import unittest
+from lora_module.aio import AsyncLoRaModule
+
+class TestAsyncLoRaModule(unittest.TestCase):
+
+    def setUp(self):
+        # A pty pair stands in for the module: we write replies to the master side
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self.slave = slave
+
+    def tearDown(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _read_command(self):
+        return os.read(self.master, 1024).decode()
+
+    def test_rcv_during_command_is_not_swallowed(self):
+        async def scenario():
+            async with AsyncLoRaModule(self.port, timeout=2) as lora:
+                loop = asyncio.get_running_loop()
+                command = loop.run_in_executor(None, self._read_command)
+                reply = asyncio.ensure_future(lora.get_band())
+                self.assertEqual(await command, "AT+BAND=?\r\n")
+                os.write(self.master, b"+BAND=915000000\r\n+RCV=7,5,hello,-40,9\r\nOK\r\n")
+                self.assertEqual(await reply, ["+BAND=915000000"])
+                frame = await asyncio.wait_for(lora.__anext__(), 2)
+                self.assertEqual(frame["address"], 7)
+                self.assertEqual(frame["data"], "hello")
+
+        asyncio.run(scenario())
+
+    def test_error_reply_raises(self):
+        async def scenario():
+            async with AsyncLoRaModule(self.port, timeout=2) as lora:
+                loop = asyncio.get_running_loop()
+                command = loop.run_in_executor(None, self._read_command)
+                reply = asyncio.ensure_future(lora.set_address(70000))
+                await command
+                os.write(self.master, b"AT_PARAM_ERROR\r\n")
+                with self.assertRaises(Exception):
+                    await reply
+
+        asyncio.run(scenario())
+
+    def test_bad_lines_do_not_stop_the_reader(self):
+        async def scenario():
+            async with AsyncLoRaModule(self.port, timeout=2) as lora:
+                os.write(self.master, b"\xff\xfe noise\r\n+RCV=7,nope\r\n+RCV=7,2,ok,-40,9\r\n")
+                frame = await asyncio.wait_for(lora.__anext__(), 2)
+                self.assertEqual(frame["data"], "ok")
+                loop = asyncio.get_running_loop()
+                command = loop.run_in_executor(None, self._read_command)
+                reply = asyncio.ensure_future(lora.get_band())
+                await command
+                os.write(self.master, b"+BAND=915000000\r\nOK\r\n")
+                self.assertEqual(await reply, ["+BAND=915000000"])
+
+        asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
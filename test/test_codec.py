@@ -0,0 +1,71 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from lora_module.codec import SchemaRegistry
+from lora_module.journal import JournalReader, JournalWriter
+
+has_numpy = importlib.util.find_spec("numpy") is not None
+
+def frame(data):
+    return {"address": 7, "length": len(data), "data": data, "rssi": -60, "snr": 9}
+
+class TestSchemaRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = SchemaRegistry()
+        self.registry.register(1, "climate", [("temp", "h", 10), ("hum", "B"), ("pressure", "H")])
+        self.registry.register(2, "door", [("open", "?"), ("count", "I")])
+
+    def test_round_trip(self):
+        payload = self.registry.encode("climate", temp=21.5, hum=40, pressure=1013)
+        self.assertEqual(payload, b"\x01\xd7\x00\x28\xf5\x03")
+        self.assertEqual(len(payload), 6)  # "t=21.5,h=40,p=1013" is 18
+        self.assertEqual(self.registry.decode(payload), ("climate", {"temp": 21.5, "hum": 40, "pressure": 1013}))
+        self.assertEqual(self.registry.decode(frame(self.registry.encode("door", {"open": True}, count=3))),
+                         ("door", {"open": True, "count": 3}))
+
+    def test_unknown_payloads(self):
+        self.assertIsNone(self.registry.identify(b"\x09abc"))
+        self.assertIsNone(self.registry.identify(b"\x01abc"))  # Right tag, wrong size
+        self.assertIsNone(self.registry.identify(b""))
+        with self.assertRaises(Exception):
+            self.registry.decode("hello")
+        with self.assertRaises(Exception):
+            self.registry.register(1, "other", [("x", "B")])
+
+    def test_columns_from_journal(self):
+        path = os.path.join(tempfile.mkdtemp(), "rx.journal")
+        with JournalWriter(path) as journal:
+            for i in range(100):
+                journal.append(frame(self.registry.encode("climate", temp=i / 10, hum=i, pressure=1000 + i)))
+                journal.append(frame(self.registry.encode("door", open=i % 2, count=i)))
+                journal.append(frame("plain text"))
+        with JournalReader(path, binary=True) as reader:
+            columns = self.registry.decode_columns(reader, "climate")
+        self.assertEqual(columns["hum"], list(range(100)))
+        self.assertEqual(columns["temp"][:3], [0.0, 0.1, 0.2])
+        self.assertEqual(self.registry.decode_columns([], "door"), {"open": [], "count": []})
+
+    @unittest.skipUnless(has_numpy, "numpy is not installed")
+    def test_batch_decode(self):
+        payloads = [self.registry.encode("climate", temp=-i / 10, hum=i, pressure=900 + i) for i in range(1000)]
+        payloads.insert(10, self.registry.encode("door", open=True, count=1))
+        arrays = self.registry.decode_batch(payloads, "climate")
+        self.assertEqual(len(arrays["hum"]), 1000)
+        self.assertEqual(int(arrays["pressure"].sum()), sum(900 + i for i in range(1000)))
+        self.assertAlmostEqual(float(arrays["temp"][5]), -0.5)
+
+    def test_batch_decode_without_numpy(self):
+        payloads = [self.registry.encode("climate", temp=-i / 10, hum=i, pressure=900 + i) for i in range(100)]
+        payloads.insert(10, self.registry.encode("door", open=True, count=1))
+        with mock.patch.dict(sys.modules, {"numpy": None}):  # import numpy raises ImportError
+            columns = self.registry.decode_batch(payloads, "climate")
+        self.assertEqual(columns, self.registry.decode_columns(payloads, "climate"))
+        self.assertEqual(len(columns["hum"]), 100)
+        self.assertAlmostEqual(columns["temp"][5], -0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import random
+import time
+import unittest
+from lora_module.compression import Compressor, train_dictionary
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.lora_module import LoRaProp
+
+def telemetry(rng):
+    reading = {"node": f"n{rng.randrange(20):02d}", "t": round(rng.uniform(15, 30), 1), "h": rng.randrange(30, 70),
+               "st": rng.choice(["ok", "low"])}
+    return json.dumps(reading, separators=(",", ":"))
+
+class FakeRadio:
+    def __init__(self):
+        self.sent = []
+
+    def send_bytes(self, rx_addr, buf):
+        self.sent.append(bytes(buf))
+
+class TestCompressor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(1)
+        cls.zdict = train_dictionary([telemetry(rng) for _ in range(300)], size=512)
+        cls.samples = [telemetry(rng) for _ in range(200)]
+
+    def setUp(self):
+        self.radio = FakeRadio()
+        self.compressor = Compressor(self.radio, self.zdict)
+
+    def test_round_trip_and_ratio(self):
+        for sample in self.samples:
+            self.compressor.send_data(1, sample)
+            self.assertEqual(self.compressor.decompress(self.radio.sent[-1]), sample.encode())
+        self.assertEqual(self.compressor.stats["compressed"], len(self.samples))
+        self.assertLess(self.compressor.ratio(), 0.6)
+
+    def test_incompressible_frames_go_as_they_are(self):
+        self.compressor.send_data(1, b"\x00\x01")
+        self.compressor.send_data(1, b"\x1a\x00")  # Starts with the flag: stored, not mistaken
+        self.assertEqual(self.radio.sent[0], b"\x00\x01")
+        self.assertEqual(self.radio.sent[1], b"\x1a\xff\x1a\x00")
+        self.assertEqual(self.compressor.decompress(self.radio.sent[1]), b"\x1a\x00")
+        self.assertEqual(self.compressor.stats["compressed"], 0)
+
+    def test_dictionary_rollover(self):
+        old = Compressor(self.radio, {3: self.zdict})
+        new = Compressor(FakeRadio(), {3: self.zdict, 4: self.zdict[::-1]})
+        self.assertEqual(new.current, 4)
+        old.send_data(1, self.samples[0])
+        self.assertEqual(new.decompress(self.radio.sent[-1]), self.samples[0].encode())
+        with self.assertRaises(Exception):
+            old.decompress(b"\x1a\x04abc")
+
+class TestCompressorEmulated(unittest.TestCase):
+
+    def test_mixed_senders(self):
+        channel = Channel(time_scale=0.001)
+        modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in modules:
+            self.addCleanup(module.close)
+        tx, rx = (LoRaProp(m.port, binary=True) for m in modules)
+        zdict = train_dictionary([telemetry(random.Random(i)) for i in range(100)])
+        sender = Compressor(tx, zdict)
+        receiver = Compressor(rx, zdict, text=True)
+
+        message = telemetry(random.Random(500))
+        sender.send_data(0, message)
+        time.sleep(0.05)  # Lets each frame clear the air
+        tx.send_data(0, "plain")  # An uncompressed sender on the same channel
+        time.sleep(0.05)
+        tx.send_bytes(0, b"\x1a\x00garbage")  # Flagged, but not valid deflate data
+
+        frames = []
+        deadline = time.monotonic() + 2
+        while len(frames) < 3 and time.monotonic() < deadline:
+            frames += list(receiver.drain_received())
+            time.sleep(0.005)
+        self.assertEqual([f["data"] for f in frames[:2]], [message, "plain"])
+        self.assertEqual(frames[0]["length"], len(message))
+        self.assertEqual(frames[2]["data"], "\x1a\x00garbage")  # Passed on as received
+        self.assertEqual(receiver.stats["errors"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import time
+import unittest
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.lora_module import LoRAMesh, LoRaError, LoRaProp
+
+def wait_for_frame(lora, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        frame = lora.get_received_data()
+        if frame:
+            return frame
+        time.sleep(0.01)
+    return None
+
+class TestEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = Channel(rssi=-42, snr=10, time_scale=0.01)
+        self.a = EmulatedModule(self.channel)
+        self.b = EmulatedModule(self.channel)
+        self.addCleanup(self.a.close)
+        self.addCleanup(self.b.close)
+
+    def test_state_and_delivery(self):
+        tx = LoRaProp(self.a.port)
+        rx = LoRaProp(self.b.port)
+        tx.set_address(100)
+        rx.set_address(101)
+        self.assertEqual(rx.get_address(), ["+ADDRESS=101"])
+        tx.send_data(101, "hello world")
+        frame = wait_for_frame(rx)
+        self.assertEqual(frame, {"address": 100, "length": 11, "data": "hello world", "rssi": -42, "snr": 10})
+
+    def test_other_addresses_and_networks_are_filtered(self):
+        tx = LoRaProp(self.a.port)
+        rx = LoRaProp(self.b.port)
+        rx.set_address(101)
+        tx.send_data(102, "not for you")
+        rx.set_network_id(5)
+        time.sleep(0.1)
+        tx.send_data(101, "other network")
+        self.assertIsNone(wait_for_frame(rx, timeout=0.2))
+
+    def test_busy_while_transmitting(self):
+        self.channel.time_scale = 1.0
+        tx = LoRaProp(self.a.port)
+        tx.set_parameter(12, 7, 4, 12)
+        tx.send_data(0, "x" * 50)
+        with self.assertRaises(LoRaError) as raised:
+            tx.send_data(0, "y")
+        self.assertEqual(raised.exception.code, "AT_BUSY_ERROR")
+
+    def test_loss(self):
+        self.channel.loss = 1.0
+        tx = LoRaProp(self.a.port)
+        rx = LoRaProp(self.b.port)
+        tx.send_data(0, "lost")
+        self.assertIsNone(wait_for_frame(rx, timeout=0.2))
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.module = EmulatedModule(Channel(time_scale=0.01))
+        self.addCleanup(self.module.close)
+        self.commands = []
+        handle = self.module.module.handle
+        self.module.module.handle = lambda command: self.commands.append(command) or handle(command)
+
+    def test_fast_start_resets_only_on_mode_change(self):
+        LoRaProp(self.module.port, fast_start=True).ser.close()
+        self.assertEqual(self.commands, [b"AT+OPMODE=?", b"AT+OPMODE=1", b"ATZ"])
+        del self.commands[:]
+        LoRaProp(self.module.port, fast_start=True).ser.close()
+        self.assertEqual(self.commands, [b"AT+OPMODE=?"])
+
+    def test_default_start_always_resets(self):
+        LoRaProp(self.module.port).ser.close()
+        LoRaProp(self.module.port).ser.close()
+        self.assertEqual(self.commands.count(b"ATZ"), 2)
+
+    def test_mesh_resets_once(self):
+        LoRAMesh(self.module.port).ser.close()
+        self.assertEqual(self.commands.count(b"ATZ"), 1)
+
+    def test_lazy_open(self):
+        lora = LoRaProp(self.module.port, lazy=True, fast_start=True)
+        self.assertIsNone(lora._ser)
+        self.assertEqual(self.commands, [])
+        self.assertEqual(lora.get_address(), ["+ADDRESS=0"])
+        self.assertEqual(self.commands[-1], b"AT+ADDRESS=?")
+
+class TestBaudRate(unittest.TestCase):
+
+    def setUp(self):
+        self.module = EmulatedModule(Channel(time_scale=0.01), baudrate=115200)
+        self.addCleanup(self.module.close)
+
+    def test_wrong_rate_times_out(self):
+        with self.assertRaises(LoRaError) as ctx:
+            LoRaProp(self.module.port, baudrate=9600, command_timeout=0.3)
+        self.assertEqual(ctx.exception.code, "TIMEOUT")
+
+    def test_auto_detects_rate(self):
+        lora = LoRaProp(self.module.port, baudrate="auto")
+        self.assertEqual(lora.ser.baudrate, 115200)
+        self.assertEqual(lora.get_uart_rate(), ["+IPR=115200"])
+
+    def test_switch_rate(self):
+        self.module.module.uart_rate = 9600
+        lora = LoRaProp(self.module.port)
+        lora.set_uart_rate(57600)
+        self.assertEqual(lora.ser.baudrate, 57600)
+        self.assertEqual(lora.get_address(), ["+ADDRESS=0"])
+
+    def test_fast_uart(self):
+        self.module.module.uart_rate = 9600
+        lora = LoRaProp(self.module.port, baudrate="auto", fast_uart=True)
+        self.assertEqual(lora.ser.baudrate, 115200)
+        self.assertEqual(self.module.module.uart_rate, 115200)
+
+if __name__ == '__main__':
+    unittest.main()
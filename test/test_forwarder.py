@@ -0,0 +1,98 @@
+import os
+import tempfile
+import time
+import unittest
+from lora_module.forwarder import HttpForwarder
+from lora_module.sink import HttpSink
+
+class TestHttpForwarder(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = HttpSink()
+        self.addCleanup(self.sink.close)
+        self.spool = os.path.join(tempfile.mkdtemp(), "spool.jsonl")
+
+    def _forwarder(self, **kwargs):
+        forwarder = HttpForwarder(self.sink.url, spool_path=self.spool, **kwargs).start()
+        self.addCleanup(forwarder.stop)
+        return forwarder
+
+    def test_frames_are_batched(self):
+        forwarder = self._forwarder(batch_size=5, linger=1.0)
+        for i in range(10):
+            forwarder.submit({"data": str(i)})
+        self.assertTrue(self.sink.wait_for(10))
+        self.assertEqual([m["data"] for m in self.sink.messages], [str(i) for i in range(10)])
+        self.assertEqual(self.sink.requests, 2)
+
+    def test_linger_sends_partial_batch(self):
+        forwarder = self._forwarder(batch_size=50, linger=0.05)
+        forwarder.submit({"data": "lonely"})
+        self.assertTrue(self.sink.wait_for(1, timeout=2))
+        self.assertEqual(self.sink.messages, [{"data": "lonely"}])
+
+    def test_submit_does_not_block_on_slow_upstream(self):
+        self.sink.delay = 0.5
+        forwarder = self._forwarder(batch_size=1, linger=0.0)
+        self.addCleanup(setattr, self.sink, "delay", 0.0)
+        started = time.monotonic()
+        for i in range(20):
+            forwarder.submit({"data": str(i)})
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_outage_spills_and_replays(self):
+        self.sink.failing = True
+        forwarder = self._forwarder(batch_size=2, linger=0.0, max_retries=1, backoff=0.01)
+        for i in range(4):
+            forwarder.submit({"data": str(i)})
+        deadline = time.monotonic() + 3
+        while forwarder.stats["spilled"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(forwarder.stats["spilled"], 4)
+        self.assertEqual(self.sink.messages, [])
+
+        self.sink.failing = False
+        self.assertTrue(self.sink.wait_for(4, timeout=3))
+        deadline = time.monotonic() + 3
+        # The replay file is removed just after the counter is bumped
+        while ((forwarder.stats["replayed"] < 4 or os.path.exists(self.spool + ".replay"))
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(sorted(m["data"] for m in self.sink.messages), ["0", "1", "2", "3"])
+        self.assertEqual(forwarder.stats["replayed"], 4)
+        self.assertFalse(os.path.exists(self.spool + ".replay"))
+
+    def test_client_errors_are_rejected_not_posted(self):
+        self.sink.failing = 400
+        forwarder = self._forwarder(batch_size=1, linger=0.0, max_retries=2, backoff=0.01)
+        forwarder.submit({"data": "bad"})
+        deadline = time.monotonic() + 3
+        while forwarder.stats["rejected"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(forwarder.stats["rejected"], 1)
+        self.assertEqual(forwarder.stats["posted"], 0)
+        self.assertEqual(forwarder.stats["retries"], 0)
+        with open(self.spool + ".rejected") as f:
+            self.assertIn('"bad"', f.read())
+
+    def test_crash_leftovers_are_recovered(self):
+        with open(self.spool, "w") as f:
+            f.write('{"data": "spooled"}\n{"data": "to')  # Torn by the crash
+        with open(self.spool + ".replay", "w") as f:
+            f.write('{"data": "replaying"}\n')
+        forwarder = self._forwarder(batch_size=10, linger=0.0)
+        self.assertTrue(self.sink.wait_for(2, timeout=3))
+        deadline = time.monotonic() + 3
+        while forwarder.stats["replayed"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(m["data"] for m in self.sink.messages), ["replaying", "spooled"])
+        self.assertEqual(forwarder.stats["corrupt"], 1)
+
+    def test_stop_flushes_queue(self):
+        forwarder = HttpForwarder(self.sink.url, batch_size=100, linger=10).start()
+        forwarder.submit({"data": "last"})
+        forwarder.stop()
+        self.assertEqual(self.sink.messages, [{"data": "last"}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest import mock
+from lora_module.fragments import Fragmenter, Reassembler
+from lora_module.framing import pack_nack, parse_nack
+from lora_module.lora_module import LoRaProp
+from helpers import FakeClock, FakeSerial, Recorder
+
+def frames_for(sent, address=7):
+    return [{"address": address, "length": len(d), "data": d, "rssi": -60, "snr": 7} for _, d in sent]
+
+class TestFragments(unittest.TestCase):
+
+    def test_reassembles_out_of_order(self):
+        radio = Recorder()
+        data = "".join(str(i % 10) for i in range(1000))
+        Fragmenter(radio).send_data(101, data)
+        frames = frames_for(radio.sent)
+        self.assertEqual(len(frames), 5)
+        self.assertTrue(all(len(f["data"]) <= 240 for f in frames))
+        rx = Reassembler()
+        results = [rx.add(f) for f in reversed(frames)]
+        self.assertEqual(results[-1]["data"], data)
+        self.assertEqual(results[:-1], [None] * 4)
+        self.assertIsNone(rx.add(frames[0]))  # Late duplicate
+
+    def test_bytes_are_rejected(self):
+        radio = Recorder()
+        with self.assertRaises(Exception):
+            Fragmenter(radio).send_data(101, b"\x00" * 500)
+        self.assertEqual(radio.sent, [])
+
+    def test_missing_fragments_are_reported_and_resent(self):
+        clock = FakeClock()
+        radio = Recorder()
+        tx = Fragmenter(radio)
+        msg_id = tx.send_data(101, "x" * 600)
+        frames = frames_for(radio.sent)
+        rx = Reassembler(nack_after=1, clock=clock)
+        rx.add(frames[0])
+        rx.add(frames[2])
+        self.assertEqual(rx.poll(), [])
+        clock.now += 1
+        stalled = rx.poll()
+        self.assertEqual(stalled, [(7, msg_id, [1])])
+        self.assertEqual(parse_nack(pack_nack(msg_id, [1])), (msg_id, [1]))
+        radio.sent.clear()
+        self.assertEqual(tx.resend(101, msg_id, [1]), 1)
+        self.assertEqual(rx.add(frames_for(radio.sent)[0])["data"], "x" * 600)
+
+    def test_memory_is_bounded(self):
+        rx = Reassembler(max_messages=2)
+        ids = []
+        for sender in range(3):
+            radio = Recorder()
+            ids.append(Fragmenter(radio).send_data(101, "y" * 300))
+            rx.add(frames_for(radio.sent, address=sender)[0])
+        self.assertEqual(len(rx.pending()), 2)
+        self.assertEqual(rx.evicted, [(0, ids[0], [1])])
+
+    def test_restarted_sender_is_not_taken_for_duplicates(self):
+        clock = FakeClock()
+        rx = Reassembler(timeout=30, clock=clock)
+        for run in range(2):
+            radio = Recorder()
+            tx = Fragmenter(radio)
+            tx._next_id = 0  # The worst case: the restart reuses the same ids
+            tx.send_data(101, "a" * 300)
+            results = [rx.add(f) for f in frames_for(radio.sent)]
+            self.assertEqual(results[-1]["data"], "a" * 300)
+            self.assertIsNone(rx.add(frames_for(radio.sent)[0]))  # A real late duplicate
+            clock.now += 31
+
+    def test_lora_prop_reassembles(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null")
+        radio = Recorder()
+        Fragmenter(radio).send_data(101, "z" * 500)
+        for _, frame in radio.sent:
+            lora.ser.replies.append(f"+RCV=7,{len(frame)},{frame},-50,8")
+        # All three fragments are read in one pass
+        self.assertEqual(lora.get_received_data()["data"], "z" * 500)
+        self.assertIsNone(lora.get_received_data())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.gateway import Gateway
+from lora_module.lora_module import LoRaError, LoRaProp
+from lora_module.metrics import Metrics
+
+class TestGateway(unittest.TestCase):
+
+    def setUp(self):
+        channel = Channel(time_scale=0.01)
+        self.modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in self.modules:
+            self.addCleanup(module.close)
+        self.lora = LoRaProp(self.modules[0].port)
+        self.lora.set_address(100)
+        self.peer = LoRaProp(self.modules[1].port)
+        self.peer.set_address(101)
+
+    def _start(self, gateway):
+        self.addCleanup(gateway.close)
+        thread = threading.Thread(target=gateway.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(gateway.stop)
+        return gateway
+
+    def _collect(self, lora, count, timeout=3):
+        frames = []
+        deadline = time.monotonic() + timeout
+        while len(frames) < count and time.monotonic() < deadline:
+            frames += list(lora.drain_received())
+            time.sleep(0.01)
+        return frames
+
+    def test_persistent_client_lines_are_sent(self):
+        gateway = self._start(Gateway(self.lora, "127.0.0.1", 0, linger=0.0))
+        with socket.create_connection(gateway.address) as client:
+            client.sendall(b"first\nsec")
+            client.sendall(b"ond\n")
+            frames = self._collect(self.peer, 2)
+        self.assertEqual([f["data"] for f in frames], ["first", "second"])
+
+    def test_received_frames_are_forwarded(self):
+        gateway = Gateway(self.lora, "127.0.0.1", 0)
+        forwarded = []
+        gateway.forward = forwarded.append
+        self._start(gateway)
+        self.peer.send_data(100, "up")
+        deadline = time.monotonic() + 3
+        while not forwarded and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(forwarded[0]["data"], "up")
+
+    def test_full_queue_pauses_clients(self):
+        gateway = Gateway(self.lora, "127.0.0.1", 0, tx_queue_size=2)
+        self.addCleanup(gateway.close)
+        gateway._service_tx = lambda: None  # Let the queue fill up
+        with socket.create_connection(gateway.address) as client:
+            client.sendall(b"a\nb\nc\nd\n")
+            deadline = time.monotonic() + 2
+            while not gateway.paused and time.monotonic() < deadline:
+                gateway.run_once(0.05)
+            self.assertEqual(list(gateway.tx_queue), ["a", "b"])
+            self.assertEqual(len(gateway.paused), 1)
+
+    def test_bad_clients_cannot_stop_the_gateway(self):
+        gateway = self._start(Gateway(self.lora, "127.0.0.1", 0, linger=0.0, max_buffer=1000))
+        with socket.create_connection(gateway.address) as client:
+            client.settimeout(3)
+            client.sendall(b"x" * 300 + b"\nafter\n")  # One frame cannot carry 300 bytes
+            self.assertTrue(client.recv(100).startswith(b"ERROR"))
+            self.assertEqual([f["data"] for f in self._collect(self.peer, 1)], ["after"])
+        with socket.create_connection(gateway.address) as client:
+            client.settimeout(3)
+            client.sendall(b"y" * 2000)  # Never sends a newline
+            self.assertTrue(client.recv(100).startswith(b"ERROR"))
+            self.assertEqual(client.recv(100), b"")  # Disconnected
+        with socket.create_connection(gateway.address) as client:
+            client.sendall(b"still up\n")
+            self.assertEqual([f["data"] for f in self._collect(self.peer, 1)], ["still up"])
+
+    def test_radio_errors_drop_the_message_only(self):
+        gateway = Gateway(self.lora, "127.0.0.1", 0, linger=0.0)
+        self.addCleanup(gateway.close)
+        gateway.tx_queue.append("one")
+        with mock.patch.object(self.lora, "send_data", side_effect=LoRaError("AT_PARAM_ERROR", "bad")):
+            with self.assertLogs("lora_module.gateway", "WARNING"):
+                for _ in range(3):
+                    gateway.run_once(0)
+        gateway.tx_queue.append("two")
+        for _ in range(3):
+            gateway.run_once(0)
+        self.assertEqual([f["data"] for f in self._collect(self.peer, 1)], ["two"])
+
+    def test_slow_radio_pauses_clients(self):
+        channel = Channel(time_scale=1.0)  # Real airtime: about 0.2 s a frame
+        slow = EmulatedModule(channel)
+        self.addCleanup(slow.close)
+        lora = LoRaProp(slow.port)
+        gateway = self._start(Gateway(lora, "127.0.0.1", 0, tx_queue_size=4, linger=0.0))
+        with socket.create_connection(gateway.address) as client:
+            client.sendall(b"".join(b"message %d\n" % i for i in range(300)))
+            time.sleep(1.5)
+            self.assertLessEqual(gateway.scheduler.pending() + gateway.tx.pending(), 4)
+            self.assertLessEqual(len(gateway.tx_queue), 4)
+            self.assertEqual(len(gateway.paused), 1)
+
+    def test_metrics(self):
+        metrics = Metrics()
+        gateway = Gateway(self.lora, "127.0.0.1", 0, tx_queue_size=2, metrics=metrics)
+        self.addCleanup(gateway.close)
+        gateway._service_tx = lambda: None
+        with socket.create_connection(gateway.address) as client:
+            client.sendall(b"a\nb\nc\n")
+            deadline = time.monotonic() + 2
+            while not gateway.paused and time.monotonic() < deadline:
+                gateway.run_once(0.05)
+            text = metrics.render()
+        self.assertIn('lora_gateway_queue_depth{stage="clients"} 2\n', text)
+        self.assertIn('lora_gateway_clients{state="paused"} 1\n', text)
+        self.lora.get_address()
+        self.assertEqual(metrics.value("lora_commands_total", command="ADDRESS", status="OK"), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.journal import JournalReader, JournalWriter, index_path
+from lora_module.lora_module import LoRaProp
+
+def frame(address, data, rssi=-60, snr=9):
+    return {"address": address, "length": len(data), "data": data, "rssi": rssi, "snr": snr}
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "rx.journal")
+
+    def _write(self, frames, **kwargs):
+        with JournalWriter(self.path, **kwargs) as journal:
+            for stamp, f in frames:
+                journal.append(f, timestamp=stamp)
+
+    def test_replay(self):
+        self._write([(100.0, frame(1, "a,b")), (101.0, frame(2, "ü", rssi=-101, snr=-7))])
+        with JournalReader(self.path) as reader:
+            records = list(reader)
+        self.assertEqual(records[0], dict(frame(1, "a,b"), time=100.0))
+        self.assertEqual(records[1], {"time": 101.0, "address": 2, "length": 2, "data": "ü", "rssi": -101, "snr": -7})
+
+    def test_queries(self):
+        self._write([(100.0 + i, frame(i % 3, str(i))) for i in range(30)])
+        with JournalReader(self.path) as reader:
+            self.assertEqual(len(reader), 30)
+            self.assertEqual([r["data"] for r in reader.between(110, 113)], ["10", "11", "12"])
+            self.assertEqual([r["data"] for r in reader.between(start=127)], ["27", "28", "29"])
+            self.assertEqual([r["data"] for r in reader.from_address(2, end=110)], ["2", "5", "8"])
+            self.assertEqual([r["data"] for r in reader.from_address(1, start=125)], ["25", "28"])
+            self.assertEqual(list(reader.from_address(7)), [])
+
+    def test_appends_across_sessions(self):
+        self._write([(1.0, frame(1, "first"))])
+        self._write([(2.0, frame(1, "second"))])
+        with JournalReader(self.path) as reader:
+            self.assertEqual([r["data"] for r in reader], ["first", "second"])
+
+    def test_torn_tail_is_recovered(self):
+        self._write([(float(i), frame(1, f"frame {i}")) for i in range(5)])
+        size = os.path.getsize(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(size - 3)  # Last record only half written
+        with open(index_path(self.path), "r+b") as f:
+            f.truncate(2 * 18)  # Index lost the last three entries
+        self._write([(9.0, frame(1, "after"))])
+        with JournalReader(self.path) as reader:
+            self.assertEqual([r["data"] for r in reader], ["frame 0", "frame 1", "frame 2", "frame 3", "after"])
+
+    def test_empty(self):
+        JournalWriter(self.path).close()
+        with JournalReader(self.path) as reader:
+            self.assertEqual(list(reader), [])
+
+    def test_hook_journals_received_frames(self):
+        channel = Channel(time_scale=0.01)
+        modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in modules:
+            self.addCleanup(module.close)
+        tx = LoRaProp(modules[0].port)
+        tx.set_address(100)
+        rx = LoRaProp(modules[1].port)
+        journal = JournalWriter(self.path)
+        rx.add_hook(journal)
+        tx.send_data(0, "logged")
+        deadline = time.monotonic() + 2
+        while not rx.get_received_data() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        journal.close()
+        with JournalReader(self.path) as reader:
+            self.assertEqual([(r["address"], r["data"]) for r in reader], [(100, "logged")])
+
+if __name__ == '__main__':
+    unittest.main()
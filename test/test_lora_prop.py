@@ -0,0 +1,68 @@
+import unittest
+from unittest import mock
+from lora_module.lora_module import LoRaProp
+from helpers import FakeSerial
+
+class TestLoRaPropCache(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("lora_module.lora_module.serial.Serial", FakeSerial)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_getters_answer_from_shadow(self):
+        lora = LoRaProp("/dev/null", cached=True)
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])
+        self.assertEqual(lora.ser.commands.count("AT+BAND=?"), 1)
+
+    def test_redundant_setters_are_dropped(self):
+        lora = LoRaProp("/dev/null", cached=True)
+        lora.set_address(101)
+        lora.set_address(101)
+        self.assertEqual(lora.ser.commands.count("AT+ADDRESS=101"), 1)
+        self.assertEqual(lora.get_address(), ["+ADDRESS=101"])
+        self.assertNotIn("AT+ADDRESS=?", lora.ser.commands)
+
+    def test_reset_invalidates_shadow(self):
+        lora = LoRaProp("/dev/null", cached=True)
+        lora.set_tx_power(14)
+        lora.reset()
+        lora.set_tx_power(14)
+        self.assertEqual(lora.ser.commands.count("AT+CRFOP=14"), 2)
+
+    def test_uncached_always_round_trips(self):
+        lora = LoRaProp("/dev/null")
+        lora.get_band()
+        lora.get_band()
+        self.assertEqual(lora.ser.commands.count("AT+BAND=?"), 2)
+
+class TestApplyConfig(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("lora_module.lora_module.serial.Serial", FakeSerial)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_differences_are_sent(self):
+        lora = LoRaProp("/dev/null")
+        lora.ser.commands.clear()
+        report = lora.apply_config({"band": 915000000, "address": 101,
+                                    "parameter": {"sf": 9, "bw": 7, "cr": 1, "preamble": 12}})
+        self.assertEqual(report["changes"], {"ADDRESS": "101"})
+        self.assertFalse(report["reset"])
+        self.assertNotIn("ATZ", lora.ser.commands)
+        self.assertEqual(lora.ser.commands[-1], "AT+ADDRESS=101")
+        self.assertEqual(len(report["timings"]), 4)
+
+    def test_yaml_profile_and_mode_change_resets(self):
+        lora = LoRaProp("/dev/null", cached=True)
+        lora.ser.commands.clear()
+        report = lora.apply_config("mode: 0\ntx_power: 14\n")
+        self.assertTrue(report["reset"])
+        self.assertEqual(report["changes"], {"OPMODE": "0", "CRFOP": "14"})
+        self.assertEqual(lora.ser.commands.count("ATZ"), 1)
+        self.assertEqual(lora.apply_config({"tx_power": 14})["changes"], {})
+
+if __name__ == '__main__':
+    unittest.main()
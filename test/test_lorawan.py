@@ -0,0 +1,162 @@
+import os
+import tempfile
+import time
+import unittest
+from lora_module.emulator import EmulatedModule, Network
+from lora_module.framing import unpack_messages
+from lora_module.lora_module import LoRaWAN, parse_event_line
+from lora_module.lorawan import LoRaWANSession
+from helpers import FakeClock
+
+class FakeLoRaWAN:
+    def __init__(self):
+        self.sent = []
+
+    def get_mode(self):
+        return ["+OPMODE=0"]
+
+    def get_dev_eui(self):
+        return ["+DEVEUI=0011223344556677"]
+
+    def get_join_status(self):
+        return ["+NJS=1"]
+
+    def get_session(self):
+        return {"DEVADDR": "26011234", "NWKSKEY": "0" * 32, "APPSKEY": "0" * 32, "FCU": "7"}
+
+    def drain_events(self):
+        return iter(())
+
+    def send_data(self, port, confirmed, data):
+        self.sent.append((port, confirmed, data))
+        return "OK"
+
+class TestEvents(unittest.TestCase):
+
+    def test_parse_event_line(self):
+        self.assertEqual(parse_event_line("+EVT:JOINED"), {"event": "JOINED"})
+        self.assertEqual(parse_event_line("+EVT:RX_1:-70:8:UNICAST:2:a:b"), {
+            "event": "RX", "window": "1", "rssi": -70, "snr": 8, "type": "UNICAST", "port": 2, "data": "a:b"})
+
+class TestBatching(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.lora = FakeLoRaWAN()
+        # 1% of the window: every uplink is followed by 100x its airtime
+        self.session = LoRaWANSession(self.lora, fair_use=864, linger=10, clock=self.clock)
+        self.assertEqual(self.session.start(), "module")
+        self.assertEqual(self.session.get_event(), {"event": "joined", "how": "module"})
+
+    def test_messages_share_uplinks_within_fair_use(self):
+        self.session.send(2, "first")
+        self.session.poll()
+        self.assertEqual(self.lora.sent, [])  # Lingering for company
+        self.clock.now += 10
+        self.session.poll()
+        self.assertEqual(self.lora.sent, [(2, 0, "first")])
+        gap = self.session.airtime(len("first")) * 100
+
+        for i in range(5):
+            self.session.send(2, f"m{i}")
+            self.clock.now += gap / 10
+            self.session.poll()
+        self.assertEqual(len(self.lora.sent), 1)  # Held back by the fair-use gap
+        self.clock.now += gap
+        self.session.poll()
+        self.assertEqual(unpack_messages(self.lora.sent[1][2]), [f"m{i}" for i in range(5)])
+        self.assertEqual(self.session.get_event(), {"event": "sent", "port": 2, "messages": ["first"]})
+        self.assertEqual(self.session.stats["messages"], 6)
+        self.assertEqual(self.session.stats["uplinks"], 2)
+
+    def test_full_frame_does_not_linger(self):
+        for i in range(3):
+            self.session.send(3, "x" * 20)
+        self.session.poll()
+        self.assertEqual(unpack_messages(self.lora.sent[0][2]), ["x" * 20] * 2)
+        self.assertEqual(self.session.pending(), 1)
+
+    def test_counter_is_reserved_ahead(self):
+        self.assertEqual(self.session.session["fcnt_up"], 7 + 16)
+        for i in range(17):
+            self.session.send(1, "x")
+            self.clock.now += 1000
+            self.session.poll()
+        self.assertEqual(self.session.fcnt_up, 24)
+        # Renewed once the counter reached the reservation (23), not on every uplink
+        self.assertEqual(self.session.session["fcnt_up"], 23 + 16)
+
+class TestSessionEmulated(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "session.json")
+        self.network = Network(join_delay=2.0, rx_delay=1.0, time_scale=0.02, seed=1)
+        self.module = EmulatedModule(network=self.network)
+        self.addCleanup(self.module.close)
+        self.lora = LoRaWAN(self.module.port)
+
+    def session(self, **kwargs):
+        kwargs.setdefault("fair_use", 86400)
+        kwargs.setdefault("linger", 0)
+        return LoRaWANSession(self.lora, self.path, **kwargs)
+
+    def wait_for(self, session, name, timeout=2):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            event = session.get_event()
+            if event is not None and event["event"] == name:
+                return event
+            time.sleep(0.005)
+        self.fail(f"No {name} event")
+
+    def test_join_then_restore_after_reset(self):
+        session = self.session()
+        self.assertEqual(session.start(), "joining")
+        self.assertEqual(self.wait_for(session, "joined")["how"], "join")
+        self.assertEqual(self.network.joins, 1)
+        session.send(5, "hello", confirmed=True)
+        self.wait_for(session, "confirmed")
+
+        # A restart of the host alone finds the module still joined
+        self.assertEqual(self.session().start(), "module")
+
+        # After a module reboot the saved session is restored without a join
+        self.lora.reset()
+        session = self.session()
+        self.assertEqual(session.start(), "restored")
+        session.send(5, "again", confirmed=True)
+        self.assertEqual(self.wait_for(session, "confirmed")["messages"], ["again"])
+        self.assertEqual(self.network.joins, 1)
+        self.assertEqual([u[3] for u in self.network.uplinks], [b"hello", b"again"])
+
+    def test_downlink_event(self):
+        session = self.session()
+        session.start()
+        self.wait_for(session, "joined")
+        self.network.queue_downlink(self.module.module.dev_eui, 9, "cafe")
+        session.send(1, "ping")
+        self.assertEqual(self.wait_for(session, "sent")["messages"], ["ping"])
+        event = self.wait_for(session, "downlink")
+        self.assertEqual((event["port"], event["data"], event["rssi"]), (9, "cafe", -80))
+
+    def test_lost_session_joins_again(self):
+        session = self.session(max_confirm_failures=1)
+        session.start()
+        self.wait_for(session, "joined")
+        self.network.forget(session.session["DEVADDR"])
+        session.send(1, "lost", confirmed=True)
+        self.assertEqual(self.wait_for(session, "failed")["messages"], ["lost"])
+        self.assertEqual(self.wait_for(session, "joined")["how"], "join")
+        self.assertEqual(self.network.joins, 2)
+
+    def test_failed_joins_back_off(self):
+        self.network.accept_joins = False
+        session = self.session(join_backoff=(0.05, 0.1))
+        session.start()
+        retries = [self.wait_for(session, "join_failed")["retry_in"] for _ in range(3)]
+        self.assertAlmostEqual(retries[0], 0.05, places=2)
+        self.assertAlmostEqual(retries[2], 0.1, places=2)
+        self.assertFalse(os.path.exists(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+from lora_module.lora_module import LoRAMesh
+from lora_module.mesh import DuplicateFilter, format_sequence
+from helpers import FakeClock, FakeSerial
+
+class TestDuplicateFilter(unittest.TestCase):
+
+    def test_window(self):
+        dedup = DuplicateFilter(window=8, clock=FakeClock())
+        self.assertFalse(dedup.seen("a", 10))
+        self.assertTrue(dedup.seen("a", 10))
+        self.assertFalse(dedup.seen("a", 12))
+        self.assertFalse(dedup.seen("a", 11))  # Late but inside the window
+        self.assertTrue(dedup.seen("a", 11))
+        self.assertTrue(dedup.seen("a", 2))    # Behind the window
+        self.assertFalse(dedup.seen("b", 10))  # Origins are independent
+
+    def test_counter_wraps(self):
+        dedup = DuplicateFilter(clock=FakeClock())
+        self.assertFalse(dedup.seen("a", 0xffff))
+        self.assertFalse(dedup.seen("a", 0))
+        self.assertTrue(dedup.seen("a", 0xffff))
+
+    def test_origins_expire(self):
+        clock = FakeClock()
+        dedup = DuplicateFilter(ttl=30, clock=clock)
+        dedup.seen("a", 1)
+        clock.now += 31
+        self.assertFalse(dedup.seen("a", 1))
+        clock.now += 31
+        dedup.seen("b", 1)
+        self.assertEqual(len(dedup), 1)
+
+    def test_rebooted_origin_is_not_muted(self):
+        clock = FakeClock()
+        dedup = DuplicateFilter(window=8, ttl=30, clock=clock)
+        dedup.seen("a", 5000)
+        self.assertFalse(dedup.seen("a", 100))  # Far behind: a fresh counter after a reboot
+        self.assertFalse(dedup.seen("a", 101))
+        self.assertTrue(dedup.seen("a", 100))
+
+    def test_rejected_frames_do_not_keep_an_origin_alive(self):
+        clock = FakeClock()
+        dedup = DuplicateFilter(window=8, ttl=30, clock=clock)
+        dedup.seen("a", 500)
+        for counter in range(400, 415):  # Behind the window, not far enough to be a reset
+            clock.now += 2
+            self.assertTrue(dedup.seen("a", counter))
+        clock.now += 2
+        self.assertFalse(dedup.seen("a", 415))  # Last heard 32 s ago: forgotten
+
+class TestLoRAMesh(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("lora_module.lora_module.serial.Serial", FakeSerial)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uid_read_once_and_counter_advances(self):
+        mesh = LoRAMesh("/dev/null")
+        mesh.send_broadcast("a")
+        mesh.send_broadcast("b")
+        self.assertEqual(mesh.ser.commands.count("AT+UID=?"), 1)
+        first, second = [c.split(",", 2)[2][:12] for c in mesh.ser.commands if c.startswith("AT+SEND")]
+        self.assertEqual(first[:8], second[:8])
+        self.assertNotEqual(first, second)
+
+    def _frame(self, counter):
+        payload = format_sequence("cafef00d", counter) + "hello"
+        return {"address": 3, "length": len(payload), "data": payload, "rssi": -70, "snr": 5}
+
+    def _sends(self, mesh):
+        return [c for c in mesh.ser.commands if c.startswith("AT+SEND")]
+
+    def test_relays_each_sequence_once_after_its_slot(self):
+        clock = FakeClock()
+        mesh = LoRAMesh("/dev/null", suppress_after=0)
+        mesh.rebroadcasts.clock = clock
+        frame = self._frame(5)
+        mesh.relay_data(frame)
+        mesh.relay_data(dict(frame))
+        self.assertEqual(self._sends(mesh), [])
+        clock.now += 1.0
+        mesh.service_relays()
+        self.assertEqual(self._sends(mesh), [f"AT+SEND=0,{frame['length']},{frame['data']}"])
+
+    def test_relay_suppressed_after_k_copies(self):
+        clock = FakeClock()
+        mesh = LoRAMesh("/dev/null", suppress_after=3)
+        mesh.rebroadcasts.clock = clock
+        for _ in range(3):
+            mesh.relay_data(self._frame(9))
+        mesh.relay_data(self._frame(10))
+        clock.now += 1.0
+        mesh.service_relays()
+        self.assertEqual(len(self._sends(mesh)), 1)
+        self.assertEqual(mesh.rebroadcasts.suppressed, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import time
+import unittest
+import urllib.request
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.lora_module import LoRaError, LoRaProp
+from lora_module.metrics import LoRaMetrics, Metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def test_render(self):
+        metrics = Metrics()
+        metrics.describe("requests_total", "counter", "Requests")
+        metrics.inc("requests_total", path="/a")
+        metrics.inc("requests_total", 2, path="/a")
+        metrics.set("depth", lambda: 7)
+        metrics.describe("latency_seconds", "histogram", buckets=(0.1, 1.0))
+        metrics.observe("latency_seconds", 0.05)
+        metrics.observe("latency_seconds", 0.5)
+        metrics.observe("latency_seconds", 3)
+        text = metrics.render()
+        self.assertIn("# HELP requests_total Requests\n# TYPE requests_total counter\n", text)
+        self.assertIn('requests_total{path="/a"} 3\n', text)
+        self.assertIn("# TYPE depth gauge\ndepth 7\n", text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("latency_seconds_sum 3.55\nlatency_seconds_count 3\n", text)
+
+    def test_label_escaping(self):
+        metrics = Metrics()
+        metrics.inc("x", path='a"b\\c')
+        self.assertIn('x{path="a\\"b\\\\c"} 1', metrics.render())
+
+    def test_serve(self):
+        metrics = Metrics()
+        metrics.inc("up")
+        server = metrics.serve("127.0.0.1", 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            self.assertIn(b"up 1\n", response.read())
+
+class TestLoRaMetrics(unittest.TestCase):
+
+    def setUp(self):
+        channel = Channel(rssi=-70, snr=8, time_scale=0.01)
+        self.modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in self.modules:
+            self.addCleanup(module.close)
+        self.metrics = Metrics()
+        self.tx = LoRaProp(self.modules[0].port)
+        self.tx.add_hook(LoRaMetrics(self.metrics, radio="tx"))
+        self.rx = LoRaProp(self.modules[1].port)
+        self.rx.add_hook(LoRaMetrics(self.metrics, radio="rx"))
+        self.rx.set_address(101)
+
+    def test_commands_and_traffic_are_counted(self):
+        self.tx.send_data(101, "hello")
+        with self.assertRaises(LoRaError):
+            self.tx.send_data(101, "again")  # Still on air
+        deadline = time.monotonic() + 2
+        while not self.rx.get_received_data() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        value = self.metrics.value
+        self.assertEqual(value("lora_commands_total", command="SEND", status="OK", radio="tx"), 1)
+        self.assertEqual(value("lora_commands_total", command="SEND", status="AT_BUSY_ERROR", radio="tx"), 1)
+        self.assertEqual(value("lora_tx_bytes_total", radio="tx"), 5)
+        self.assertEqual(value("lora_rx_frames_total", radio="rx"), 1)
+        self.assertEqual(value("lora_last_rssi_dbm", radio="rx"), -70)
+        self.assertEqual(value("lora_command_seconds", command="SEND", radio="tx")[1], 2)
+        self.assertIn('lora_rssi_dbm_bucket{radio="rx",le="-70"} 1', self.metrics.render())
+
+    def test_pipelined_commands_are_timed(self):
+        self.rx.send_commands(["AT+ADDRESS=?", "AT+BAND=?"])
+        self.assertEqual(self.metrics.value("lora_command_seconds", command="BAND", radio="rx")[1], 1)
+
+if __name__ == '__main__':
+    unittest.main()
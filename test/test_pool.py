@@ -0,0 +1,87 @@
+import socket
+import threading
+import time
+import unittest
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.gateway import Gateway
+from lora_module.lora_module import LoRaProp
+from lora_module.pool import RadioPool
+
+class TestRadioPool(unittest.TestCase):
+
+    def setUp(self):
+        # Two separate channels, each with one pooled radio and one peer
+        self.channels = [Channel(time_scale=0.01), Channel(time_scale=0.01)]
+        self.peers = []
+        radios = {}
+        for name, channel in zip(("a", "b"), self.channels):
+            modules = [EmulatedModule(channel), EmulatedModule(channel)]
+            for module in modules:
+                self.addCleanup(module.close)
+            radio = LoRaProp(modules[0].port)
+            radio.set_address(100)
+            peer = LoRaProp(modules[1].port)
+            peer.set_address(101)
+            radios[name] = radio
+            self.peers.append(peer)
+        self.pool = RadioPool(radios, duty_cycle=1.0, guard=0.0)
+        self.addCleanup(self.pool.close)
+
+    def _collect(self, receive, count, timeout=3):
+        frames = []
+        deadline = time.monotonic() + timeout
+        while len(frames) < count and time.monotonic() < deadline:
+            frames += receive()
+        return frames
+
+    def test_rx_is_merged_and_tagged(self):
+        self.peers[0].send_data(100, "from a")
+        self.peers[1].send_data(100, "from b")
+        frames = self._collect(lambda: self.pool.receive(0.1), 2)
+        self.assertEqual(sorted((f["radio"], f["data"]) for f in frames),
+                         [("a", "from a"), ("b", "from b")])
+
+    def test_tx_is_spread_across_radios(self):
+        names = [self.pool.send_data(101, f"msg {i}") for i in range(4)]
+        self.assertEqual(sorted(names), ["a", "a", "b", "b"])
+        self.assertTrue(self.pool.flush(timeout=3))
+        for peer in self.peers:
+            frames = self._collect(lambda: list(peer.drain_received()), 2)
+            self.assertEqual(len(frames), 2)
+
+    def test_exhausted_radio_is_avoided(self):
+        self.pool.schedulers["a"].duty_cycle = 0.0
+        self.assertEqual({self.pool.send_data(101, "x") for _ in range(3)}, {"b"})
+
+    def test_explicit_radio(self):
+        self.assertEqual(self.pool.send_data(101, "x", radio="a"), "a")
+        self.assertEqual(len(self.pool.schedulers["a"].queue), 1)
+
+    def test_gateway_over_pool(self):
+        gateway = Gateway(self.pool, "127.0.0.1", 0, dest=101, linger=0.0)
+        forwarded = []
+        gateway.forward = forwarded.append
+        self.addCleanup(gateway.close)
+        thread = threading.Thread(target=gateway.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(gateway.stop)
+
+        self.peers[1].send_data(100, "up")
+        deadline = time.monotonic() + 3
+        while not forwarded and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual((forwarded[0]["radio"], forwarded[0]["data"]), ("b", "up"))
+
+        with socket.create_connection(gateway.address) as client:
+            client.sendall(b"down\n")
+            frames = []
+            deadline = time.monotonic() + 3
+            while not frames and time.monotonic() < deadline:
+                for peer in self.peers:
+                    frames += list(peer.drain_received())
+                time.sleep(0.01)
+        self.assertEqual([f["data"] for f in frames], ["down"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import random
+import time
+import unittest
+from collections import deque
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.framing import is_ack, pack_ack, parse_ack, parse_reliable
+from lora_module.lora_module import LoRaProp
+from lora_module.reliable import ReliableLink
+from helpers import FakeClock
+
+class FakeRadio:
+    """Delivers send_data straight to the peer's inbox unless drop() says otherwise."""
+    def __init__(self, address):
+        self.address = address
+        self.peer = None
+        self.inbox = deque()
+        self.sent = []
+        self.drop = lambda data: False
+
+    def send_data(self, rx_addr, data):
+        self.sent.append(data)
+        if not self.drop(data):
+            self.peer.inbox.append({"address": self.address, "length": len(data), "data": data, "rssi": -60, "snr": 9})
+        return []
+
+    def drain_received(self):
+        while self.inbox:
+            yield self.inbox.popleft()
+
+def received(link):
+    messages = []
+    while True:
+        frame = link.get_received_data()
+        if frame is None:
+            return messages
+        messages.append(frame["data"])
+
+class TestFraming(unittest.TestCase):
+
+    def test_ack_round_trip(self):
+        self.assertEqual(parse_ack(pack_ack(7, 9, 250, 0b101)), (7, 9, 250, 0b101))
+        self.assertEqual(pack_ack(7, 9, 3), "\x06070903")
+        self.assertEqual(parse_ack("\x06070903"), (7, 9, 3, 0))
+        self.assertIsNone(parse_ack("\x060703"))
+
+class TestReliableLink(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.a, self.b = FakeRadio(100), FakeRadio(101)
+        self.a.peer, self.b.peer = self.b, self.a
+        self.tx = ReliableLink(self.a, window=4, initial_rto=1.0, min_rto=0.1, ack_delay=0.1, clock=self.clock)
+        self.rx = ReliableLink(self.b, window=4, clock=self.clock)
+
+    def _run(self, steps=50, step=0.05):
+        delivered = []
+        for _ in range(steps):
+            self.clock.now += step
+            delivered += received(self.rx)
+            self.tx.poll()
+        return delivered
+
+    def test_window_limits_frames_in_flight(self):
+        for i in range(10):
+            self.tx.send_data(101, str(i))
+        self.assertEqual(len(self.a.sent), 4)
+        self.assertEqual(self.tx.in_flight(101), 4)
+        self.assertEqual(self._run(), [str(i) for i in range(10)])
+        self.assertEqual(self.tx.pending(), 0)
+
+    def test_one_ack_covers_several_frames(self):
+        for i in range(4):
+            self.tx.send_data(101, str(i))
+        self._run(steps=5)
+        self.assertEqual(sum(1 for data in self.b.sent if is_ack(data)), 1)
+        self.assertEqual(self.tx.stats["acked"], 4)
+
+    def test_only_lost_frame_is_resent(self):
+        lost = {1}
+        def drop(data):
+            seq = parse_reliable(data)[1]
+            if seq in lost:
+                lost.discard(seq)
+                return True
+            return False
+        self.a.drop = drop
+        for i in range(4):
+            self.tx.send_data(101, str(i))
+        self.clock.now += 0.05
+        self.assertEqual(received(self.rx), ["0"])  # 2 and 3 are held back
+        epoch, receiver_epoch, expected, bitmap = parse_ack(self.b.sent[-1])
+        self.assertEqual((expected, bitmap), (1, 0b11))
+        self.assertEqual(self._run(), ["1", "2", "3"])
+        self.assertEqual(self.tx.stats["resent"], 1)
+
+    def test_lost_ack_is_recovered(self):
+        acks = []
+        self.b.drop = lambda data: not acks and not acks.append(data)  # Drop the first ack only
+        self.tx.send_data(101, "once")
+        self.assertEqual(self._run(), ["once"])
+        self.assertEqual(self.rx.stats["duplicates"], 1)
+        self.assertEqual(self.tx.pending(), 0)
+
+    def test_rto_adapts_to_round_trip(self):
+        self.tx.send_data(101, "x")
+        self._run(steps=10)
+        self.assertLess(self.tx.rto(101), 1.0)
+        self.assertGreaterEqual(self.tx.rto(101), 0.1)
+
+    def test_gives_up_after_max_retries(self):
+        self.a.drop = lambda data: True
+        self.tx.max_retries = 2
+        self.tx.send_data(101, "void")
+        self._run(steps=400)
+        self.assertEqual(self.tx.failed, [(101, "void")])
+        self.assertEqual(self.tx.pending(), 0)
+
+    def test_sequence_wraps(self):
+        for i in range(600):
+            self.tx.send_data(101, str(i))
+        self.assertEqual(self._run(steps=1000, step=0.01), [str(i) for i in range(600)])
+
+    def test_restarted_sender_starts_over(self):
+        self.tx.send_data(101, "before")
+        self._run(steps=5)
+        self.tx = ReliableLink(self.a, clock=self.clock)
+        self.tx.epoch = (self.rx._receivers[100].epoch + 1) % 256
+        self.tx.send_data(101, "after")
+        self.assertEqual(self._run(steps=5), ["after"])
+
+    def test_restarted_receiver_is_detected(self):
+        for i in range(200):  # Far enough that the next seq looks like a duplicate to a fresh receiver
+            self.tx.send_data(101, str(i))
+        self.assertEqual(len(self._run(steps=1000, step=0.01)), 200)
+        self.rx = ReliableLink(self.b, window=4, clock=self.clock)
+        self.rx.epoch = (self.tx._senders[101].peer_epoch + 1) % 256
+        self.tx.send_data(101, "after-restart")
+        self.assertEqual(self._run(steps=20), ["after-restart"])
+        self.assertEqual(self.tx.stats["restarts"], 1)
+        self.assertEqual(self.tx.pending(), 0)
+        self.assertEqual(self.tx.failed, [])
+
+    def test_bytes_are_rejected(self):
+        with self.assertRaises(Exception):
+            self.tx.send_data(101, b"\x01\x02")
+        self.assertEqual(self.tx.pending(), 0)
+        self.assertEqual(self.a.sent, [])
+
+    def test_plain_frames_pass_through(self):
+        self.a.send_data(101, "plain")
+        self.assertEqual(received(self.rx), ["plain"])
+
+    def test_random_loss(self):
+        rng = random.Random(1)
+        self.a.drop = lambda data: rng.random() < 0.3
+        self.b.drop = lambda data: rng.random() < 0.3
+        for i in range(50):
+            self.tx.send_data(101, str(i))
+        self.assertEqual(self._run(steps=2000), [str(i) for i in range(50)])
+
+class TestReliableEmulated(unittest.TestCase):
+
+    def test_lossy_channel(self):
+        channel = Channel(time_scale=0.01, loss=0.2, seed=3)
+        modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in modules:
+            self.addCleanup(module.close)
+        a, b = LoRaProp(modules[0].port), LoRaProp(modules[1].port)
+        a.set_address(100)
+        b.set_address(101)
+        tx = ReliableLink(a, window=4, initial_rto=0.2, min_rto=0.05)
+        rx = ReliableLink(b, ack_delay=0.01)
+        for i in range(12):
+            tx.send_data(101, f"cmd {i}")
+        messages = []
+        for _ in range(1000):
+            messages += received(rx)
+            tx.poll()
+            if len(messages) == 12 and not tx.pending():
+                break
+            time.sleep(0.005)
+        self.assertEqual(messages, [f"cmd {i}" for i in range(12)])
+
+    def test_binary_radios(self):
+        channel = Channel(time_scale=0.01)
+        modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in modules:
+            self.addCleanup(module.close)
+        a, b = LoRaProp(modules[0].port, binary=True), LoRaProp(modules[1].port, binary=True)
+        a.set_address(100)
+        b.set_address(101)
+        tx = ReliableLink(a, initial_rto=0.2)
+        rx = ReliableLink(b, ack_delay=0.01)
+        a.send_bytes(101, b"\xffraw")  # Ordinary binary traffic passes through as bytes
+        time.sleep(0.05)
+        tx.send_data(101, "cmd")
+        messages = []
+        for _ in range(400):
+            messages += received(rx)
+            tx.poll()
+            if len(messages) == 2 and not tx.pending():
+                break
+            time.sleep(0.005)
+        self.assertEqual(messages, [b"\xffraw", "cmd"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import time
+import unittest
+from array import array
+from unittest import mock
+from lora_module.emulator import Channel, EmulatedModule
+from lora_module.lora_module import LoRaError, LoRaProp, parse_received_line
+from lora_module.rxparser import RxParser
+from helpers import FakeSerial
+
+class TestRxParser(unittest.TestCase):
+
+    def test_commas_and_newlines_in_payload(self):
+        parser = RxParser()
+        parser.feed(b"+RCV=7,12,a,b\r\nc,d,e,f,-40,9\r\n")
+        frames = list(parser.frames())
+        self.assertEqual(frames, [{"address": 7, "length": 12, "data": "a,b\r\nc,d,e,f", "rssi": -40, "snr": 9}])
+
+    def test_partial_frames_wait_for_more_bytes(self):
+        parser = RxParser(size=8)
+        stream = b"OK\r\n+RCV=1,5,hello,-10,3\r\n+RCV=2,2,hi,-20,4\r\n"
+        frames = []
+        for i in range(0, len(stream), 3):
+            parser.feed(stream[i:i + 3])
+            frames += list(parser.frames())
+        self.assertEqual([f["data"] for f in frames], ["hello", "hi"])
+        self.assertEqual(len(parser), 0)
+
+    def test_malformed_line_is_skipped(self):
+        parser = RxParser()
+        parser.feed(b"+RCV=1,9,short,-1,1\r\n+RCV=1,2,ok,-1,1\r\n")
+        self.assertEqual([f["data"] for f in parser.frames()], ["ok"])
+
+    def test_binary_payloads(self):
+        parser = RxParser(binary=True)
+        parser.feed(b"+RCV=7,4,\xff\r\n\x00,-40,9\r\n")
+        self.assertEqual(next(parser.frames())["data"], b"\xff\r\n\x00")
+
+    def test_hex_payloads(self):
+        parser = RxParser(hex_payloads=True)
+        parser.feed(b"+RCV=7,4,ff00,-40,9\r\n+RCV=7,2,zz,-40,9\r\n")
+        self.assertEqual([(f["data"], f["length"]) for f in parser.frames()], [(b"\xff\x00", 2)])
+
+    def test_oversized_length_is_skipped(self):
+        parser = RxParser()
+        parser.feed(b"+RCV=1,9999,x,-1,1\r\n+RCV=1,2,ok,-1,1\r\n")
+        self.assertEqual([f["data"] for f in parser.frames()], ["ok"])
+
+    def test_line_parser_keeps_commas(self):
+        self.assertEqual(parse_received_line("+RCV=3,3,a,b,-5,6")["data"], "a,b")
+
+class TestDrainReceived(unittest.TestCase):
+
+    def test_burst_is_drained_in_one_call(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null")
+        lora.ser.replies += [f"+RCV=9,3,m,{i},-50,8" for i in range(5)]
+        self.assertEqual([f["data"] for f in lora.drain_received()], [f"m,{i}" for i in range(5)])
+        self.assertIsNone(lora.get_received_data())
+
+    def test_frame_during_command_is_kept(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null")
+        lora.ser.replies.append("+RCV=4,2,hi,-30,7")
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])
+        self.assertEqual(lora.get_received_data()["data"], "hi")
+
+    def test_binary_frame_split_by_readline_during_command(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null", binary=True)
+        # readline() cuts the payload at its line ending; the rest must not be taken for a reply
+        lora.ser.replies += ["+RCV=4,5,a", "OK,-30,7"]
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])
+        self.assertEqual(lora.get_received_data()["data"], b"a\r\nOK")
+
+    def test_overlong_length_field_ends_at_the_reply(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null", command_timeout=None)
+        lora.ser.replies.append("+RCV=7,20,hi,-40,9")  # Claims more payload than it carries
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])
+        lora.ser.replies.append("+RCV=7,20,hi,-40,9")
+        lora.set_address(3)  # Ends at the bare OK
+        self.assertEqual(lora.ser.settings["ADDRESS"], "3")
+        lora.ser.replies.append("+RCV=5,2,ok,-30,7")
+        self.assertEqual([f["data"] for f in lora.drain_received()], ["ok"])
+
+    def test_overlong_length_field_times_out_instead_of_hanging(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null", command_timeout=0.2)
+        lora.ser.replies += ["+RCV=7,200,hi,-40,9", "more payload"]  # And no reply ever comes
+        with mock.patch.object(lora.ser, "write"):
+            with self.assertRaises(LoRaError) as caught:
+                lora.get_band()
+        self.assertEqual(caught.exception.code, "TIMEOUT")
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])  # The stale frame was dropped
+
+    def test_garbage_tail_does_not_divert_replies(self):
+        with mock.patch("lora_module.lora_module.serial.Serial", FakeSerial):
+            lora = LoRaProp("/dev/null", command_timeout=1)
+        lora._on_received_line(b"+RCV=4,2,hi,-30,7\r\nxyz")  # No newline after the junk
+        self.assertEqual(lora.get_band(), ["+BAND=915000000"])
+        lora.ser.replies.append("+RCV=5,2,ok,-30,7")
+        self.assertEqual([f["data"] for f in lora.drain_received()], ["hi", "ok"])
+
+class TestSendBytes(unittest.TestCase):
+
+    def setUp(self):
+        channel = Channel(time_scale=0.001)
+        self.modules = [EmulatedModule(channel), EmulatedModule(channel)]
+        for module in self.modules:
+            self.addCleanup(module.close)
+
+    def receive(self, lora, timeout=2):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            frame = lora.get_received_data()
+            if frame is not None:
+                return frame
+            time.sleep(0.005)
+        self.fail("Nothing received")
+
+    def test_every_byte_value(self):
+        tx, rx = (LoRaProp(m.port, binary=True) for m in self.modules)
+        payload = bytes(range(256))[:240]
+        tx.send_bytes(0, bytearray(payload))
+        self.assertEqual(self.receive(rx)["data"], payload)
+        tx.send_data(0, memoryview(payload)[10:20])
+        self.assertEqual(self.receive(rx)["data"], payload[10:20])
+
+    def test_hex_transport_and_other_buffers(self):
+        tx, rx = (LoRaProp(m.port, hex_payloads=True) for m in self.modules)
+        readings = array("h", [-5, 0, 1013])
+        tx.send_bytes(0, readings)
+        self.assertEqual(self.modules[0].module.sent, 1)
+        frame = self.receive(rx)
+        self.assertEqual(array("h", frame["data"]), readings)
+        self.assertEqual(frame["length"], 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from lora_module.airtime import time_on_air
+from lora_module.lora_module import LoRaError
+from lora_module.scheduler import TxScheduler
+from helpers import FakeClock
+
+class FakeLoRa:
+    def __init__(self, busy=0):
+        self.sent = []
+        self.busy = busy
+
+    def get_rf_parameters(self):
+        return (7, 7, 1, 8)
+
+    def send_data(self, rx_addr, data):
+        if self.busy:
+            self.busy -= 1
+            raise LoRaError("AT_BUSY_ERROR", "busy")
+        self.sent.append((rx_addr, data))
+        return []
+
+class TestAirtime(unittest.TestCase):
+
+    def test_known_values(self):
+        # Reference values from the Semtech LoRa calculator
+        self.assertAlmostEqual(time_on_air(10, 7, 7, 1, 8), 0.041216, places=6)
+        self.assertAlmostEqual(time_on_air(51, 12, 7, 1, 8), 2.465792, places=6)
+
+class TestTxScheduler(unittest.TestCase):
+
+    def test_frames_are_spaced_by_airtime(self):
+        clock = FakeClock()
+        lora = FakeLoRa()
+        tx = TxScheduler(lora, duty_cycle=1.0, guard=0.0, clock=clock)
+        tx.send_data(101, "a" * 10)
+        tx.send_data(101, "b" * 10)
+        tx.poll()
+        self.assertIsNone(tx.poll())
+        self.assertEqual(len(lora.sent), 1)
+        clock.now += time_on_air(10, 7, 7, 1, 8)
+        tx.poll()
+        self.assertEqual(len(lora.sent), 2)
+
+    def test_duty_cycle_budget(self):
+        clock = FakeClock()
+        lora = FakeLoRa()
+        tx = TxScheduler(lora, duty_cycle=0.01, window=10, guard=0.0, clock=clock)
+        airtime = time_on_air(10, 7, 7, 1, 8)
+        tx.send_data(101, "a" * 10)
+        tx.send_data(101, "b" * 10)
+        tx.send_data(101, "c" * 10)
+        for _ in range(3):
+            clock.now += 1
+            tx.poll()
+        # 0.1 s budget only fits two 41 ms frames
+        self.assertEqual(len(lora.sent), 2)
+        self.assertAlmostEqual(tx.remaining_airtime(), 0.1 - 2 * airtime)
+        self.assertEqual(tx.next_send_time(), 1001.0 + 10)
+
+    def test_busy_error_is_retried(self):
+        clock = FakeClock()
+        lora = FakeLoRa(busy=1)
+        tx = TxScheduler(lora, duty_cycle=1.0, clock=clock)
+        tx.send_data(101, "hello")
+        self.assertIsNone(tx.poll())
+        clock.now += 10
+        tx.poll()
+        self.assertEqual(lora.sent, [(101, "hello")])
+
+    def test_flush_drains_with_real_clock(self):
+        lora = FakeLoRa()
+        tx = TxScheduler(lora, duty_cycle=1.0, guard=0.0)
+        for i in range(3):
+            tx.send_data(101, str(i))
+        self.assertTrue(tx.flush(timeout=2))
+        self.assertEqual(len(lora.sent), 3)
+
+if __name__ == '__main__':
+    unittest.main()
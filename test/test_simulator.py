@@ -0,0 +1,65 @@
+import unittest
+from lora_module.simulator import MeshSimulator
+
+def line(count, spacing, **options):
+    sim = MeshSimulator(seed=3, **options)
+    for i in range(count):
+        sim.add_node(i * spacing, 0)
+    return sim
+
+class TestMeshSimulator(unittest.TestCase):
+
+    def test_flood_along_a_line(self):
+        sim = line(5, 7000, rebroadcast_jitter=(0.05, 0.5))
+        self.assertEqual(sim.reachable(0), {1, 2, 3, 4})
+        sim.nodes[0].mesh.send_broadcast("hello")  # Reaches the far end only through relays
+        report = sim.run(0, settle=20)
+        self.assertEqual(report["messages"], 1)
+        self.assertEqual(report["delivery_ratio"], 1.0)
+        self.assertEqual(report["relays"], 4)  # Each node relays once, the last one too
+        frame_airtime = report["airtime"] / report["transmissions"]
+        self.assertGreater(report["latency"]["max"], 4 * frame_airtime)  # Four hops
+
+    def test_deterministic_by_seed(self):
+        def simulate(seed):
+            sim = MeshSimulator(seed=seed)
+            sim.random_topology(15, 4000)
+            sim.add_traffic(30)
+            report = sim.run(300)
+            del report["wall_seconds"], report["speedup"]
+            return report
+        self.assertEqual(simulate(1), simulate(1))
+        self.assertNotEqual(simulate(1), simulate(2))
+
+    def test_collisions_and_capture(self):
+        # 0 and 2 both reach 1; 2 is 10 dB stronger at 1, so it captures the receiver
+        sim = line(3, 100)
+        sim.set_link(0, 1, rssi=-100)
+        sim.set_link(2, 1, rssi=-90)
+        sim.set_link(0, 2, loss=1.0)
+        sim.set_link(2, 0, loss=1.0)
+        sim.nodes[0].mesh.send_broadcast("a")
+        sim.nodes[2].mesh.send_broadcast("b")
+        report = sim.run(0, settle=0.5)
+        self.assertEqual(report["collisions"], 1)
+        self.assertEqual(sim.nodes[1].radio.received, 1)
+
+        sim = line(3, 100, capture_threshold=20)
+        sim.set_link(0, 1, rssi=-100)
+        sim.set_link(2, 1, rssi=-90)
+        sim.nodes[0].mesh.send_broadcast("a")
+        sim.nodes[2].mesh.send_broadcast("b")
+        self.assertEqual(sim.run(0, settle=0.5)["collisions"], 2)
+        self.assertEqual(sim.nodes[1].radio.received, 0)
+
+    def test_traffic_report(self):
+        sim = MeshSimulator(seed=1)
+        sim.random_topology(20, 3000)
+        sim.add_traffic(60)
+        report = sim.run(600)
+        self.assertGreater(report["messages"], 100)
+        self.assertGreater(report["utilisation"], 0)
+        self.assertLessEqual(report["utilisation"], 1)
+
+if __name__ == '__main__':
+    unittest.main()